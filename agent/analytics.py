@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+analytics.py
+
+Group-by analytics over the evaluation journal (journal.py).
+
+Each journal segment is turned into columns once (time, loan, shop, purity,
+policy version, LTV, risk band, action, principal, rule-hit bitmask) and
+reduced to mergeable partial aggregates with vectorized numpy group-bys:
+
+  - per shop / purity / policy_version: count, risk-band and action counts,
+    an LTV histogram (LTV_BIN_WIDTH bins, for means and quantiles),
+    principal sum and rule-hit counts;
+  - per hour: count and action counts;
+  - per loan: the latest evaluation (principal, shop, purity), for exposure.
+
+Segments are append-only, so each one's columns and partial aggregates are
+cached next to the journal (<journal>/analytics/seg-*.npz) together with the
+number of rows they cover; a query decodes only rows appended since, folds
+them into the cache and merges. Time-bounded queries use the cached
+aggregate of segments entirely inside the range and re-aggregate the
+cached columns of the (at most two) segments crossing a boundary. Time
+buckets for action rates are whole hours.
+
+CLI:
+    python analytics.py distribution --by shop|purity|policy_version [--start ISO] [--end ISO]
+    python analytics.py actions [--bucket-hours 24]
+    python analytics.py rules [--by shop]
+    python analytics.py concentration [--by shop|purity] [--top 10]
+    python analytics.py warm                       # bring the segment caches up to date
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from journal import JOURNAL_DIR, Journal, Segment, loan_key, to_unix
+from rules import RISK_BANDS, get_rules
+
+DIMS = ("shop", "purity", "policy_version")
+LATEST_DIMS = ("shop", "purity")  # kept on the per-loan latest rows, for concentration
+ACTIONS = ("approve", "monitor", "margin_call", "reject")
+LTV_BIN_WIDTH = 0.01
+LTV_BINS = 200                     # [0, 2.0) in LTV_BIN_WIDTH steps, plus one overflow bin
+RULE_CODES = get_rules().codes
+
+Agg = Dict[str, np.ndarray]        # flat "dim.field" -> array, as stored in the npz cache
+
+_CACHE_TAG = hashlib.sha1(json.dumps(
+    [1, DIMS, ACTIONS, LTV_BIN_WIDTH, LTV_BINS, RULE_CODES]).encode("utf-8")).hexdigest()[:12]
+
+
+# ------------------------------------------------------------------------------
+# Columns
+# ------------------------------------------------------------------------------
+def record_columns(records: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Analytics columns for EvaluationOutput records (missing numbers NaN, unknown labels -1)."""
+    bits = {code: 1 << i for i, code in enumerate(RULE_CODES)}
+    band_of = {name: i for i, name in enumerate(RISK_BANDS)}
+    action_of = {name: i for i, name in enumerate(ACTIONS)}
+    ts, loans, shops, purity, versions, ltv, band, action, principal, rules = ([] for _ in range(10))
+    for r in records:
+        inputs, metrics = r.get("inputs") or {}, r.get("metrics") or {}
+        ts.append(to_unix(r.get("timestamp_utc")))
+        loans.append(loan_key(inputs.get("loan_id") or f"eval:{r.get('eval_id', '')}"))
+        shops.append(str(inputs.get("shop_id") or ""))
+        purity.append(int(inputs.get("purity") or -1))
+        versions.append(str((r.get("policy") or {}).get("version") or ""))
+        ltv.append(metrics.get("ltv") if metrics.get("ltv") is not None else np.nan)
+        band.append(band_of.get(metrics.get("risk_level"), -1))
+        action.append(action_of.get((r.get("recommendation") or {}).get("action"), -1))
+        principal.append(inputs.get("principal_myr") or 0.0)
+        rules.append(sum(bits.get(hit.get("code"), 0) for hit in r.get("explanations") or ()))
+    return {
+        "ts": np.array(ts, dtype=np.float64),
+        "loan": np.array(loans, dtype=np.uint64),
+        "shop": np.array(shops, dtype=str),
+        "purity": np.array(purity, dtype=np.int32),
+        "policy_version": np.array(versions, dtype=str),
+        "ltv": np.array(ltv, dtype=np.float64),
+        "band": np.array(band, dtype=np.int8),
+        "action": np.array(action, dtype=np.int8),
+        "principal": np.array(principal, dtype=np.float64),
+        "rules": np.array(rules, dtype=np.uint32),
+    }
+
+
+def _take(cols: Dict[str, np.ndarray], mask: np.ndarray) -> Dict[str, np.ndarray]:
+    return {k: v[mask] for k, v in cols.items()}
+
+
+# ------------------------------------------------------------------------------
+# Partial aggregates
+# ------------------------------------------------------------------------------
+def _counts(inv: np.ndarray, groups: int, labels: np.ndarray, width: int) -> np.ndarray:
+    """(groups, width) counts of label per group; labels < 0 are ignored."""
+    ok = labels >= 0
+    flat = np.bincount(inv[ok] * width + labels[ok].astype(np.int64), minlength=groups * width)
+    return flat.reshape(groups, width)
+
+
+def aggregate_columns(cols: Dict[str, np.ndarray]) -> Agg:
+    agg: Agg = {}
+    finite = np.isfinite(cols["ltv"])
+    ltv_bin = np.where(finite, np.clip(np.floor(np.nan_to_num(cols["ltv"]) / LTV_BIN_WIDTH), 0, LTV_BINS), -1)
+    rule_bits = (cols["rules"][:, None] >> np.arange(len(RULE_CODES), dtype=np.uint32)) & 1
+    for dim in DIMS:
+        keys, inv = np.unique(cols[dim], return_inverse=True)
+        g = len(keys)
+        agg[f"{dim}.keys"] = keys
+        agg[f"{dim}.n"] = np.bincount(inv, minlength=g)
+        agg[f"{dim}.bands"] = _counts(inv, g, cols["band"], len(RISK_BANDS))
+        agg[f"{dim}.actions"] = _counts(inv, g, cols["action"], len(ACTIONS))
+        agg[f"{dim}.ltv_hist"] = _counts(inv, g, ltv_bin.astype(np.int64), LTV_BINS + 1)
+        agg[f"{dim}.ltv_sum"] = np.bincount(inv[finite], weights=cols["ltv"][finite], minlength=g)
+        agg[f"{dim}.principal"] = np.bincount(inv, weights=cols["principal"], minlength=g)
+        agg[f"{dim}.rules"] = np.stack([np.bincount(inv, weights=rule_bits[:, i], minlength=g)
+                                        for i in range(len(RULE_CODES))], axis=1).astype(np.int64) \
+            if g else np.zeros((0, len(RULE_CODES)), dtype=np.int64)
+
+    timed = np.isfinite(cols["ts"])
+    hours, inv = np.unique((cols["ts"][timed] // 3600).astype(np.int64), return_inverse=True)
+    agg["hour.keys"] = hours
+    agg["hour.n"] = np.bincount(inv, minlength=len(hours))
+    agg["hour.actions"] = _counts(inv, len(hours), cols["action"][timed], len(ACTIONS))
+
+    agg.update(_latest({"loan": cols["loan"], "ts": cols["ts"], "principal": cols["principal"],
+                        "shop": cols["shop"], "purity": cols["purity"]}))
+    return agg
+
+
+def _latest(rows: Dict[str, np.ndarray]) -> Agg:
+    """Last evaluation per loan (by timestamp, then journal order)."""
+    ts = np.nan_to_num(rows["ts"], nan=-np.inf)
+    order = np.lexsort((np.arange(len(ts)), ts, rows["loan"]))
+    loan = rows["loan"][order]
+    last = np.ones(len(loan), dtype=bool)
+    last[:-1] = loan[1:] != loan[:-1]
+    keep = order[last]
+    return {f"latest.{k}": v[keep] for k, v in rows.items()}
+
+
+def _align(keys_a: np.ndarray, keys_b: np.ndarray):
+    keys = np.union1d(keys_a, keys_b)
+    return keys, np.searchsorted(keys, keys_a), np.searchsorted(keys, keys_b)
+
+
+def merge(a: Optional[Agg], b: Agg) -> Agg:
+    """Sum of two partial aggregates (group keys unioned)."""
+    if a is None:
+        return b
+    out: Agg = {}
+    for prefix in DIMS + ("hour",):
+        keys, ia, ib = _align(a[f"{prefix}.keys"], b[f"{prefix}.keys"])
+        out[f"{prefix}.keys"] = keys
+        for name in a:
+            if name.startswith(prefix + ".") and name != f"{prefix}.keys":
+                merged = np.zeros((len(keys),) + a[name].shape[1:], dtype=np.result_type(a[name], b[name]))
+                np.add.at(merged, ia, a[name])
+                np.add.at(merged, ib, b[name])
+                out[name] = merged
+    out.update(_latest({k.split(".", 1)[1]: np.concatenate([a[k], b[k]]) for k in a if k.startswith("latest.")}))
+    return out
+
+
+# ------------------------------------------------------------------------------
+# Per-segment cache and query entry point
+# ------------------------------------------------------------------------------
+class Analytics:
+    """Aggregates over a journal directory, with per-segment caches."""
+
+    def __init__(self, journal_dir: str = JOURNAL_DIR, cache_dir: Optional[str] = None):
+        self.journal = Journal(journal_dir)
+        self.cache_dir = cache_dir or os.path.join(journal_dir, "analytics")
+
+    def _cache_path(self, seg: Segment) -> str:
+        return os.path.join(self.cache_dir, f"seg-{seg.seq:08d}.npz")
+
+    def _load(self, path: str):
+        """(columns, aggregate, rows covered) from a segment's cache file, or (None, None, 0)."""
+        try:
+            with np.load(path) as data:
+                if str(data["tag"]) != _CACHE_TAG:
+                    return None, None, 0
+                cols = {k[5:]: data[k] for k in data.files if k.startswith("cols.")}
+                for name in ("shop", "policy_version"):      # stored dictionary-encoded
+                    cols[name] = cols.pop(f"{name}.keys")[cols.pop(f"{name}.codes")]
+                agg = {k[4:]: data[k] for k in data.files if k.startswith("agg.")}
+                return cols, agg, int(data["rows"])
+        except FileNotFoundError:
+            return None, None, 0
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Ignoring analytics cache {path}: {e}", file=sys.stderr)
+            return None, None, 0
+
+    def _save(self, path: str, cols: Dict[str, np.ndarray], agg: Agg, rows: int) -> None:
+        arrays = {f"cols.{k}": v for k, v in cols.items() if k not in ("shop", "policy_version")}
+        for name in ("shop", "policy_version"):
+            arrays[f"cols.{name}.keys"], arrays[f"cols.{name}.codes"] = np.unique(cols[name], return_inverse=True)
+        arrays.update({f"agg.{k}": v for k, v in agg.items()})
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, tag=np.array(_CACHE_TAG), rows=np.array(rows), **arrays)
+        os.replace(tmp, path)
+
+    def _segment_data(self, seg: Segment):
+        """(columns, aggregate) for one segment; only rows appended since the cached ones are decoded."""
+        path = os.path.join(self.cache_dir, f"seg-{seg.seq:08d}.npz")
+        cols, agg, rows = self._load(path)
+        n = len(seg)
+        if rows > n:                         # journal was rebuilt under the cache
+            cols, agg, rows = None, None, 0
+        if rows < n:
+            fresh = record_columns(seg.read_rows(np.arange(rows, n)))
+            cols = fresh if cols is None else {k: np.concatenate([cols[k], fresh[k]]) for k in cols}
+            agg = merge(agg, aggregate_columns(fresh))
+            self._save(path, cols, agg, n)
+        return cols, agg
+
+    def aggregate(self, start: Optional[Any] = None, end: Optional[Any] = None) -> Agg:
+        """Merged partial aggregate of every evaluation with start <= timestamp < end."""
+        self.journal.refresh()
+        lo = to_unix(start) if start is not None else -np.inf
+        hi = to_unix(end) if end is not None else np.inf
+        total: Optional[Agg] = None
+        bounded = np.isfinite(lo) or np.isfinite(hi)
+        for seg in self.journal.segments:
+            first, last = seg.ts_range
+            if not len(seg) or (bounded and (last < lo or first >= hi)):
+                continue
+            cols, agg = self._segment_data(seg)
+            if bounded and not (lo <= first and last < hi and np.isfinite(seg.index["ts"]).all()):
+                agg = aggregate_columns(_take(cols, (cols["ts"] >= lo) & (cols["ts"] < hi)))
+            total = merge(total, agg)
+        return total if total is not None else aggregate_columns(record_columns(()))
+
+    def warm(self) -> int:
+        """Bring every segment's cache up to date; returns the number of evaluations covered."""
+        self.journal.refresh()
+        for seg in self.journal.segments:
+            self._segment_data(seg)
+        return len(self.journal)
+
+    # -- reports ---------------------------------------------------------------
+    def distribution(self, by: str = "shop", start: Optional[Any] = None, end: Optional[Any] = None
+                     ) -> List[Dict[str, Any]]:
+        """LTV, risk-band and action distribution per shop / purity / policy_version."""
+        agg = self.aggregate(start, end)
+        out = []
+        for i, key in enumerate(agg[f"{by}.keys"].tolist()):
+            n = int(agg[f"{by}.n"][i])
+            hist = agg[f"{by}.ltv_hist"][i]
+            ltv_n = int(hist.sum())
+            out.append({
+                by: key,
+                "evaluations": n,
+                "ltv_mean": float(agg[f"{by}.ltv_sum"][i] / ltv_n) if ltv_n else None,
+                "ltv_p50": _hist_quantile(hist, 0.5),
+                "ltv_p90": _hist_quantile(hist, 0.9),
+                "risk_bands": _shares(agg[f"{by}.bands"][i], RISK_BANDS),
+                "actions": _shares(agg[f"{by}.actions"][i], ACTIONS),
+                "principal_myr": round(float(agg[f"{by}.principal"][i]), 2),
+            })
+        return sorted(out, key=lambda row: -row["evaluations"])
+
+    def action_rates(self, bucket_hours: int = 24, start: Optional[Any] = None, end: Optional[Any] = None
+                     ) -> List[Dict[str, Any]]:
+        agg = self.aggregate(start, end)
+        buckets, inv = np.unique(agg["hour.keys"] // bucket_hours, return_inverse=True)
+        n = np.bincount(inv, weights=agg["hour.n"], minlength=len(buckets))
+        actions = np.zeros((len(buckets), len(ACTIONS)))
+        np.add.at(actions, inv, agg["hour.actions"])
+        return [{
+            "bucket_start": datetime.fromtimestamp(int(b) * bucket_hours * 3600, timezone.utc).isoformat(),
+            "evaluations": int(n[i]),
+            "rates": _shares(actions[i], ACTIONS),
+        } for i, b in enumerate(buckets.tolist())]
+
+    def rule_frequencies(self, by: Optional[str] = None, start: Optional[Any] = None,
+                         end: Optional[Any] = None) -> Dict[str, Any]:
+        """Share of evaluations each rule fired in, overall or per group."""
+        agg = self.aggregate(start, end)
+        dim = by or DIMS[0]
+        hits, n = agg[f"{dim}.rules"], agg[f"{dim}.n"]
+        if by is None:
+            total = int(n.sum())
+            return {code: {"hits": int(c), "rate": round(float(c) / total, 6) if total else 0.0}
+                    for code, c in zip(RULE_CODES, hits.sum(axis=0).tolist())}
+        return {str(key): {code: round(float(c) / n[i], 6) for code, c in zip(RULE_CODES, hits[i].tolist()) if c}
+                for i, key in enumerate(agg[f"{dim}.keys"].tolist())}
+
+    def concentration(self, by: str = "shop", top: int = 10, start: Optional[Any] = None,
+                      end: Optional[Any] = None) -> Dict[str, Any]:
+        """Exposure (principal of each loan's latest evaluation) by shop or purity, with HHI."""
+        if by not in LATEST_DIMS:
+            raise ValueError(f"concentration is by {' or '.join(LATEST_DIMS)}, not {by!r}")
+        agg = self.aggregate(start, end)
+        keys, inv = np.unique(agg[f"latest.{by}"], return_inverse=True)
+        exposure = np.bincount(inv, weights=agg["latest.principal"], minlength=len(keys))
+        loans = np.bincount(inv, minlength=len(keys))
+        total = float(exposure.sum())
+        shares = exposure / total if total else exposure
+        order = np.argsort(-exposure, kind="stable")
+        return {
+            "loans": int(len(agg["latest.loan"])),
+            "exposure_myr": round(total, 2),
+            "hhi": round(float((shares ** 2).sum()), 6),
+            f"top{top}_share": round(float(shares[order[:top]].sum()), 6),
+            "top": [{by: keys[i].item(), "loans": int(loans[i]), "exposure_myr": round(float(exposure[i]), 2),
+                     "share": round(float(shares[i]), 6)} for i in order[:top].tolist()],
+        }
+
+
+def _shares(counts: np.ndarray, labels: Iterable[str]) -> Dict[str, float]:
+    total = float(np.sum(counts))
+    return {label: round(float(c) / total, 6) if total else 0.0 for label, c in zip(labels, counts.tolist())}
+
+
+def _hist_quantile(hist: np.ndarray, q: float) -> Optional[float]:
+    """Upper edge of the LTV bin holding quantile q (the overflow bin reports its lower edge)."""
+    total = hist.sum()
+    if not total:
+        return None
+    b = int(np.searchsorted(np.cumsum(hist), q * total))
+    return round(min(b + 1, LTV_BINS) * LTV_BIN_WIDTH, 4)
+
+
+if __name__ == "__main__":
+    import argparse
+    import re
+    import time
+
+    parser = argparse.ArgumentParser(description="Aggregates over the evaluation journal")
+    parser.add_argument("report", choices=("distribution", "actions", "rules", "concentration", "warm"))
+    parser.add_argument("--dir", default=JOURNAL_DIR, help="journal directory")
+    parser.add_argument("--by", help="shop, purity or policy_version (concentration: shop or purity)")
+    parser.add_argument("--start", help="ISO-8601 or unix seconds")
+    parser.add_argument("--end", help="ISO-8601 or unix seconds (exclusive)")
+    parser.add_argument("--bucket-hours", type=int, default=24)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    def when(value: Optional[str]) -> Any:
+        return float(value) if value and re.fullmatch(r"[\d.]+", value) else value
+
+    if args.by and args.by not in DIMS:
+        parser.error(f"--by must be one of {', '.join(DIMS)}")
+    if args.report == "concentration" and args.by and args.by not in LATEST_DIMS:
+        parser.error(f"concentration --by must be one of {', '.join(LATEST_DIMS)}")
+    started = time.perf_counter()
+    analytics = Analytics(args.dir)
+    start, end = when(args.start), when(args.end)
+    if args.report == "warm":
+        result: Any = {"cached_evaluations": analytics.warm()}
+    elif args.report == "distribution":
+        result = analytics.distribution(args.by or "shop", start, end)
+    elif args.report == "actions":
+        result = analytics.action_rates(args.bucket_hours, start, end)
+    elif args.report == "rules":
+        result = analytics.rule_frequencies(args.by, start, end)
+    else:
+        result = analytics.concentration(args.by or "shop", args.top, start, end)
+    print(f"[INFO] {args.report} over {len(analytics.journal)} evaluations in "
+          f"{time.perf_counter() - started:.3f}s", file=sys.stderr)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
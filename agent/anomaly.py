@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+anomaly.py
+
+Streaming price anomaly detection.
+
+A PriceAnomalyDetector consumes price ticks (fed by sources.record_price)
+and keeps, updated in O(1) per tick:
+  • deviation from the previous UTC day's close (the original PRICE_ABNORMAL rule)
+  • EWMA mean/variance of tick log returns → z-score of the latest return
+  • rolling z-score of the price level over the last `rolling_ticks` ticks
+  • rate of change over several horizons (1h, 24h, 7d by default)
+
+The anomaly verdict is computed once per tick and kept as `state()`, a dict
+with the same keys detect_abnormal_price_change() returns plus the extra
+signals, so evaluations read it instead of recomputing deviations per loan.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import telemetry
+from volatility import RollingWindow
+
+DEFAULT_HORIZONS: Dict[str, int] = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+DEFAULT_EWMA_ALPHA = 0.05
+DEFAULT_Z_THRESHOLD = 4.0
+MIN_Z_SAMPLES = 20
+ROLLING_TICKS = 60
+
+
+class PriceAnomalyDetector:
+    def __init__(
+        self,
+        symbol: str,
+        threshold_percent: float = 5.0,
+        z_threshold: float = DEFAULT_Z_THRESHOLD,
+        ewma_alpha: float = DEFAULT_EWMA_ALPHA,
+        horizons: Optional[Dict[str, int]] = None,
+        rolling_ticks: int = ROLLING_TICKS,
+    ):
+        self.symbol = symbol
+        self.threshold_percent = threshold_percent
+        self.z_threshold = z_threshold
+        self.ewma_alpha = ewma_alpha
+        self.horizons = dict(horizons or DEFAULT_HORIZONS)
+        self._lock = threading.Lock()
+        self._history: Dict[str, deque] = {name: deque() for name in self.horizons}
+        self._levels = RollingWindow(rolling_ticks)
+        self._ewma_mean = 0.0
+        self._ewma_var = 0.0
+        self._returns_seen = 0
+        self._day: Optional[str] = None
+        self._prev_close: Optional[float] = None
+        self._last_price: Optional[float] = None
+        self._last_ts = 0.0
+        self._ticks = 0
+        self._z: Optional[float] = None
+        self._roc: Dict[str, Optional[float]] = {name: None for name in self.horizons}
+        self._state: Dict[str, Any] = self._verdict()
+
+    # -- ingestion -------------------------------------------------------------
+    def update(self, ts: float, price: float) -> Dict[str, Any]:
+        """Consume one tick and return the refreshed state."""
+        with self._lock:
+            if price <= 0 or ts < self._last_ts:
+                return self._state
+            day = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+            if self._day is not None and day != self._day:
+                self._prev_close = self._last_price
+            self._day = day
+
+            # EWMA of tick log returns; the z-score uses the variance *before* this return
+            self._z = None
+            if self._last_price is not None:
+                r = math.log(price / self._last_price)
+                if self._returns_seen >= MIN_Z_SAMPLES and self._ewma_var > 1e-18:
+                    self._z = (r - self._ewma_mean) / math.sqrt(self._ewma_var)
+                diff = r - self._ewma_mean
+                incr = self.ewma_alpha * diff
+                self._ewma_mean += incr
+                self._ewma_var = (1.0 - self.ewma_alpha) * (self._ewma_var + diff * incr)
+                self._returns_seen += 1
+
+            # Rate of change: each deque keeps exactly one point at or before ts - horizon
+            for name, horizon in self.horizons.items():
+                hist = self._history[name]
+                hist.append((ts, price))
+                cutoff = ts - horizon
+                while len(hist) >= 2 and hist[1][0] <= cutoff:
+                    hist.popleft()
+                ref_ts, ref_px = hist[0]
+                self._roc[name] = (price - ref_px) / ref_px * 100 if ref_ts <= cutoff else None
+
+            self._levels.push(price)
+            self._last_price, self._last_ts = price, ts
+            self._ticks += 1
+            was_abnormal = self._state["is_abnormal"]
+            self._state = self._verdict()
+            if self._state["is_abnormal"] != was_abnormal:
+                telemetry.set_gauge("price_anomaly.abnormal", int(self._state["is_abnormal"]), symbol=self.symbol)
+                if self._state["is_abnormal"]:
+                    telemetry.inc("price_anomaly.alerts", symbol=self.symbol)
+            return self._state
+
+    def replay(self, points: Iterable[Tuple[float, float]]) -> None:
+        for ts, price in points:
+            self.update(ts, price)
+
+    def set_reference_close(self, price: Optional[float]) -> Dict[str, Any]:
+        """
+        Seed the previous-day close from another source (backend API) when the
+        detector has not seen a day roll yet. No-op once a close is known.
+        """
+        with self._lock:
+            if self._prev_close is None and price is not None and price > 0:
+                self._prev_close = price
+                self._state = self._verdict()
+            return self._state
+
+    def set_thresholds(self, threshold_percent: Optional[float] = None,
+                       z_threshold: Optional[float] = None) -> None:
+        with self._lock:
+            if threshold_percent is not None:
+                self.threshold_percent = threshold_percent
+            if z_threshold is not None:
+                self.z_threshold = z_threshold
+            self._state = self._verdict()
+
+    # -- verdict ---------------------------------------------------------------
+    def _verdict(self) -> Dict[str, Any]:
+        current = self._last_price
+        yesterday = self._prev_close
+        threshold = self.threshold_percent
+        triggers: List[str] = []
+
+        deviation = 0.0
+        if current is not None and yesterday:
+            deviation = abs((current - yesterday) / yesterday) * 100
+            if deviation > threshold:
+                triggers.append("deviation")
+        for name, roc in self._roc.items():
+            if roc is not None and abs(roc) > threshold:
+                triggers.append(f"roc_{name}")
+        if self._z is not None and abs(self._z) >= self.z_threshold:
+            triggers.append("zscore")
+
+        level_std = self._levels.std()
+        rolling_z = None
+        if current is not None and level_std:
+            rolling_z = (current - self._levels.mean()) / level_std
+
+        is_abnormal = bool(triggers)
+        if current is None:
+            reason = "No price ticks recorded yet"
+        elif not yesterday:
+            reason = "No yesterday price available for comparison"
+        else:
+            reason = f"Price deviation {deviation:.2f}% {'exceeds' if deviation > threshold else 'within'} threshold {threshold}%"
+        extra = [t for t in triggers if t != "deviation"]
+        if extra:
+            reason += f"; also triggered: {', '.join(extra)}"
+
+        return {
+            "is_abnormal": is_abnormal,
+            "deviation_percent": round(deviation, 2),
+            "yesterday_price": yesterday,
+            "current_price": current,
+            "threshold_percent": threshold,
+            "reason": reason,
+            "z_score": round(self._z, 3) if self._z is not None else None,
+            "rolling_z_score": round(rolling_z, 3) if rolling_z is not None else None,
+            "roc_percent": {k: (round(v, 3) if v is not None else None) for k, v in self._roc.items()},
+            "triggers": triggers,
+            "ticks": self._ticks,
+            "as_of": self._last_ts,
+        }
+
+    def state(self) -> Dict[str, Any]:
+        """Latest verdict (a fresh dict; computed on the last tick)."""
+        with self._lock:
+            return dict(self._state)
+
+
+# ------------------------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------------------------
+_detectors: Dict[str, PriceAnomalyDetector] = {}
+_registry_lock = threading.Lock()
+
+
+def get_anomaly_detector(symbol: str) -> PriceAnomalyDetector:
+    """
+    Process-wide detector for `symbol`, warmed up from the last 8 days of the
+    local price store (enough for the 7d horizon and a previous-day close).
+    """
+    with _registry_lock:
+        detector = _detectors.get(symbol)
+        if detector is None:
+            detector = PriceAnomalyDetector(
+                symbol, threshold_percent=float(os.getenv("PRICE_DEVIATION_THRESHOLD", "5.0")))
+            try:
+                from price_store import get_price_store
+                ts, px = get_price_store().series(symbol).window(time.time() - 8 * 86400)
+                detector.replay(zip(ts.tolist(), px.tolist()))
+            except (ImportError, OSError, ValueError) as e:
+                print(f"[WARN] Could not warm up {symbol} anomaly detector: {e}", file=sys.stderr)
+            _detectors[symbol] = detector
+        return detector
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+backtest.py
+
+Policy what-if backtesting over stored evaluations.
+
+Stored EvaluationOutput records (as printed by gold_evaluator.py) are
+loaded once into column arrays: loan inputs, the gold price, volatility and
+price deviation each evaluation ran on, and the policy values it was scored
+under. score() then re-applies the deterministic part of the pipeline —
+haircut → LTV → risk band → rule hits → rule-based action — to every
+record at once with numpy; the LLM is never called.
+
+compare() scores the records under their own policy (baseline) and under a
+candidate policy, and reports how many decisions, risk bands and rule hits
+change, overall and attributed to each policy key that differs (scored with
+only that key changed).
+
+CLI:
+    python backtest.py evals.jsonl [more.json ...] --set MAX_SAFE_LTV=0.75
+    python backtest.py evals/ --policy-file candidate.json [--cache evals.npz]
+    python backtest.py data/journal --set MAX_SAFE_LTV=0.75      # evaluation journal
+"""
+
+import glob
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+import policy
+from journal import Journal, is_journal
+from rules import RISK_BANDS, compile_rules, risk_band_index
+
+ACTIONS = ("approve", "monitor", "margin_call")
+
+# Policy keys that take part in re-scoring, with the record's own value as baseline.
+SCORED_KEYS = ("JEWELLERY_HAIRCUT_BPS", "MAX_SAFE_LTV", "MARGIN_CALL_LTV", "VOL_THRESHOLD",
+               "TENURE_LIMIT_DAYS", "PRICE_DEVIATION_THRESHOLD", "RISK_LEVEL")
+
+# Output policy block name → POLICY key
+_OUTPUT_POLICY_KEYS = {"HAIRCUT_BPS": "JEWELLERY_HAIRCUT_BPS"}
+
+_RISK_EDGES = ("VERY_LOW", "LOW", "MEDIUM", "HIGH")
+
+ArrayOrScalar = Union[np.ndarray, float]
+
+
+# ------------------------------------------------------------------------------
+# Loading
+# ------------------------------------------------------------------------------
+def iter_records(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """EvaluationOutput dicts from .json (object or list) and .jsonl files, directories of them, or a journal."""
+    for path in paths:
+        if is_journal(path):
+            yield from Journal(path).iter_records()
+            continue
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "*.json")) + glob.glob(os.path.join(path, "*.jsonl")))
+            yield from iter_records(files)
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                data = json.load(f)
+                yield from (data if isinstance(data, list) else [data])
+
+
+def _price_deviation(rec: Dict[str, Any]) -> float:
+    for hit in rec.get("explanations", []):
+        if hit.get("code") in ("PRICE_ABNORMAL", "PRICE_NORMAL"):
+            return float((hit.get("details") or {}).get("deviation_percent") or 0.0)
+    return np.nan
+
+
+def load_columns(paths: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Column arrays for every stored evaluation; missing values are NaN."""
+    recs = [r for r in iter_records(paths) if "metrics" in r and "inputs" in r]
+    current = policy.current().values
+
+    def pol(rec: Dict[str, Any], key: str) -> float:
+        values = (rec.get("policy") or {}).get("values") or {}
+        for out_key, policy_key in _OUTPUT_POLICY_KEYS.items():
+            if policy_key == key and out_key in values:
+                return float(values[out_key])
+        return float(values.get(key, current.get(key, np.nan)))
+
+    def num(value: Any) -> float:
+        return np.nan if value is None else float(value)
+
+    cols: Dict[str, np.ndarray] = {
+        "eval_id": np.array([r.get("eval_id", "") for r in recs], dtype=object),
+        "policy_version": np.array([(r.get("policy") or {}).get("version") or "" for r in recs], dtype=object),
+        "principal_myr": np.array([num(r["inputs"]["principal_myr"]) for r in recs]),
+        "gold_weight_g": np.array([num(r["inputs"]["gold_weight_g"]) for r in recs]),
+        "purity": np.array([num(r["inputs"]["purity"]) for r in recs]),
+        "tenure_days": np.array([num(r["inputs"]["tenure_days"]) for r in recs]),
+        "gold_price_myr_per_g": np.array([num(r["metrics"]["gold_price_myr_per_g"]) for r in recs]),
+        "gold_volatility": np.array([num(r["metrics"].get("gold_volatility")) for r in recs]),
+        "price_deviation_percent": np.array([_price_deviation(r) for r in recs]),
+        "stored_action": np.array([(r.get("recommendation") or {}).get("action", "") for r in recs], dtype=object),
+        "stored_risk_level": np.array([r["metrics"].get("risk_level", "") for r in recs], dtype=object),
+    }
+    for key in SCORED_KEYS:
+        if key != "RISK_LEVEL":
+            cols[f"policy.{key}"] = np.array([pol(r, key) for r in recs])
+    return cols
+
+
+def save_column_cache(cols: Dict[str, np.ndarray], path: str) -> None:
+    np.savez(path, **cols)
+
+
+def load_column_cache(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path, allow_pickle=True) as data:
+        return {k: data[k] for k in data.files}
+
+
+# ------------------------------------------------------------------------------
+# Scoring
+# ------------------------------------------------------------------------------
+def baseline_params(cols: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Each record's own policy values (RISK_LEVEL from the current policy)."""
+    params: Dict[str, Any] = {k: cols[f"policy.{k}"] for k in SCORED_KEYS if k != "RISK_LEVEL"}
+    params["RISK_LEVEL"] = dict(policy.current().values["RISK_LEVEL"])
+    return params
+
+
+def score(cols: Dict[str, np.ndarray], params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Vectorized re-score of every record under `params` (scalars or per-record arrays).
+
+    Returns per-record arrays: ltv, band (index into RISK_BANDS), action
+    (index into ACTIONS, same rules as build_rule_based_recommendation) and
+    one boolean array per rule code.
+    """
+    haircut = np.maximum(0.0, 1.0 - np.asarray(params["JEWELLERY_HAIRCUT_BPS"]) / 10_000.0)
+    collateral = cols["gold_weight_g"] * cols["purity"] / 999.0 * cols["gold_price_myr_per_g"] * haircut
+    ltv = cols["principal_myr"] / np.maximum(collateral, 1e-9)
+    rule_set = compile_rules({"RISK_LEVEL": params["RISK_LEVEL"]})
+    dev = cols["price_deviation_percent"]
+    masks = rule_set.evaluate({
+        "ltv": ltv,
+        "tenure_days": cols["tenure_days"],
+        "gold_volatility": cols["gold_volatility"],
+        "price_abnormal": np.where(np.isnan(dev), np.nan, dev > params["PRICE_DEVIATION_THRESHOLD"]),
+        "max_safe_ltv": params["MAX_SAFE_LTV"],
+        "margin_call_ltv": params["MARGIN_CALL_LTV"],
+        "vol_threshold": params["VOL_THRESHOLD"],
+        "tenure_limit_days": params["TENURE_LIMIT_DAYS"],
+    })
+    rules = rule_set.hits_by_code(masks)
+    band = risk_band_index(ltv, rule_set.edges)
+    action = np.where(rules["LTV_CRITICAL"], 2, np.where(rules["LTV_ELEVATED"], 1, 0))
+    return {"ltv": ltv, "band": band, "action": action, "rules": rules}
+
+
+def _diff(base: Dict[str, Any], cand: Dict[str, Any]) -> Dict[str, Any]:
+    changed_action = base["action"] != cand["action"]
+    changed_band = base["band"] != cand["band"]
+    rules = {}
+    for code in base["rules"]:
+        gained = int(np.count_nonzero(cand["rules"][code] & ~base["rules"][code]))
+        lost = int(np.count_nonzero(base["rules"][code] & ~cand["rules"][code]))
+        if gained or lost:
+            rules[code] = {"gained": gained, "lost": lost}
+    return {
+        "decisions_changed": int(np.count_nonzero(changed_action)),
+        "bands_changed": int(np.count_nonzero(changed_band)),
+        "rule_hits_changed": rules,
+        "_changed_action": changed_action,
+        "_changed_band": changed_band,
+    }
+
+
+def _transitions(before: np.ndarray, after: np.ndarray, labels) -> Dict[str, int]:
+    n = len(labels)
+    counts = np.bincount(before * n + after, minlength=n * n).reshape(n, n)
+    return {f"{labels[i]}->{labels[j]}": int(counts[i, j])
+            for i in range(n) for j in range(n) if i != j and counts[i, j]}
+
+
+def compare(cols: Dict[str, np.ndarray], candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Impact of `candidate` (POLICY-shaped values; missing keys keep each
+    record's own value) against each record's baseline policy.
+    """
+    base_params = baseline_params(cols)
+    cand_params = dict(base_params)
+    cand_params.update({k: v for k, v in candidate.items() if k in SCORED_KEYS})
+    base = score(cols, base_params)
+    cand = score(cols, cand_params)
+    overall = _diff(base, cand)
+
+    by_key: Dict[str, Any] = {}
+    for key in SCORED_KEYS:
+        if key not in candidate:
+            continue
+        only = dict(base_params, **{key: candidate[key]})
+        d = _diff(base, score(cols, only))
+        if d["decisions_changed"] or d["bands_changed"] or d["rule_hits_changed"]:
+            by_key[key] = {k: v for k, v in d.items() if not k.startswith("_")}
+
+    versions, counts = np.unique(cols["policy_version"].astype(str), return_counts=True)
+    stored = cols["stored_action"].astype(str)
+    known = np.isin(stored, ACTIONS)
+    agreement = float(np.mean(stored[known] == np.array(ACTIONS)[base["action"][known]])) if known.any() else None
+    return {
+        "records": int(len(cols["principal_myr"])),
+        "baseline_policy_versions": dict(zip(versions.tolist(), counts.tolist())),
+        "candidate": {k: candidate[k] for k in SCORED_KEYS if k in candidate},
+        "decisions_changed": overall["decisions_changed"],
+        "decision_transitions": _transitions(base["action"], cand["action"], ACTIONS),
+        "bands_changed": overall["bands_changed"],
+        "band_transitions": _transitions(base["band"].astype(np.int64), cand["band"].astype(np.int64), RISK_BANDS),
+        "rule_hits_changed": overall["rule_hits_changed"],
+        "by_policy_key": by_key,
+        "changed_eval_ids": cols["eval_id"][overall["_changed_action"] | overall["_changed_band"]].tolist(),
+        "baseline_vs_stored_action_agreement": agreement,
+    }
+
+
+# ------------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------------
+def _load_candidate(policy_file: Optional[str], overrides: List[str]) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {}
+    if policy_file:
+        with open(policy_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        candidate.update((data.get("body") or data).get("values") or data)
+    for item in overrides:
+        key, _, raw = item.partition("=")
+        candidate[key.strip()] = json.loads(raw)
+    unknown = [k for k in candidate if k not in policy.POLICY and k not in SCORED_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown policy key(s): {', '.join(unknown)}")
+    if "RISK_LEVEL" in candidate:
+        candidate["RISK_LEVEL"] = {**policy.current().values["RISK_LEVEL"], **candidate["RISK_LEVEL"]}
+    return candidate
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Re-score stored evaluations under a candidate policy")
+    parser.add_argument("paths", nargs="+", help="EvaluationOutput .json/.jsonl files, directories or a journal")
+    parser.add_argument("--policy-file", help="candidate policy JSON (POLICY values or get_current_policy() shape)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a policy value, e.g. MAX_SAFE_LTV=0.75 (repeatable)")
+    parser.add_argument("--cache", help="npz column cache; rebuilt when any input is newer")
+    parser.add_argument("--show-ids", action="store_true", help="list eval_ids whose decision or band changes")
+    args = parser.parse_args()
+
+    candidate = _load_candidate(args.policy_file, args.set)
+    started = time.perf_counter()
+    # A journal's directory mtime does not move on appends; look at its segments
+    newest = max(max(os.path.getmtime(f) for f in glob.glob(os.path.join(p, "seg-*")))
+                 if is_journal(p) else os.path.getmtime(p) for p in args.paths)
+    if args.cache and os.path.exists(args.cache) and os.path.getmtime(args.cache) >= newest:
+        cols = load_column_cache(args.cache)
+    else:
+        cols = load_columns(args.paths)
+        if args.cache:
+            save_column_cache(cols, args.cache)
+    loaded = time.perf_counter()
+    report = compare(cols, candidate)
+    print(f"[INFO] {report['records']} evaluations loaded in {loaded - started:.3f}s, "
+          f"re-scored in {time.perf_counter() - loaded:.3f}s", file=sys.stderr)
+    if not args.show_ids:
+        report.pop("changed_eval_ids")
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+batch_evaluator.py
+
+Multi-process batch evaluation of many loans.
+
+evaluate_loan() is mostly pure Python (pydantic validation, explanations,
+JSON serialization, AES-GCM), so threads serialize on the GIL. For large
+batches evaluate_batch() splits the loans across a process pool instead:
+
+  - the parent builds the configuration, the compiled policy, one market
+    snapshot and the shop rating index, and writes them once into a
+    multiprocessing.shared_memory block;
+  - each worker reads that block at start-up, installs the snapshot, policy
+    and shop ratings (market_data.adopt_snapshot / policy.install /
+    shop_registry.install), and creates its tracer, Ollama pool and HTTP
+    sessions once;
+  - loans travel in chunks as plain dicts and come back as EvaluationOutput
+    JSON strings, in input order or streamed as chunks complete, together
+    with the worker's telemetry since its previous chunk, which the parent
+    merges (telemetry.merge) so its summary covers every worker.
+
+Every loan in a batch therefore runs on the same market_snapshot_id and
+policy id. The CLI coordinator is long-lived, so it also runs the market
+refresher (market_data.start_refresher): the batch snapshot comes from it,
+and price history, volatility state and the last-known-good cache keep
+moving while a long batch runs. It refreshes the shop registry's persisted
+copy the same way (shop_registry.start_refresher). Batches below BATCH_PARALLEL_MIN loans, or workers=1, run in
+this process. `loans` may be a lazy iterator: with --loan-ids / --active the
+loans are fetched from the Silsilat API (sources.iter_loan_details /
+iter_listed_loans) while earlier ones are already being evaluated, and a
+loan that cannot be fetched or mapped gets a {"error": "fetch_failed"} line
+instead of stub data. A listing page that fails ends the listing with a
+{"error": "listing_failed"} line; the loans already listed are still evaluated.
+
+CLI:
+    python batch_evaluator.py loans.jsonl [--workers 8] [--chunk-size 16] \
+        [--unordered] [--out results.jsonl]
+    python batch_evaluator.py --loan-ids SAG-0001..SAG-0500 [--fetch-concurrency 16]
+    python batch_evaluator.py --loan-ids @ids.txt
+    python batch_evaluator.py --active
+    python batch_evaluator.py loans.jsonl --telemetry-out telemetry.json
+
+The CLI prints the merged telemetry summary (LLM timings, breakers, ...) to
+stderr when the batch ends; --telemetry-out also writes telemetry.snapshot().
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import policy
+import telemetry
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0"))            # 0 = one per CPU
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "16"))
+BATCH_PARALLEL_MIN = int(os.getenv("BATCH_PARALLEL_MIN", "32"))
+# Workers are spawned, not forked: the parent may run the market refresher,
+# span exporters and HTTP pools, none of which survive a fork cleanly.
+BATCH_START_METHOD = os.getenv("BATCH_START_METHOD", "spawn")
+
+# (index, loan_id, output JSON or error JSON, ok)
+Result = Tuple[int, Optional[str], str, bool]
+
+
+# ------------------------------------------------------------------------------
+# Shared context (parent side)
+# ------------------------------------------------------------------------------
+def build_context(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Configuration, compiled policy and market snapshot every loan in the batch runs on."""
+    from deadline import Deadline
+    from gold_evaluator import acquire_market_snapshot, load_config_with_policy
+    from shop_registry import get_shop_registry
+
+    cfg = cfg or load_config_with_policy()
+    snapshot = acquire_market_snapshot(cfg, Deadline(cfg["EVAL_DEADLINE_SECONDS"]))
+    return {
+        "cfg": cfg,
+        "policy": policy.current().to_state(),
+        "snapshot": snapshot.to_dict(),
+        "snapshot_age_s": snapshot.age_s(),
+        "shops": get_shop_registry().to_state(),
+        "created_unix": time.time(),
+    }
+
+
+def share_context(context: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, int]:
+    """Write the context into a new shared-memory block; caller closes and unlinks it."""
+    blob = json.dumps(context, default=str, separators=(",", ":")).encode("utf-8")
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(blob)))
+    shm.buf[:len(blob)] = blob
+    return shm, len(blob)
+
+
+def read_shared_context(name: str, size: int) -> Dict[str, Any]:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return json.loads(bytes(shm.buf[:size]).decode("utf-8"))
+    finally:
+        shm.close()
+
+
+# ------------------------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------------------------
+_worker: Dict[str, Any] = {}
+
+
+def _install_context(context: Dict[str, Any], tracing: bool = True) -> None:
+    """Adopt the shared snapshot/policy and pre-create this process's clients."""
+    import gold_evaluator as ge
+    import shop_registry
+    from market_data import adopt_snapshot
+
+    policy.install(context["policy"])
+    shop_registry.install(context["shops"])
+    age = context["snapshot_age_s"] + max(0.0, time.time() - context["created_unix"])
+    # Pinned: the batch snapshot never ages out, so no worker fetches prices itself
+    adopt_snapshot(context["snapshot"], age_s=age, pin=True)
+    cfg = context["cfg"]
+    if tracing:
+        tracer = ge.init_tracing(cfg["PHOENIX_COLLECTOR_ENDPOINT"], cfg["PHOENIX_SERVICE_NAME"])
+    else:
+        from opentelemetry import trace
+        tracer = trace.get_tracer(ge.__name__)
+    ge.ollama_pool_from_config(cfg)
+    _worker.update(cfg=cfg, tracer=tracer, module=ge)
+
+
+def _init_worker(shm_name: str, size: int, tracing: bool) -> None:
+    _install_context(read_shared_context(shm_name, size), tracing)
+    if tracing:
+        # Pool workers leave through multiprocessing's finalizers, not atexit.
+        from multiprocessing.util import Finalize
+        from opentelemetry import trace
+        Finalize(None, trace.get_tracer_provider().shutdown, exitpriority=10)
+
+
+def _evaluate_one(index: int, raw: Dict[str, Any]) -> Result:
+    ge = _worker["module"]
+    loan_id = raw.get("loan_id")
+    loan_id = None if loan_id is None else str(loan_id)
+    try:
+        loan = ge.LoanInput(**raw)
+    except ge.ValidationError as ve:
+        return index, loan_id, json.dumps({"error": "validation_error", "loan_id": loan_id,
+                                           "details": json.loads(ve.json())}), False
+    try:
+        output = ge.evaluate_loan(loan, _worker["cfg"], _worker["tracer"])
+        return index, loan_id, output.model_dump_json(), True
+    except Exception as e:
+        print(f"[ERROR] Evaluation of loan {loan_id or index} failed: {e}", file=sys.stderr)
+        return index, loan_id, json.dumps({"error": "fatal", "loan_id": loan_id, "message": str(e)}), False
+
+
+def _evaluate_chunk(chunk: List[Tuple[int, Dict[str, Any]]]) -> List[Result]:
+    return [_evaluate_one(i, raw) for i, raw in chunk]
+
+
+def _evaluate_chunk_in_worker(chunk: List[Tuple[int, Dict[str, Any]]]
+                              ) -> Tuple[List[Result], Dict[str, Any]]:
+    """_evaluate_chunk plus this worker's telemetry since its last chunk (then reset)."""
+    results = _evaluate_chunk(chunk)
+    return results, telemetry.export(reset=True)
+
+
+# ------------------------------------------------------------------------------
+# Batch API
+# ------------------------------------------------------------------------------
+def _chunks(loans: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    for i, raw in enumerate(loans):
+        chunk.append((i, dict(raw)))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def evaluate_batch(loans: Iterable[Dict[str, Any]], workers: Optional[int] = None,
+                   chunk_size: int = BATCH_CHUNK_SIZE, ordered: bool = True,
+                   cfg: Optional[Dict[str, Any]] = None, tracing: bool = True) -> Iterator[Result]:
+    """
+    Evaluate raw loan dicts (LoanInput fields, optional loan_id) and yield
+    (index, loan_id, json, ok) per loan — in input order, or as chunks finish
+    when `ordered` is False. A failed loan yields the CLI's error JSON, ok=False.
+    """
+    # `loans` may be a lazy stream (e.g. sources.iter_loan_details); only the
+    # first BATCH_PARALLEL_MIN rows are read up front to size the pool.
+    it = iter(loans)
+    head = list(itertools.islice(it, BATCH_PARALLEL_MIN))
+    small = len(head) < BATCH_PARALLEL_MIN
+    rows = iter(head) if small else itertools.chain(head, it)
+    workers = workers or BATCH_WORKERS or os.cpu_count() or 1
+    if small:
+        workers = min(workers, max(1, -(-len(head) // max(1, chunk_size))))
+    context = build_context(cfg)
+    telemetry.set_gauge("batch.workers", workers)
+
+    if workers <= 1 or small:
+        from market_data import unpin_snapshot
+
+        _install_context(context, tracing=False)     # this process's tracer provider, if any
+        try:
+            for chunk in _chunks(rows, chunk_size):
+                telemetry.inc("batch.loans", len(chunk))
+                yield from _evaluate_chunk(chunk)
+        finally:
+            unpin_snapshot()
+        return
+
+    shm, size = share_context(context)
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context(BATCH_START_METHOD),
+                                 initializer=_init_worker, initargs=(shm.name, size, tracing)) as pool:
+            # Bounded submission window: at most 2 chunks in flight per worker.
+            pending = {}
+            buffered: Dict[int, List[Result]] = {}
+            next_chunk = 0
+            chunk_iter = enumerate(_chunks(rows, chunk_size))
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < workers * 2:
+                    try:
+                        seq, chunk = next(chunk_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    telemetry.inc("batch.loans", len(chunk))
+                    pending[pool.submit(_evaluate_chunk_in_worker, chunk)] = seq
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    seq = pending.pop(fut)
+                    results, metrics = fut.result()
+                    telemetry.merge(metrics)
+                    if not ordered:
+                        yield from results
+                    else:
+                        buffered[seq] = results
+                while next_chunk in buffered:
+                    yield from buffered.pop(next_chunk)
+                    next_chunk += 1
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _fetched_loans(results: Iterable[Tuple[str, Optional[dict], Optional[str]]],
+                   failures: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Loan dicts from sources' (loan_id, details, error) stream; failures are
+    collected, not stubbed. A LoanFetchError from the stream itself (a failed
+    listing page) is collected too and ends the stream without failing the batch.
+    """
+    from sources import LoanFetchError
+
+    listed = 0
+    try:
+        for loan_id, details, error in results:
+            listed += 1
+            if details is None:
+                print(f"[WARN] Could not fetch loan {loan_id}: {error}", file=sys.stderr)
+                failures.append({"error": "fetch_failed", "loan_id": loan_id, "message": error})
+            else:
+                yield details
+    except LoanFetchError as e:
+        print(f"[ERROR] Loan listing stopped at {e.loan_id} ({e.message}); "
+              f"evaluating the {listed} loans already listed", file=sys.stderr)
+        failures.append({"error": "listing_failed", "at": e.loan_id, "message": e.message})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from loan_book import open_loan_book, read_loan_records
+
+    parser = argparse.ArgumentParser(description="Evaluate a batch of loans across a process pool")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("loans", nargs="?", help="JSON list / {\"loans\": [...]} / JSONL file, or a loan book")
+    source.add_argument("--loan-ids", help="fetch from the Silsilat API: ids, ranges (SAG-0001..SAG-0500), @file")
+    source.add_argument("--active", action="store_true", help="fetch every active loan via the paginated listing")
+    parser.add_argument("--fetch-concurrency", type=int, help="parallel API fetches (default: LOAN_FETCH_CONCURRENCY)")
+    parser.add_argument("--workers", type=int, help="processes (default: BATCH_WORKERS or CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--unordered", action="store_true", help="stream results as chunks finish")
+    parser.add_argument("--out", help="write JSONL here instead of stdout")
+    parser.add_argument("--no-tracing", action="store_true", help="do not export spans from workers")
+    parser.add_argument("--telemetry-out", help="also write the merged telemetry snapshot (JSON) here")
+    args = parser.parse_args()
+
+    fetch_failures: List[Dict[str, Any]] = []
+    if args.loan_ids or args.active:
+        import sources
+        if args.active:
+            fetched = sources.iter_listed_loans()
+        else:
+            fetched = sources.iter_loan_details(sources.parse_loan_ids(args.loan_ids),
+                                                concurrency=args.fetch_concurrency or sources.LOAN_FETCH_CONCURRENCY)
+        loans = _fetched_loans(fetched, fetch_failures)
+    elif os.path.isdir(args.loans) or args.loans.endswith(".parquet"):
+        loans = open_loan_book(args.loans).iter_records()
+    else:
+        loans = read_loan_records(args.loans)
+
+    import shop_registry
+    from gold_evaluator import base_env_config, init_tracing
+    from market_data import start_refresher, wait_for_snapshot
+
+    env = base_env_config()
+    if not args.no_tracing:
+        init_tracing(env["PHOENIX_COLLECTOR_ENDPOINT"], env["PHOENIX_SERVICE_NAME"])
+    # The batch snapshot is the refresher's first one (at most one fetch timeout away);
+    # without it, build_context() fetches or falls back to the cache itself.
+    refresher = start_refresher(env)
+    wait_for_snapshot(timeout=refresher.timeout)
+    # Keeps SHOP_REGISTRY_FILE fresh for one-shot runs on this host as well
+    shop_registry.start_refresher()
+
+    started = time.perf_counter()
+    evaluated = failed = 0
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for _, _, line, ok in evaluate_batch(loans, workers=args.workers, chunk_size=args.chunk_size,
+                                             ordered=not args.unordered, tracing=not args.no_tracing):
+            evaluated += 1
+            failed += not ok
+            out.write(line + "\n")
+        for failure in fetch_failures:
+            out.write(json.dumps(failure) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] {evaluated} loans evaluated in {elapsed:.2f}s ({evaluated / max(elapsed, 1e-9):.1f}/s), "
+          f"{failed} failed" + (f", {len(fetch_failures)} could not be fetched" if fetch_failures else ""),
+          file=sys.stderr)
+    print(f"[INFO] Telemetry summary:\n{telemetry.summary_report()}", file=sys.stderr)
+    if args.telemetry_out:
+        with open(args.telemetry_out, "w", encoding="utf-8") as f:
+            json.dump(telemetry.snapshot(), f, indent=2)
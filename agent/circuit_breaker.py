@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+circuit_breaker.py
+
+Per-dependency circuit breakers for the agent's external calls:
+Ollama, the Silsilat backend, metalpriceapi, fastforex, Pinata and the
+public IPFS gateways.
+
+States:
+  closed     calls flow; outcomes are recorded in a sliding window
+  open       calls fail immediately with CircuitOpenError for `open_seconds`
+  half_open  a limited number of probe calls decide between closed and open
+
+A breaker trips when, over at least `min_calls` recent calls, either the
+error rate reaches `error_rate_threshold` or the share of calls slower than
+`slow_call_s` reaches `slow_rate_threshold`.
+
+State is exported as span attributes (breaker.<name>.state) on the active
+span and as telemetry metrics (circuit_breaker.state / .calls / .transitions).
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from opentelemetry.trace import get_current_span
+
+import telemetry
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_in_s: float):
+        super().__init__(f"Circuit breaker '{name}' is open; retry in {retry_in_s:.1f}s")
+        self.name = name
+        self.retry_in_s = retry_in_s
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate_threshold: float = 0.5,
+        slow_call_s: Optional[float] = None,
+        slow_rate_threshold: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_s = slow_call_s
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._outcomes: deque = deque(maxlen=window)  # (failed, slow) per call
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+        telemetry.set_gauge("circuit_breaker.state", _STATE_GAUGE[CLOSED], dependency=name)
+
+    # -- state -----------------------------------------------------------------
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, new_state: str) -> None:
+        old, self._state = self._state, new_state
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+        if new_state in (CLOSED, HALF_OPEN):
+            self._half_open_in_flight = 0
+        if new_state == CLOSED:
+            self._outcomes.clear()
+        telemetry.set_gauge("circuit_breaker.state", _STATE_GAUGE[new_state], dependency=self.name)
+        telemetry.inc("circuit_breaker.transitions", dependency=self.name, to=new_state)
+        get_current_span().add_event("circuit_breaker.transition", {
+            "breaker.name": self.name, "breaker.from": old, "breaker.to": new_state,
+        })
+
+    def allow(self) -> bool:
+        """Reserve a call slot; False means the caller should fail fast."""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record(self, failed: bool, latency_s: float) -> None:
+        slow = self.slow_call_s is not None and latency_s >= self.slow_call_s
+        telemetry.inc("circuit_breaker.calls", dependency=self.name,
+                      outcome="failure" if failed else ("slow" if slow else "success"))
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(OPEN if (failed or slow) else CLOSED)
+                return
+            self._outcomes.append((failed, slow))
+            n = len(self._outcomes)
+            if self._state != CLOSED or n < self.min_calls:
+                return
+            error_rate = sum(1 for f, _ in self._outcomes if f) / n
+            slow_rate = sum(1 for _, s in self._outcomes if s) / n
+            if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                self._transition(OPEN)
+
+    # -- calling ---------------------------------------------------------------
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Invoke `fn` through the breaker. Any exception counts as a failure
+        and is re-raised.
+
+        Raises:
+            CircuitOpenError: if the breaker is open (fn is not called)
+        """
+        span = get_current_span()
+        if not self.allow():
+            telemetry.inc("circuit_breaker.calls", dependency=self.name, outcome="rejected")
+            span.set_attribute(f"breaker.{self.name}.state", OPEN)
+            raise CircuitOpenError(self.name, self.retry_in())
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(True, time.monotonic() - start)
+            span.set_attribute(f"breaker.{self.name}.state", self.state)
+            raise
+        self.record(False, time.monotonic() - start)
+        span.set_attribute(f"breaker.{self.name}.state", self.state)
+        return result
+
+
+# ------------------------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------------------------
+# Per-dependency tuning. "ipfs" applies to every "ipfs:<gateway>" breaker.
+BREAKER_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "ollama":        {"slow_call_s": 90.0, "open_seconds": 30.0},
+    "silsilat_api":  {"slow_call_s": 5.0,  "open_seconds": 15.0},
+    "metalpriceapi": {"slow_call_s": 3.0,  "open_seconds": 60.0},
+    "fastforex":     {"slow_call_s": 3.0,  "open_seconds": 60.0},
+    "pinata":        {"slow_call_s": 30.0, "open_seconds": 60.0},
+    "ipfs":          {"slow_call_s": 8.0,  "open_seconds": 120.0, "min_calls": 3},
+}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for `name`, creating it with its defaults."""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            defaults = BREAKER_DEFAULTS.get(name) or BREAKER_DEFAULTS.get(name.split(":", 1)[0], {})
+            breaker = _breakers[name] = CircuitBreaker(name, **defaults)
+        return breaker
+
+
+def breaker_states() -> Dict[str, str]:
+    with _registry_lock:
+        names = list(_breakers)
+    return {n: get_breaker(n).state for n in names}
+
+
+def guarded_request(dependency: str, method: str, url: str,
+                    session: Optional[requests.Session] = None, **kwargs: Any) -> requests.Response:
+    """
+    requests.request() through the dependency's breaker.
+
+    Transport errors and 5xx responses count as failures (5xx raises HTTPError);
+    other responses are returned as-is for the caller to inspect.
+    """
+    def do_request() -> requests.Response:
+        resp = (session or requests).request(method, url, **kwargs)
+        if resp.status_code >= 500:
+            resp.raise_for_status()
+        return resp
+
+    return get_breaker(dependency).call(do_request)
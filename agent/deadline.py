@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+deadline.py
+
+End-to-end time budget for a single loan evaluation.
+
+A Deadline is created once per evaluate_loan() call and split across the
+pipeline stages in a fixed order:
+
+    price  →  volatility  →  llm  →  publish
+
+Each stage gets a share of whatever budget is left when it starts, so time
+saved by a fast stage rolls over to the later ones. Stages run on daemon
+threads and are abandoned (not waited for) once their allowance is spent;
+the caller then degrades instead of failing:
+
+    price       → use cached market data
+    volatility  → skip (no VOL_* rule)
+    llm         → rule-based rationale
+    publish     → skip topic messages
+
+An abandoned stage thread keeps running until its own I/O returns, so stages
+with side effects (publish) check stage_expired() before each one; nothing
+is sent once the caller has reported the stage as skipped.
+
+Degraded stages are recorded on the Deadline and copied into the output.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Relative weight of each stage; the order of this dict is the pipeline order.
+DEFAULT_STAGE_SHARES: Dict[str, float] = {
+    "price": 0.15,
+    "volatility": 0.05,
+    "llm": 0.65,
+    "publish": 0.15,
+}
+
+# A stage with less than this much allowance is degraded without being started.
+MIN_STAGE_SECONDS = 0.05
+
+
+class Deadline:
+    def __init__(self, budget_s: float, stage_shares: Optional[Dict[str, float]] = None):
+        if budget_s <= 0:
+            raise ValueError("Deadline budget must be positive")
+        self.budget_s = float(budget_s)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget_s
+        self.stage_shares = dict(stage_shares or DEFAULT_STAGE_SHARES)
+        self.degraded: List[str] = []
+        self.stage_elapsed: Dict[str, float] = {}
+        self._stage_expires: Dict[str, float] = {}
+        self._abandoned: Set[str] = set()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def stage_allowance(self, stage: str) -> float:
+        """
+        Seconds available to `stage`: its share of the remaining budget,
+        relative to the stages that still have to run after it.
+        """
+        names = list(self.stage_shares)
+        if stage not in self.stage_shares:
+            return self.remaining()
+        later = names[names.index(stage):]
+        total = sum(self.stage_shares[n] for n in later) or 1.0
+        return self.remaining() * self.stage_shares[stage] / total
+
+    def stage_expired(self, stage: str) -> bool:
+        """True once run() gave up on `stage` or its allowance has passed (or the whole budget)."""
+        return stage in self._abandoned or time.monotonic() >= self._stage_expires.get(stage, self.expires_at)
+
+    def stage_remaining(self, stage: str) -> float:
+        """Seconds left in the allowance of the running `stage`."""
+        if stage in self._abandoned:
+            return 0.0
+        return max(0.0, self._stage_expires.get(stage, self.expires_at) - time.monotonic())
+
+    def mark_degraded(self, stage: str, mode: str) -> None:
+        tag = f"{stage}:{mode}"
+        if tag not in self.degraded:
+            self.degraded.append(tag)
+
+    def run(self, stage: str, fn: Callable[..., Any], *args: Any,
+            cap_s: Optional[float] = None, **kwargs: Any) -> Tuple[bool, Any]:
+        """
+        Run `fn(*args, **kwargs)` within the stage allowance (optionally capped).
+
+        Returns (True, result) on completion, or (False, None) if the stage had
+        no budget or ran out of time. Exceptions raised by `fn` propagate.
+        """
+        allowance = self.stage_allowance(stage)
+        if cap_s is not None:
+            allowance = min(allowance, cap_s)
+        if allowance < MIN_STAGE_SECONDS:
+            return False, None
+
+        result: Dict[str, Any] = {}
+        done = threading.Event()
+        # Carry contextvars (e.g. the active OpenTelemetry span) into the stage thread
+        ctx = contextvars.copy_context()
+
+        def target() -> None:
+            try:
+                result["value"] = ctx.run(fn, *args, **kwargs)
+            except BaseException as e:  # re-raised in the caller's thread
+                result["error"] = e
+            finally:
+                done.set()
+
+        start = time.monotonic()
+        self._stage_expires[stage] = start + allowance
+        threading.Thread(target=target, name=f"stage-{stage}", daemon=True).start()
+        finished = done.wait(allowance)
+        self.stage_elapsed[stage] = self.stage_elapsed.get(stage, 0.0) + (time.monotonic() - start)
+        if not finished:
+            self._abandoned.add(stage)
+            return False, None
+        if "error" in result:
+            raise result["error"]
+        return True, result.get("value")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "budget_s": self.budget_s,
+            "elapsed_s": round(self.elapsed(), 3),
+            "stages_s": {k: round(v, 3) for k, v in self.stage_elapsed.items()},
+            "degraded": list(self.degraded),
+        }
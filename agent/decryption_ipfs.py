@@ -9,6 +9,8 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 
+from circuit_breaker import guarded_request
+
 # Helper function to print logs to stderr only
 def log(msg):
     """Print log messages to stderr to avoid polluting stdout"""
@@ -120,7 +122,8 @@ def fetch_from_ipfs_gateway(ipfs_hash: str, gateway: str = 'cloudflare-ipfs.com'
     url = f"https://{gateway}/ipfs/{ipfs_hash}"
     
     try:
-        response = requests.get(url, timeout=timeout, headers={
+        # One breaker per gateway so a dead gateway is skipped instead of timing out
+        response = guarded_request(f"ipfs:{gateway}", "GET", url, timeout=timeout, headers={
             'Accept': '*/*',
             'User-Agent': 'Pawnshop-NFT-Agent/1.0'
         })
@@ -344,7 +347,8 @@ def test_encryption_decryption():
     print("=" * 60)
     print(f"Is encrypted format (encrypted): {is_encrypted_format(encrypted)}")
     print(f"Is encrypted format (plain text): {is_encrypted_format('plain text')}")
-    print(f"Is encrypted format (JSON): {is_encrypted_format('{\"key\": \"value\"}')}")
+    json_text = '{"key": "value"}'
+    print(f"Is encrypted format (JSON): {is_encrypted_format(json_text)}")
     print("✓ Format detection test passed!")
 
 
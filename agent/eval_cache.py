@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+eval_cache.py
+
+Memoized evaluation results for the Gold Collateral Evaluation Agent.
+
+Backend retries, BullMQ re-deliveries and UI refreshes resubmit identical
+evaluations. An evaluation is determined by its inputs, the compiled policy
+and the market inputs it runs on, so evaluate_loan() looks the result up
+under
+
+    sha256(canonical LoanInput JSON, policy hash and revision,
+           market_key(snapshot), the evaluation-relevant config in CONFIG_KEYS)
+
+before running the LLM or publishing, and a hit returns the stored
+EvaluationOutput (same eval_id) without new topic messages. market_key()
+buckets the gold price, FX rate and volatility (EVAL_CACHE_PRICE_STEP /
+_FX_STEP / _VOL_STEP) rather than using the snapshot id, which changes with
+every refresh; an entry is served for at most EVAL_CACHE_TTL_SECONDS, so a
+hit never reuses market inputs much older than a snapshot would be.
+
+Hits are not journaled: the stored output is the evaluation that was
+journaled when it ran (the same eval_id), and appending it again would
+duplicate it in the journal's eval_id index. Hits are counted in telemetry
+(eval_cache.lookups) instead.
+
+Entries live in a bounded in-process LRU (EVAL_CACHE_SIZE, 0 disables the
+cache). With EVAL_CACHE_DB set they are also written to SQLite, which lets
+restarts and batch worker processes share them; rows older than
+EVAL_CACHE_DB_MAX_AGE_SECONDS are pruned when the database is opened.
+Degraded evaluations (rule-based fallback, skipped publish, cached prices)
+are not stored, so a retry gets another chance at the full path.
+
+CLI:
+    python eval_cache.py stats
+    python eval_cache.py clear
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import telemetry
+
+load_dotenv(".env")
+
+EVAL_CACHE_SIZE = int(os.getenv("EVAL_CACHE_SIZE", "1024"))
+EVAL_CACHE_DB = os.getenv("EVAL_CACHE_DB", "")
+EVAL_CACHE_DB_MAX_AGE_SECONDS = float(os.getenv("EVAL_CACHE_DB_MAX_AGE_SECONDS", "86400"))
+# Lifetime of an entry for lookups; also bounds how stale a hit's market inputs can be
+EVAL_CACHE_TTL_SECONDS = float(os.getenv("EVAL_CACHE_TTL_SECONDS", "300"))
+# Market input buckets: gold MYR/g, USD/MYR, annualized volatility
+EVAL_CACHE_PRICE_STEP = float(os.getenv("EVAL_CACHE_PRICE_STEP", "0.5"))
+EVAL_CACHE_FX_STEP = float(os.getenv("EVAL_CACHE_FX_STEP", "0.001"))
+EVAL_CACHE_VOL_STEP = float(os.getenv("EVAL_CACHE_VOL_STEP", "0.001"))
+
+# Configuration that changes an evaluation's result besides the policy values
+CONFIG_KEYS = ("DEFAULT_LLM_MODEL", "VOL_WINDOW", "PRICE_DEVIATION_THRESHOLD", "MC_PATHS", "MC_SEED",
+               "JEWELLERY_HAIRCUT_BPS", "MAX_SAFE_LTV", "MARGIN_CALL_LTV", "VOL_THRESHOLD", "TENURE_LIMIT_DAYS")
+
+
+def _bucket(value: Optional[float], step: float) -> Optional[int]:
+    return None if value is None else int(round(value / step))
+
+
+def market_key(snapshot: Any) -> Dict[str, Any]:
+    """
+    The market inputs of a market_data.MarketSnapshot that an evaluation
+    depends on, bucketed so that refreshes of an unchanged market share a key.
+    """
+    return {
+        "price": _bucket(snapshot.gold_price_myr_per_g, EVAL_CACHE_PRICE_STEP),
+        "fx": _bucket(snapshot.fx_usd_myr, EVAL_CACHE_FX_STEP),
+        "vol": _bucket(snapshot.gold_volatility, EVAL_CACHE_VOL_STEP),
+        "vol_fallback": bool(snapshot.gold_volatility_fallback),
+        "vol_window": snapshot.vol_window_days,
+        "abnormal": bool(snapshot.anomaly.get("is_abnormal")),
+    }
+
+
+def evaluation_key(loan: Mapping[str, Any], cfg: Mapping[str, Any],
+                   market: Optional[Mapping[str, Any]] = None) -> str:
+    """
+    Cache key for evaluating `loan` (LoanInput.model_dump()) under `cfg` on
+    the market inputs `market` (market_key()); market=None keys on inputs and
+    policy only (singleflight).
+    """
+    payload = {
+        "loan": loan,
+        "policy": [cfg.get("POLICY_HASH"), cfg.get("POLICY_REVISION")],
+        "market": market,
+        "config": {k: cfg.get(k) for k in CONFIG_KEYS},
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+class EvalCache:
+    """Thread-safe LRU of key -> EvaluationOutput JSON, optionally backed by SQLite."""
+
+    def __init__(self, max_entries: int = EVAL_CACHE_SIZE, db_path: str = EVAL_CACHE_DB,
+                 max_age_s: float = EVAL_CACHE_DB_MAX_AGE_SECONDS, ttl_s: float = EVAL_CACHE_TTL_SECONDS):
+        self.max_entries = max(0, max_entries)
+        self.db_path = db_path
+        self.max_age_s = max_age_s
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.enabled and db_path:
+            self._open_db()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _open_db(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS eval_cache ("
+                       "key TEXT PRIMARY KEY, created_unix REAL NOT NULL, output TEXT NOT NULL)")
+            if self.max_age_s > 0:
+                db.execute("DELETE FROM eval_cache WHERE created_unix < ?", (time.time() - self.max_age_s,))
+            self._db = db
+        except sqlite3.Error as e:
+            print(f"[WARN] Evaluation cache database {self.db_path} unavailable; memory only: {e}",
+                  file=sys.stderr)
+            self._db = None
+
+    def get(self, key: str) -> Optional[str]:
+        """The stored output for `key` if it was stored less than ttl_s ago."""
+        if not self.enabled:
+            return None
+        oldest = time.time() - self.ttl_s
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < oldest:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                telemetry.inc("eval_cache.lookups", outcome="hit")
+                return entry[1]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT created_unix, output FROM eval_cache "
+                                           "WHERE key = ? AND created_unix >= ?", (key, oldest)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"[WARN] Evaluation cache read failed: {e}", file=sys.stderr)
+                    row = None
+                if row is not None:
+                    self._remember(key, row[1], row[0])
+                    telemetry.inc("eval_cache.lookups", outcome="hit_db")
+                    return row[1]
+        telemetry.inc("eval_cache.lookups", outcome="miss")
+        return None
+
+    def _remember(self, key: str, value: str, created_unix: float) -> None:
+        self._entries[key] = (created_unix, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, output_json: str) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, output_json, now)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO eval_cache (key, created_unix, output) VALUES (?, ?, ?)",
+                                     (key, now, output_json))
+                except sqlite3.Error as e:
+                    print(f"[WARN] Evaluation cache write failed: {e}", file=sys.stderr)
+        telemetry.set_gauge("eval_cache.entries", len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM eval_cache")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def db_rows(self) -> int:
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM eval_cache").fetchone()[0]
+
+
+_cache: Optional[EvalCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_eval_cache() -> EvalCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EvalCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the evaluation result cache")
+    parser.add_argument("command", choices=("stats", "clear"))
+    args = parser.parse_args()
+
+    cache = get_eval_cache()
+    if not cache.db_path:
+        print("[WARN] EVAL_CACHE_DB is not set; only the in-process cache exists", file=sys.stderr)
+    if args.command == "clear":
+        cache.clear()
+        print(f"[INFO] Cleared {cache.db_path or 'in-process cache'}", file=sys.stderr)
+    else:
+        print(json.dumps({"db": cache.db_path, "rows": cache.db_rows(), "max_entries": cache.max_entries,
+                          "ttl_s": cache.ttl_s, "max_age_s": cache.max_age_s}, indent=2))
@@ -8,6 +8,8 @@ Adds:
   • Phoenix spans include policy.version, policy.hash, and policy thresholds
   • Explanations use policy VOL_THRESHOLD instead of hard-coded values
   • Output JSON includes a concise `policy` block
+  • Market data is read from a versioned snapshot (market_data.py); the
+    output records its `market_snapshot_id`
 
 See .env.local for environment defaults that can be overridden by policy.
 """
@@ -16,10 +18,13 @@ from __future__ import annotations
 
 import json
 import os
+import sqlite3
 import sys
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Literal, List
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Literal, List, Tuple
 from base64 import b64encode, b64decode
 
 import requests
@@ -32,14 +37,32 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 # --- Local modules ---
 from sources import (
-    get_gold_price_myr,
-    get_yesterday_gold_price_myr,
-    detect_abnormal_price_change,
-    get_volatility,
+    get_volatility_estimate,
     get_fx_rate,
     get_regulatory_policy,   # NEW: policy pull
+    get_shop_rating,
 )
-from prompts import SYSTEM_PROMPT, RECOMMENDATION_PROMPT
+from prompts import SYSTEM_PROMPT, build_recommendation_prompt
+from ollama_pool import OllamaPool, get_pool, parse_endpoints
+from deadline import Deadline
+from circuit_breaker import CircuitOpenError, get_breaker, guarded_request
+from montecarlo import margin_call_probability
+from rules import get_rules
+from eval_cache import evaluation_key, get_eval_cache, market_key
+from singleflight import SingleFlight, WaitTimeout
+from journal import JOURNAL_ENABLED, get_journal_writer
+from publish_state import (
+    HEARTBEAT, INPUT_TOPIC, OUTPUT_TOPIC, PUBLISH, PUBLISH_DEDUP, SKIP,
+    get_publish_state, heartbeat_message, metrics_digest,
+)
+from market_data import (
+    MarketSnapshot,
+    current_snapshot,
+    refresh_market_snapshot,
+    snapshot_from_cache,
+)
+import policy
+import telemetry
 
 # ---- OpenTelemetry / Phoenix ----
 from opentelemetry import trace
@@ -53,10 +76,34 @@ from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExport
 # ------------------------------------------------------------------------------
 # Configuration helpers (env defaults)
 # ------------------------------------------------------------------------------
+_env_config: Optional[Tuple[int, Mapping[str, Any]]] = None
+_config: Optional[Tuple[Tuple[int, int], Mapping[str, Any]]] = None
+
 def base_env_config() -> Dict[str, Any]:
-    load_dotenv(".env")
+    """
+    Env-derived configuration. Read (and .env loaded) once, again after a
+    SIGHUP (policy.generation()); callers get their own mutable copy.
+    """
+    global _env_config
+    gen = policy.generation()
+    if _env_config is None or _env_config[0] != gen:
+        _env_config = (gen, MappingProxyType(_read_env_config()))
+    return dict(_env_config[1])
+
+def _read_env_config() -> Dict[str, Any]:
+    load_dotenv(".env", override=policy.generation() > 0)
     return {
         "OLLAMA_BASE_URL": os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/"),
+        # Multiple inference boxes: comma-separated list, falls back to OLLAMA_BASE_URL
+        "OLLAMA_BASE_URLS": parse_endpoints(
+            os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        ),
+        "OLLAMA_HEDGE": os.getenv("OLLAMA_HEDGE", "false").lower() == "true",
+        "OLLAMA_HEDGE_MIN_DELAY_MS": int(os.getenv("OLLAMA_HEDGE_MIN_DELAY_MS", "500")),
+        "OLLAMA_HEALTH_INTERVAL_SECONDS": float(os.getenv("OLLAMA_HEALTH_INTERVAL_SECONDS", "15")),
+        "OLLAMA_KEEP_ALIVE": os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+        # Upper bound on system + user prompt tokens (estimated); optional fields are trimmed to fit
+        "PROMPT_TOKEN_BUDGET": int(os.getenv("PROMPT_TOKEN_BUDGET", "1024")),
         "DEFAULT_LLM_MODEL": os.getenv("DEFAULT_LLM_MODEL", "llama3.1:8b"),
         "PHOENIX_COLLECTOR_ENDPOINT": os.getenv("PHOENIX_COLLECTOR_ENDPOINT", "http://localhost:6006/v1/traces"),
         "PHOENIX_SERVICE_NAME": os.getenv("PHOENIX_SERVICE_NAME", "silsilat-gold-evaluator"),
@@ -73,6 +120,12 @@ def base_env_config() -> Dict[str, Any]:
         "VOL_THRESHOLD": float(os.getenv("VOL_THRESHOLD", "0.05")),
         "TENURE_LIMIT_DAYS": int(os.getenv("TENURE_LIMIT_DAYS", "180")),
         "PRICE_DEVIATION_THRESHOLD": float(os.getenv("PRICE_DEVIATION_THRESHOLD", "5.0")),
+        # End-to-end budget for one evaluation (price, volatility, LLM, publish)
+        "EVAL_DEADLINE_SECONDS": float(os.getenv("EVAL_DEADLINE_SECONDS", "90")),
+        "MARKET_REFRESH_SECONDS": float(os.getenv("MARKET_REFRESH_SECONDS", "60")),
+        "MARKET_SNAPSHOT_MAX_AGE_SECONDS": float(os.getenv("MARKET_SNAPSHOT_MAX_AGE_SECONDS", "300")),
+        "MC_PATHS": int(os.getenv("MC_PATHS", "2000")),   # 0 disables margin_call_probability
+        "MC_SEED": int(os.getenv("MC_SEED", "0")),
     }
 
 def merge_policy(cfg: Dict[str, Any], policy_obj: Dict[str, Any]) -> Dict[str, Any]:
@@ -96,7 +149,24 @@ def merge_policy(cfg: Dict[str, Any], policy_obj: Dict[str, Any]) -> Dict[str, A
     cfg["POLICY_ID"] = policy_obj.get("id")
     return cfg
 
+def ollama_pool_from_config(cfg: Dict[str, Any]) -> OllamaPool:
+    """Shared Ollama pool for the configured endpoint list (created once per process)."""
+    return get_pool(
+        cfg.get("OLLAMA_BASE_URLS") or [cfg["OLLAMA_BASE_URL"]],
+        hedge=cfg.get("OLLAMA_HEDGE", False),
+        hedge_min_delay_s=cfg.get("OLLAMA_HEDGE_MIN_DELAY_MS", 500) / 1000.0,
+        health_interval_s=cfg.get("OLLAMA_HEALTH_INTERVAL_SECONDS", 0.0),
+    )
+
 def load_config_with_policy() -> Dict[str, Any]:
+    """
+    Env defaults overlaid with the compiled policy. Built once per (SIGHUP
+    generation, policy revision) pair; every call returns a fresh copy.
+    """
+    global _config
+    key = (policy.generation(), policy.revision())
+    if _config is not None and _config[0] == key:
+        return dict(_config[1])
     print("[INFO] Loading configuration with policy...", file=sys.stderr)
     cfg = base_env_config()
     try:
@@ -107,8 +177,10 @@ def load_config_with_policy() -> Dict[str, Any]:
         print(f"[WARN] Failed to fetch regulatory policy: {e}", file=sys.stderr)
         pol = None
     cfg = merge_policy(cfg, pol or {})
+    cfg["POLICY_REVISION"] = key[1]
+    _config = (key, MappingProxyType(cfg))
     print(f"[INFO] Configuration loaded. Policy active: {bool(pol)}", file=sys.stderr)
-    return cfg
+    return dict(cfg)
 
 
 # ------------------------------------------------------------------------------
@@ -138,6 +210,8 @@ class LoanInput(BaseModel):
     gold_weight_g: float = Field(gt=0)
     purity: int = Field(ge=500, le=999)
     tenure_days: int = Field(ge=1)
+    shop_id: Optional[str] = None
+    loan_id: Optional[str] = None
 
     @field_validator("purity")
     @classmethod
@@ -159,8 +233,14 @@ class RiskMetrics(BaseModel):
     margin_call_ltv: float
     vol_window_days: int
     gold_volatility: Optional[float] = None
+    gold_volatility_fallback: bool = False            # gold_volatility is VOL_FALLBACK, not measured
     fx_usd_myr: Optional[float] = None
     shop_rating: Optional[str] = None
+    gold_price_sources: Optional[int] = None
+    gold_price_dispersion_pct: Optional[float] = None
+    fx_sources: Optional[int] = None
+    fx_dispersion_pct: Optional[float] = None
+    margin_call_probability: Optional[float] = None  # P(LTV ≥ margin_call_ltv before maturity), Monte Carlo
 
 class LLMRecommendation(BaseModel):
     model: str
@@ -183,29 +263,18 @@ class EvaluationOutput(BaseModel):
     recommendation: LLMRecommendation
     explanations: List[RuleHit] = []
     policy: Dict[str, Any] = {}   # NEW: compact policy meta (id, version, hash)
+    degraded: List[str] = []      # stages degraded by the deadline, e.g. "llm:rule_based"
+    market_snapshot_id: Optional[str] = None  # market data the evaluation ran on (market_data.load_snapshot)
 
 # ------------------------------------------------------------------------------
 # Computation logic
 # ------------------------------------------------------------------------------
 def calculate_risk_level(ltv: float) -> Literal["VERY_LOW", "LOW", "MEDIUM", "HIGH", "VERY_HIGH"]:
     """
-    Calculate risk level based on LTV ratio:
-    - VERY_LOW: < 60%
-    - LOW: 61% - 69%
-    - MEDIUM: 70% - 79%
-    - HIGH: 80% - 85%
-    - VERY_HIGH: > 85%
+    Calculate risk level based on LTV ratio, using the policy RISK_LEVEL edges
+    (defaults: VERY_LOW < 60%, LOW 61-69%, MEDIUM 70-79%, HIGH 80-85%, VERY_HIGH > 85%).
     """
-    if ltv < 0.60:
-        return "VERY_LOW"
-    elif ltv <= 0.69:
-        return "LOW"
-    elif ltv <= 0.79:
-        return "MEDIUM"
-    elif ltv <= 0.85:
-        return "HIGH"
-    else:
-        return "VERY_HIGH"
+    return get_rules().risk_level(ltv)
 
 
 def compute_metrics(
@@ -216,6 +285,9 @@ def compute_metrics(
     margin_call_ltv: float,
     vol_window_days: int,
     tracer: Tracer,
+    fx_usd_myr: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    snapshot: Optional[MarketSnapshot] = None,
 ) -> RiskMetrics:
     print(f"[INFO] Computing metrics - Gold price: {gold_price_myr_per_g} MYR/g, Weight: {loan.gold_weight_g}g, Purity: {loan.purity}", file=sys.stderr)
     with tracer.start_as_current_span("compute_metrics") as span:
@@ -228,31 +300,71 @@ def compute_metrics(
         risk_level = calculate_risk_level(ltv)
 
         gold_vol = None
-        fx = None
+        gold_vol_fallback = False
+        fx = fx_usd_myr
+        consensus: Dict[str, Any] = {}
+
+        if snapshot is not None:
+            # Market inputs come from the snapshot; no I/O on this path
+            fx = snapshot.fx_usd_myr if fx is None else fx
+            if snapshot.gold_consensus:
+                consensus["gold_price_sources"] = snapshot.gold_consensus["source_count"]
+                consensus["gold_price_dispersion_pct"] = snapshot.gold_consensus["dispersion_percent"]
+            if snapshot.fx_consensus:
+                consensus["fx_sources"] = snapshot.fx_consensus["source_count"]
+                consensus["fx_dispersion_pct"] = snapshot.fx_consensus["dispersion_percent"]
+            for key, value in consensus.items():
+                span.set_attribute(f"metrics.{key}", value)
 
         try:
-            with tracer.start_as_current_span("get_gold_volatility") as s_vol:
-                gold_vol = float(get_volatility("XAU/MYR", window=vol_window_days))
-                s_vol.set_attribute("result.gold_volatility", gold_vol)
+            if snapshot is not None and snapshot.vol_window_days == vol_window_days:
+                gold_vol = snapshot.gold_volatility
+                gold_vol_fallback = snapshot.gold_volatility_fallback
+            else:
+                with tracer.start_as_current_span("get_gold_volatility") as s_vol:
+                    if deadline is None:
+                        ok, estimate = True, get_volatility_estimate("XAU/MYR", window=vol_window_days)
+                    else:
+                        ok, estimate = deadline.run("volatility", get_volatility_estimate, "XAU/MYR",
+                                                    window=vol_window_days)
+                    vol, fallback = estimate if ok else (None, False)
+                    if ok and vol is not None:
+                        gold_vol, gold_vol_fallback = float(vol), fallback
+                        s_vol.set_attribute("result.gold_volatility", gold_vol)
+                        s_vol.set_attribute("result.fallback", fallback)
+                    elif ok:
+                        s_vol.set_attribute("result.insufficient_history", True)
+                    else:
+                        deadline.mark_degraded("volatility", "skipped")
+                        s_vol.set_attribute("result.degraded", True)
+                        print("[WARN] Volatility stage ran out of budget; skipping", file=sys.stderr)
+            if gold_vol is not None:
+                span.set_attribute("metrics.gold_volatility", gold_vol)
                 print(f"[INFO] Gold volatility: {gold_vol:.2%} over {vol_window_days} days", file=sys.stderr)
         except Exception as e:
             print(f"[WARN] Failed to fetch volatility: {e}", file=sys.stderr)
             span.add_event("volatility_fetch_error", {"error": str(e)})
 
-        try:
-            with tracer.start_as_current_span("get_fx_rate") as s_fx:
-                fx = float(get_fx_rate("USD/MYR"))
-                s_fx.set_attribute("result.usd_myr", fx)
-                print(f"[INFO] USD/MYR rate: {fx}", file=sys.stderr)
-        except Exception as e:
-            print(f"[WARN] Failed to fetch FX rate: {e}", file=sys.stderr)
-            pass
+        if fx is None:
+            try:
+                with tracer.start_as_current_span("get_fx_rate") as s_fx:
+                    fx = float(get_fx_rate("USD/MYR"))
+                    s_fx.set_attribute("result.usd_myr", fx)
+                    print(f"[INFO] USD/MYR rate: {fx}", file=sys.stderr)
+            except Exception as e:
+                print(f"[WARN] Failed to fetch FX rate: {e}", file=sys.stderr)
+                pass
 
         span.set_attribute("metrics.ltv", round(ltv, 6))
         span.set_attribute("metrics.risk_level", risk_level)
         span.set_attribute("metrics.collateral_value_myr", round(collateral_value_myr, 2))
         span.set_attribute("inputs.purity_factor", purity_factor)
         span.set_attribute("inputs.haircut_bps", haircut_bps)
+
+        # In-memory registry lookup, no I/O per loan
+        shop_rating = get_shop_rating(loan.shop_id)
+        if shop_rating:
+            span.set_attribute("metrics.shop_rating", shop_rating)
         
         print(f"[INFO] Metrics computed - LTV: {ltv:.2%}, Risk Level: {risk_level}, Collateral Value: {collateral_value_myr:.2f} MYR", file=sys.stderr)
 
@@ -269,8 +381,10 @@ def compute_metrics(
             margin_call_ltv=margin_call_ltv,
             vol_window_days=vol_window_days,
             gold_volatility=gold_vol,
+            gold_volatility_fallback=gold_vol_fallback,
             fx_usd_myr=fx,
-            shop_rating=None,
+            shop_rating=shop_rating,
+            **consensus,
         )
 
 
@@ -279,127 +393,33 @@ def compute_metrics(
 # ------------------------------------------------------------------------------
 def generate_explanations(loan: LoanInput, m: RiskMetrics, vol_threshold: float, tenure_limit: int, 
                          tracer: Tracer, abnormal_price_info: Optional[Dict[str, Any]] = None) -> List[RuleHit]:
-    hits: List[RuleHit] = []
     with tracer.start_as_current_span("generate_explanations") as span:
         span.set_attribute("inputs.vol_threshold", vol_threshold)
         span.set_attribute("inputs.tenure_limit_days", tenure_limit)
         span.set_attribute("inputs.ltv", round(m.ltv, 6))
         span.set_attribute("inputs.risk_level", m.risk_level)
 
-    # Risk Level Classification
-    risk_severity_map = {
-        "VERY_LOW": "info",
-        "LOW": "info",
-        "MEDIUM": "warn",
-        "HIGH": "warn",
-        "VERY_HIGH": "critical"
-    }
-    risk_messages = {
-        "VERY_LOW": f"Risk level VERY_LOW (LTV {m.ltv:.2%} < 60%)",
-        "LOW": f"Risk level LOW (LTV {m.ltv:.2%} between 61-69%)",
-        "MEDIUM": f"Risk level MEDIUM (LTV {m.ltv:.2%} between 70-79%)",
-        "HIGH": f"Risk level HIGH (LTV {m.ltv:.2%} between 80-85%)",
-        "VERY_HIGH": f"Risk level VERY_HIGH (LTV {m.ltv:.2%} > 85%)"
-    }
-    hits.append(RuleHit(
-        code=f"RISK_LEVEL_{m.risk_level}",
-        severity=risk_severity_map[m.risk_level],
-        message=risk_messages[m.risk_level],
-        details={"ltv": m.ltv, "risk_level": m.risk_level}
-    ))
-
-    # LTV thresholds
-    if m.ltv >= m.margin_call_ltv:
-        hits.append(RuleHit(
-            code="LTV_CRITICAL",
-            severity="critical",
-            message=f"LTV {m.ltv:.2f} ≥ margin-call threshold {m.margin_call_ltv:.2f}.",
-            details={"ltv": m.ltv, "margin_call_ltv": m.margin_call_ltv}
-        ))
-    elif m.ltv > m.max_safe_ltv:
-        hits.append(RuleHit(
-            code="LTV_ELEVATED",
-            severity="warn",
-            message=f"LTV {m.ltv:.2f} above safe limit {m.max_safe_ltv:.2f}.",
-            details={"ltv": m.ltv, "max_safe_ltv": m.max_safe_ltv}
-        ))
-    else:
-        hits.append(RuleHit(
-            code="LTV_OK",
-            severity="info",
-            message=f"LTV {m.ltv:.2f} within safe limit {m.max_safe_ltv:.2f}.",
-            details={"ltv": m.ltv, "max_safe_ltv": m.max_safe_ltv}
-        ))
-
-    # Collateral haircut context
-    hits.append(RuleHit(
-        code="HAIRCUT_APPLIED",
-        severity="info",
-        message=f"Applied haircut {m.haircut_bps} bps.",
-        details={"haircut_bps": m.haircut_bps}
-    ))
-
-    # Volatility vs policy threshold
-    if m.gold_volatility is not None:
-        if m.gold_volatility >= vol_threshold:
-            hits.append(RuleHit(
-                code="VOL_ELEVATED",
-                severity="warn",
-                message=f"30d volatility {m.gold_volatility:.2%} ≥ policy threshold {vol_threshold:.2%}.",
-                details={"volatility_30d": m.gold_volatility, "policy_vol_threshold": vol_threshold}
-            ))
-        else:
-            hits.append(RuleHit(
-                code="VOL_NORMAL",
-                severity="info",
-                message=f"30d volatility {m.gold_volatility:.2%} below policy threshold {vol_threshold:.2%}.",
-                details={"volatility_30d": m.gold_volatility, "policy_vol_threshold": vol_threshold}
-            ))
-
-        # Tenure
-    if loan.tenure_days >= tenure_limit:
-        hits.append(RuleHit(
-            code="TENURE_LONG",
-            severity="warn",
-            message=f"Tenure {loan.tenure_days}d ≥ policy limit {tenure_limit}d.",
-            details={"tenure_days": loan.tenure_days, "policy_tenure_limit_days": tenure_limit}
-        ))
-    else:
-        hits.append(RuleHit(
-            code="TENURE_NORMAL",
-            severity="info",
-            message=f"Tenure {loan.tenure_days}d within policy limit {tenure_limit}d.",
-            details={"tenure_days": loan.tenure_days, "policy_tenure_limit_days": tenure_limit}
-        ))
-
-    # Abnormal price detection
-    if abnormal_price_info:
-        if abnormal_price_info["is_abnormal"]:
-            hits.append(RuleHit(
-                code="PRICE_ABNORMAL",
-                severity="critical",
-                message=f"Gold price shows abnormal deviation: {abnormal_price_info['reason']}",
-                details={
-                    "current_price": abnormal_price_info["current_price"],
-                    "yesterday_price": abnormal_price_info["yesterday_price"],
-                    "deviation_percent": abnormal_price_info["deviation_percent"],
-                    "threshold_percent": abnormal_price_info["threshold_percent"]
-                }
-            ))
-        else:
-            hits.append(RuleHit(
-                code="PRICE_NORMAL",
-                severity="info",
-                message=f"Gold price within normal range: {abnormal_price_info['reason']}",
-                details={
-                    "current_price": abnormal_price_info["current_price"],
-                    "yesterday_price": abnormal_price_info["yesterday_price"],
-                    "deviation_percent": abnormal_price_info["deviation_percent"],
-                    "threshold_percent": abnormal_price_info["threshold_percent"]
-                }
-            ))
+        values: Dict[str, Any] = {
+            "ltv": m.ltv,
+            "risk_level": m.risk_level,
+            "max_safe_ltv": m.max_safe_ltv,
+            "margin_call_ltv": m.margin_call_ltv,
+            "haircut_bps": m.haircut_bps,
+            "gold_volatility": m.gold_volatility,
+            "vol_threshold": vol_threshold,
+            "tenure_days": loan.tenure_days,
+            "tenure_limit_days": tenure_limit,
+        }
+        if abnormal_price_info:
+            values.update(abnormal_price_info)
+            values["price_abnormal"] = 1 if abnormal_price_info["is_abnormal"] else 0
+
+        rules = get_rules()
+        mask = rules.evaluate_one(**values)
+        hits = [RuleHit(**hit) for hit in rules.render(mask, values)]
 
         # Summary attributes for quick filtering
+        span.set_attribute("explanations.mask", mask)
         span.set_attribute("explanations.count", len(hits))
         span.set_attribute("explanations.codes", ",".join([h.code for h in hits]))
     return hits
@@ -457,12 +477,13 @@ def encrypt_message(message: str, encryption_key: str) -> str:
 
 
 # ------------------------------------------------------------------------------
-# Ollama LLM caller
+# Hedera topic publishing
 # ------------------------------------------------------------------------------
-def send_to_hedera_topic(api_base: str, topic_id: str, message: str, encryption_key: str = "") -> None:
-    """Send an encrypted message to a Hedera topic via the Silsilat API."""
+def send_to_hedera_topic(api_base: str, topic_id: str, message: str, encryption_key: str = "",
+                         timeout: float = 10) -> bool:
+    """Send an encrypted message to a Hedera topic via the Silsilat API. Returns True if it was sent."""
     if not topic_id:
-        return  # Skip if topic ID not configured
+        return False  # Skip if topic ID not configured
     print(f"[INFO] Sending message to Hedera topic {topic_id}", file=sys.stderr)
     try:
         # Encrypt the message if encryption key is provided
@@ -474,15 +495,163 @@ def send_to_hedera_topic(api_base: str, topic_id: str, message: str, encryption_
             "message": encrypted_message
         }
         print(f"[INFO] Payload: {payload}", file=sys.stderr)
-        requests.post(url, json=payload, timeout=10)
+        resp = guarded_request("silsilat_api", "POST", url, json=payload, timeout=timeout)
+        resp.raise_for_status()
         print(f"[INFO] Sent encrypted message to Hedera topic {topic_id}", file=sys.stderr)
+        return True
     except Exception as e:
         print(f"[ERROR] Failed to send message to Hedera topic {topic_id}: {e}", file=sys.stderr)
+        return False
+
+
+def publish_evaluation(cfg: Dict[str, Any], user_prompt: str, rec: LLMRecommendation,
+                       metrics: RiskMetrics, timeout: float = 20, loan_id: Optional[str] = None,
+                       eval_id: Optional[str] = None, rule_codes: Iterable[str] = (),
+                       deadline: Optional[Deadline] = None) -> str:
+    """
+    Publish the prompt (input topic) and the recommendation with risk level
+    (output topic). `timeout` is shared between the two messages.
+
+    Runs as the deadline's "publish" stage: once that stage has expired
+    (and the evaluation reports it as skipped) no further message is sent.
+
+    With PUBLISH_DEDUP, a re-evaluated loan whose decision and material
+    metrics are unchanged since its last publish sends nothing, or only a
+    heartbeat to the output topic (see publish_state.py). Each topic is
+    decided and recorded on its own, so a failed output send is retried
+    next time without resending the input message. If the publish state
+    database fails, the messages are sent anyway. Returns the mode:
+    "publish" (either topic published), "heartbeat" or "skip".
+    """
+    per_message = min(10.0, timeout / 2)
+
+    def send(topic_id: str, message: str) -> bool:
+        if not topic_id:
+            return True  # unconfigured topic: nothing to send
+        if deadline is not None:
+            if deadline.stage_expired("publish"):
+                print(f"[WARN] Publish stage expired; not sending to topic {topic_id}", file=sys.stderr)
+                return False
+            return send_to_hedera_topic(cfg["SILSILAT_API_BASE"], topic_id, message, cfg["IPFS_ENCRYPTION_KEY"],
+                                        timeout=min(per_message, deadline.stage_remaining("publish")))
+        return send_to_hedera_topic(cfg["SILSILAT_API_BASE"], topic_id, message, cfg["IPFS_ENCRYPTION_KEY"],
+                                    timeout=per_message)
+
+    state = {
+        "risk_level": metrics.risk_level,
+        "action": rec.action,
+        "policy_hash": cfg.get("POLICY_HASH"),
+        "digest": metrics_digest(metrics.model_dump(), rule_codes),
+        "eval_id": eval_id,
+    }
+    index = get_publish_state() if PUBLISH_DEDUP and loan_id else None
+
+    def decide(topic: str) -> str:
+        if index is None:
+            return PUBLISH
+        try:
+            return index.decide(loan_id, state, topic)
+        except sqlite3.Error as e:
+            print(f"[WARN] Publish state unavailable ({e}); publishing loan {loan_id} to the {topic} topic",
+                  file=sys.stderr)
+            return PUBLISH
+
+    def record(topic: str, topic_mode: str) -> None:
+        # Only confirmed sends (unconfigured topics aside) move the baseline; failures retry next time
+        if index is None:
+            return
+        try:
+            index.record(loan_id, state, topic_mode, topic)
+        except sqlite3.Error as e:
+            print(f"[WARN] Could not record publish state of loan {loan_id} ({topic}): {e}", file=sys.stderr)
+
+    mode_in, mode_out = decide(INPUT_TOPIC), decide(OUTPUT_TOPIC)
+    mode = PUBLISH if PUBLISH in (mode_in, mode_out) else mode_out
+    telemetry.inc("publish.decisions", mode=mode)
+    if mode == SKIP:
+        print(f"[INFO] Loan {loan_id} unchanged since its last publish; topic messages skipped", file=sys.stderr)
+        return mode
+
+    # Send encrypted input to Hedera topic (without risk_level)
+    if mode_in == PUBLISH and send(cfg["INPUT_TOPIC_ID"], user_prompt):
+        record(INPUT_TOPIC, PUBLISH)
+    if mode_out == HEARTBEAT:
+        try:
+            last = index.get(loan_id, OUTPUT_TOPIC)
+        except sqlite3.Error:
+            last = None
+        if send(cfg["OUTPUT_TOPIC_ID"], heartbeat_message(loan_id, state, last)):
+            record(OUTPUT_TOPIC, HEARTBEAT)
+    elif mode_out == PUBLISH:
+        # Send encrypted AI response with risk_level to Hedera topic
+        output_data = {
+            "risk_level": metrics.risk_level,
+            "llm_response": rec.rationale,
+            "metrics": metrics.model_dump(),
+        }
+        if send(cfg["OUTPUT_TOPIC_ID"], json.dumps(output_data)):
+            record(OUTPUT_TOPIC, PUBLISH)
+    return mode
 
 
-def call_ollama(base_url: str, model: str, system_prompt: str, user_prompt: str, tracer: Tracer, 
-                api_base: str = "", input_topic_id: str = "", output_topic_id: str = "", 
-                risk_level: str = "", metrics: Optional[Dict[str, Any]] = None, encryption_key: str = "") -> str:
+# ------------------------------------------------------------------------------
+# Ollama LLM caller
+# ------------------------------------------------------------------------------
+_NS_PER_MS = 1_000_000
+
+
+def record_ollama_timings(span: Any, data: Dict[str, Any], model: str) -> None:
+    """
+    Copy Ollama's response timings onto the span and into the telemetry histograms.
+
+    Ollama reports durations in nanoseconds. For non-streaming calls the time
+    to first token is load_duration + prompt_eval_duration. A prompt_eval_count
+    well below the prompt size means the cached prefix was reused.
+    """
+    total_ns = data.get("total_duration")
+    load_ns = data.get("load_duration")
+    prompt_count = data.get("prompt_eval_count")
+    prompt_ns = data.get("prompt_eval_duration")
+    eval_count = data.get("eval_count")
+    eval_ns = data.get("eval_duration")
+
+    if total_ns is not None:
+        span.set_attribute("llm.total_duration_ms", total_ns / _NS_PER_MS)
+        telemetry.observe("llm.total_ms", total_ns / _NS_PER_MS, model=model)
+    if load_ns is not None:
+        span.set_attribute("llm.load_duration_ms", load_ns / _NS_PER_MS)
+        telemetry.observe("llm.load_ms", load_ns / _NS_PER_MS, model=model)
+    if prompt_count is not None:
+        span.set_attribute("llm.prompt_eval_count", prompt_count)
+        telemetry.observe("llm.prompt_eval_count", prompt_count, model=model)
+    if prompt_ns is not None:
+        span.set_attribute("llm.prompt_eval_duration_ms", prompt_ns / _NS_PER_MS)
+        if prompt_count and prompt_ns > 0:
+            rate = prompt_count / (prompt_ns / 1e9)
+            span.set_attribute("llm.prompt_tokens_per_s", round(rate, 2))
+            telemetry.observe("llm.prompt_tokens_per_s", rate, model=model)
+    if eval_count is not None:
+        span.set_attribute("llm.eval_count", eval_count)
+        telemetry.observe("llm.eval_count", eval_count, model=model)
+    if eval_ns is not None:
+        span.set_attribute("llm.eval_duration_ms", eval_ns / _NS_PER_MS)
+        if eval_count and eval_ns > 0:
+            rate = eval_count / (eval_ns / 1e9)
+            span.set_attribute("llm.tokens_per_s", round(rate, 2))
+            telemetry.observe("llm.tokens_per_s", rate, model=model)
+    if load_ns is not None or prompt_ns is not None:
+        ttft_ms = ((load_ns or 0) + (prompt_ns or 0)) / _NS_PER_MS
+        span.set_attribute("llm.ttft_ms", ttft_ms)
+        telemetry.observe("llm.ttft_ms", ttft_ms, model=model)
+
+
+def call_ollama(base_url: str, model: str, system_prompt: str, user_prompt: str, tracer: Tracer,
+                timeout: float = 120, pool: Optional[OllamaPool] = None,
+                keep_alive: Optional[str] = None) -> str:
+    # A single base_url behaves exactly like a one-node pool
+    pool = pool or get_pool([base_url])
+    breaker = get_breaker("ollama")
+    expires_at = time.monotonic() + timeout
     chat_url = f"{base_url}/api/chat"
     gen_url = f"{base_url}/api/generate"
     payload_chat = {
@@ -494,40 +663,41 @@ def call_ollama(base_url: str, model: str, system_prompt: str, user_prompt: str,
         "stream": False,
         "options": {"temperature": 0.2, "top_p": 0.9},
     }
+    if keep_alive:
+        # Keep the model (and its cached system-prompt prefix) resident between calls
+        payload_chat["keep_alive"] = keep_alive
 
     print(f"[INFO] Calling Ollama LLM - Model: {model}", file=sys.stderr)
     with tracer.start_as_current_span("call_ollama") as span:
         span.set_attribute("llm.model", model)
         span.set_attribute("ollama.endpoint", chat_url)
+        span.set_attribute("llm.timeout_s", round(timeout, 3))
         
         # Track AI agent input (Generative AI semantic key)
         span.set_attribute("input.value", user_prompt)
-        # Send encrypted input to Hedera topic (without risk_level)
-        send_to_hedera_topic(api_base, input_topic_id, user_prompt, encryption_key)
 
         try:
-            resp = requests.post(chat_url, json=payload_chat, timeout=120)
+            resp = breaker.call(pool.post, "/api/chat", payload_chat, timeout=timeout)
             if resp.ok:
+                span.set_attribute("ollama.endpoint", resp.url)
                 data = resp.json()
                 text = data.get("message", {}).get("content", "").strip()
                 print(f"[INFO] LLM response received via chat API (length: {len(text)} chars)", file=sys.stderr)
                 
-                # Create output with risk_level included
-                output_data = {
-                    "risk_level": risk_level,
-                    "llm_response": text,
-                    "metrics": metrics
-                }
-                # Send encrypted AI response with risk_level to Hedera topic
-                send_to_hedera_topic(api_base, output_topic_id, json.dumps(output_data), encryption_key)
-                
                 span.set_attribute("llm.mode", "chat")
                 span.set_attribute("llm.tokens_out_len", len(text))
+                record_ollama_timings(span, data, model)
                 span.set_attribute("output.value", text)
                 return text
+        except CircuitOpenError:
+            raise  # Ollama is known to be down: fail fast, no generate retry
         except Exception as e:
             span.add_event("ollama_chat_error", {"error": str(e)})
 
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Ollama chat API used the whole {timeout:.1f}s LLM budget")
+
         span.set_attribute("ollama.endpoint", gen_url)
         gen_prompt = f"{system_prompt}\n\n{user_prompt}"
         payload_gen = {
@@ -536,23 +706,18 @@ def call_ollama(base_url: str, model: str, system_prompt: str, user_prompt: str,
             "stream": False,
             "options": {"temperature": 0.2, "top_p": 0.9},
         }
+        if keep_alive:
+            payload_gen["keep_alive"] = keep_alive
 
-        resp = requests.post(gen_url, json=payload_gen, timeout=120)
-        resp.raise_for_status()
-        text = resp.json().get("response", "").strip()
+        resp = breaker.call(pool.post, "/api/generate", payload_gen, timeout=remaining)
+        span.set_attribute("ollama.endpoint", resp.url)
+        data = resp.json()
+        text = data.get("response", "").strip()
         print(f"[INFO] LLM response received via generate API (length: {len(text)} chars)", file=sys.stderr)
-        
-        # Create output with risk_level included
-        output_data = {
-            "risk_level": risk_level,
-            "llm_response": text,
-            "metrics": metrics
-        }
-        # Send encrypted AI response with risk_level to Hedera topic
-        send_to_hedera_topic(api_base, output_topic_id, json.dumps(output_data), encryption_key)
 
         span.set_attribute("llm.mode", "generate")
         span.set_attribute("llm.tokens_out_len", len(text))
+        record_ollama_timings(span, data, model)
         # Track AI agent output (Generative AI semantic key)
         span.set_attribute("output.value", text)
         return text
@@ -561,32 +726,34 @@ def call_ollama(base_url: str, model: str, system_prompt: str, user_prompt: str,
 # ------------------------------------------------------------------------------
 # Recommendation generator
 # ------------------------------------------------------------------------------
+def render_recommendation_prompt(loan: LoanInput, metrics: RiskMetrics,
+                                 token_budget: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Compact user prompt for the recommendation; risk_level is deliberately not
+    part of the encoded metrics. Returns (prompt, estimated prompt tokens).
+    """
+    return build_recommendation_prompt(loan.model_dump(), metrics.model_dump(), token_budget)
+
+
 def build_recommendation_with_llm(
     loan: LoanInput, metrics: RiskMetrics, llm_model: str, base_url: str, tracer: Tracer,
-    api_base: str = "", input_topic_id: str = "", output_topic_id: str = "", encryption_key: str = ""
+    timeout: float = 120, pool: Optional[OllamaPool] = None,
+    token_budget: Optional[int] = None, keep_alive: Optional[str] = None,
+    prompt: Optional[Tuple[str, int]] = None,
 ) -> LLMRecommendation:
+    """`prompt` is render_recommendation_prompt()'s result when the caller already has it."""
     print(f"[INFO] Building recommendation with LLM - Action will be based on risk level: {metrics.risk_level}", file=sys.stderr)
     with tracer.start_as_current_span("build_recommendation_with_llm") as span:
-        loan_json = loan.model_dump_json()
-        
-        # Create metrics dict without risk_level for the prompt
-        metrics_dict = metrics.model_dump()
-        metrics_dict.pop("risk_level", None)  # Remove risk_level from input
-        metrics_json = json.dumps(metrics_dict)
-        
-        user_prompt = RECOMMENDATION_PROMPT.format(
-            loan_json=loan_json,
-            metrics_json=metrics_json,
-            allowed_actions="approve | monitor | margin_call | reject",
-        )
+        user_prompt, prompt_tokens = prompt or render_recommendation_prompt(loan, metrics, token_budget)
         span.set_attribute("input.value", user_prompt)
+        span.set_attribute("llm.prompt_chars", len(SYSTEM_PROMPT) + len(user_prompt))
+        span.set_attribute("llm.prompt_tokens_est", prompt_tokens)
 
         llm_text = call_ollama(
             base_url, llm_model, SYSTEM_PROMPT, user_prompt, tracer,
-            api_base, input_topic_id, output_topic_id,
-            risk_level=metrics.risk_level,
-            metrics=metrics.model_dump(),
-            encryption_key=encryption_key
+            timeout=timeout,
+            pool=pool,
+            keep_alive=keep_alive,
         )
         span.set_attribute("output.value", llm_text)
         span.set_attribute("llm.model", llm_model)
@@ -603,10 +770,93 @@ def build_recommendation_with_llm(
         return LLMRecommendation(model=llm_model, rationale=llm_text, action=chosen_action)
 
 
+def build_rule_based_recommendation(metrics: RiskMetrics, reason: str) -> LLMRecommendation:
+    """
+    Deterministic fallback used when the LLM stage is out of budget or unavailable.
+    Mirrors the LTV guidance given to the model in SYSTEM_PROMPT.
+    """
+    if metrics.ltv >= metrics.margin_call_ltv:
+        action = "margin_call"
+        why = f"LTV {metrics.ltv:.2f} ≥ margin_call_ltv {metrics.margin_call_ltv:.2f}."
+    elif metrics.ltv > metrics.max_safe_ltv:
+        action = "monitor"
+        why = f"LTV {metrics.ltv:.2f} above max_safe_ltv {metrics.max_safe_ltv:.2f}."
+    else:
+        action = "approve"
+        why = f"LTV {metrics.ltv:.2f} within max_safe_ltv {metrics.max_safe_ltv:.2f}."
+    rationale = f"Action: {action}\nRationale: {why} Risk level {metrics.risk_level}. (Rule-based; {reason}.)"
+    return LLMRecommendation(model="rule-based", rationale=rationale, action=action)
+
+
 # ------------------------------------------------------------------------------
 # Orchestration (one-shot evaluation)
 # ------------------------------------------------------------------------------
-def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> EvaluationOutput:
+def acquire_market_snapshot(cfg: Dict[str, Any], deadline: Deadline) -> MarketSnapshot:
+    """
+    The market snapshot this evaluation runs on.
+
+    A fresh snapshot published by the background refresher is used as-is (no
+    I/O). Otherwise one is built within the price stage budget, falling back
+    to the last cached values when the stage runs out of time or every price
+    provider fails.
+    """
+    snap = current_snapshot(max_age_s=cfg["MARKET_SNAPSHOT_MAX_AGE_SECONDS"])
+    if snap is not None:
+        return snap
+
+    try:
+        ok, snap = deadline.run(
+            "price", refresh_market_snapshot,
+            timeout=max(0.1, deadline.stage_allowance("price")),
+            vol_window_days=cfg["VOL_WINDOW"],
+            deviation_threshold=cfg["PRICE_DEVIATION_THRESHOLD"],
+        )
+        reason = "Price fetch exceeded its budget"
+    except Exception as e:
+        ok, reason = False, f"Price fetch failed ({e})"
+    if ok:
+        return snap
+
+    deadline.mark_degraded("price", "cached")
+    print(f"[WARN] {reason}; falling back to cached market data", file=sys.stderr)
+    try:
+        return snapshot_from_cache(cfg["VOL_WINDOW"], cfg["PRICE_DEVIATION_THRESHOLD"])
+    except LookupError:
+        raise TimeoutError(f"{reason} and no cached gold price is available")
+
+
+_in_flight = SingleFlight("evaluate_loan")
+
+def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer,
+                  deadline: Optional[Deadline] = None) -> EvaluationOutput:
+    """
+    Evaluate one loan. Concurrent calls in this process with identical inputs
+    under the same policy (e.g. a backend retry racing the original) share
+    one evaluation: the first runs it, the others wait within their own
+    deadline and get a copy of its output, so only one LLM call and one set
+    of topic messages is made. A waiter whose deadline runs out first
+    evaluates on its spent deadline instead: snapshot or cached prices, the
+    rule-based recommendation and no topic messages.
+    """
+    deadline = deadline or Deadline(cfg["EVAL_DEADLINE_SECONDS"])
+    key = evaluation_key(loan.model_dump(mode="json"), cfg)
+    try:
+        output, shared = _in_flight.do(key, _evaluate_loan, loan, cfg, tracer, deadline,
+                                       timeout=max(0.0, deadline.remaining()))
+    except WaitTimeout:
+        print("[WARN] Identical in-flight evaluation outlasted this deadline; degrading", file=sys.stderr)
+        return _evaluate_loan(loan, cfg, tracer, deadline)
+    if not shared:
+        return output
+    with tracer.start_as_current_span("evaluate_loan") as span:
+        span.set_attribute("singleflight.shared", True)
+        span.set_attribute("eval.id", output.eval_id)
+    print(f"[INFO] Joined in-flight evaluation {output.eval_id} with identical inputs", file=sys.stderr)
+    return output.model_copy(deep=True)
+
+
+def _evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer,
+                   deadline: Deadline) -> EvaluationOutput:
     eval_id = str(uuid.uuid4())
     timestamp_utc = datetime.now(timezone.utc).isoformat()
     
@@ -623,6 +873,7 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
         span.set_attribute("policy.version", cfg.get("POLICY_VERSION", "unknown"))
         span.set_attribute("policy.hash", cfg.get("POLICY_HASH", ""))
         span.set_attribute("policy.id", cfg.get("POLICY_ID", ""))
+        span.set_attribute("policy.revision", cfg.get("POLICY_REVISION", 0))
         # thresholds for quick filters
         span.set_attribute("policy.max_safe_ltv", cfg["MAX_SAFE_LTV"])
         span.set_attribute("policy.margin_call_ltv", cfg["MARGIN_CALL_LTV"])
@@ -630,24 +881,27 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
         span.set_attribute("policy.vol_threshold", cfg["VOL_THRESHOLD"])
         span.set_attribute("policy.tenure_limit_days", cfg["TENURE_LIMIT_DAYS"])
         span.set_attribute("policy.price_deviation_threshold", cfg["PRICE_DEVIATION_THRESHOLD"])
+        span.set_attribute("deadline.budget_s", deadline.budget_s)
 
         # 1) Fetch gold price and detect abnormalities
         print("[INFO] Step 1: Fetching current gold price...", file=sys.stderr)
         with tracer.start_as_current_span("fetch_gold_price") as span_price:
-            gold_price = float(get_gold_price_myr())
+            snapshot = acquire_market_snapshot(cfg, deadline)
+            gold_price = snapshot.gold_price_myr_per_g
+            yesterday_price = snapshot.yesterday_gold_price_myr_per_g
+            span_price.set_attribute("market.snapshot_id", snapshot.snapshot_id)
+            span_price.set_attribute("market.snapshot_source", snapshot.source)
+            span_price.set_attribute("market.snapshot_age_s", round(snapshot.age_s(), 3))
             span_price.set_attribute("result.gold_price_myr_per_g", gold_price)
-            
-            # Fetch yesterday's price for comparison
-            yesterday_price = get_yesterday_gold_price_myr()
+            span_price.set_attribute("result.degraded", "price:cached" in deadline.degraded)
             span_price.set_attribute("result.yesterday_gold_price_myr_per_g", yesterday_price or 0.0)
             
-            # Detect abnormal price changes
+            # Anomaly verdict captured in the snapshot (computed once per price tick)
             price_deviation_threshold = cfg["PRICE_DEVIATION_THRESHOLD"]
-            abnormal_detection = detect_abnormal_price_change(
-                current_price=gold_price,
-                yesterday_price=yesterday_price,
-                max_deviation_percent=price_deviation_threshold
-            )
+            abnormal_detection = dict(snapshot.anomaly)
+            span_price.set_attribute("price_analysis.triggers", ",".join(abnormal_detection.get("triggers", [])))
+            if abnormal_detection.get("z_score") is not None:
+                span_price.set_attribute("price_analysis.z_score", abnormal_detection["z_score"])
             
             # Log abnormal price detection to Phoenix with admin-friendly attributes
             span_price.set_attribute("price_analysis.is_abnormal", abnormal_detection["is_abnormal"])
@@ -668,23 +922,32 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
                 span_price.set_attribute("admin.price_change_summary", 
                     f"Gold price {abnormal_detection['deviation_percent']:.1f}% deviation detected")
                 span_price.set_attribute("admin.current_price_myr", gold_price)
-                span_price.set_attribute("admin.yesterday_price_myr", yesterday_price)
-                span_price.set_attribute("admin.price_difference_myr", abs(gold_price - yesterday_price))
-                
-                # Critical event with detailed context
-                span_price.add_event("CRITICAL_GOLD_PRICE_ANOMALY", {
+                # The verdict can come from the z-score or rate of change with no
+                # yesterday price; fall back to the detector's own previous close
+                reference_price = yesterday_price if yesterday_price is not None \
+                    else abnormal_detection.get("yesterday_price")
+                alert_event: Dict[str, Any] = {
                     "alert_type": "GOLD_PRICE_ABNORMAL",
                     "severity": "CRITICAL",
                     "priority": "P0",
                     "current_price_myr": gold_price,
-                    "yesterday_price_myr": yesterday_price,
                     "deviation_percent": abnormal_detection["deviation_percent"],
                     "threshold_percent": price_deviation_threshold,
-                    "price_difference_myr": abs(gold_price - yesterday_price),
-                    "direction": "increase" if gold_price > yesterday_price else "decrease",
+                    "triggers": ",".join(abnormal_detection.get("triggers", [])),
                     "admin_action_required": True,
                     "timestamp": datetime.now(timezone.utc).isoformat()
-                })
+                }
+                if reference_price is not None:
+                    span_price.set_attribute("admin.yesterday_price_myr", reference_price)
+                    span_price.set_attribute("admin.price_difference_myr", abs(gold_price - reference_price))
+                    alert_event.update({
+                        "yesterday_price_myr": reference_price,
+                        "price_difference_myr": abs(gold_price - reference_price),
+                        "direction": "increase" if gold_price > reference_price else "decrease",
+                    })
+                
+                # Critical event with detailed context
+                span_price.add_event("CRITICAL_GOLD_PRICE_ANOMALY", alert_event)
                 
                 # Set span status to ERROR for immediate visibility
                 span_price.set_status(Status(StatusCode.ERROR, "Abnormal gold price detected"))
@@ -695,6 +958,20 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
                 span_price.set_attribute("admin.price_change_summary", 
                     f"Gold price normal ({abnormal_detection['deviation_percent']:.1f}% deviation)")
 
+        # Identical inputs on the same policy and (bucketed) market inputs: reuse the
+        # stored result (no LLM call, no new topic messages). Not journaled again:
+        # the original evaluation, same eval_id, was journaled when it ran.
+        cache = get_eval_cache()
+        cache_key = (evaluation_key(loan.model_dump(mode="json"), cfg, market_key(snapshot))
+                     if cache.enabled else None)
+        cached = cache.get(cache_key) if cache_key else None
+        span.set_attribute("eval_cache.hit", cached is not None)
+        if cached is not None:
+            output = EvaluationOutput.model_validate_json(cached)
+            span.set_attribute("eval_cache.original_eval_id", output.eval_id)
+            print(f"[INFO] Identical evaluation {output.eval_id} found in cache; returning it", file=sys.stderr)
+            return output
+
         # 2) Compute metrics (using jewellery haircut as default)
         print("[INFO] Step 2: Computing risk metrics...", file=sys.stderr)
         metrics = compute_metrics(
@@ -705,8 +982,33 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
             margin_call_ltv=cfg["MARGIN_CALL_LTV"],
             vol_window_days=cfg["VOL_WINDOW"],
             tracer=tracer,
+            deadline=deadline,
+            snapshot=snapshot,
         )
 
+        # Margin-call probability over the loan's tenure (needs measured volatility;
+        # the VOL_FALLBACK placeholder would be simulated as if it were the market's)
+        if cfg["MC_PATHS"] > 0 and metrics.gold_volatility and metrics.gold_volatility_fallback:
+            print("[INFO] Skipping margin-call probability: volatility is the VOL_FALLBACK placeholder",
+                  file=sys.stderr)
+            get_current_span().set_attribute("mc.skipped", "fallback_volatility")
+        elif cfg["MC_PATHS"] > 0 and metrics.gold_volatility:
+            with tracer.start_as_current_span("margin_call_probability") as span_mc:
+                metrics.margin_call_probability = margin_call_probability(
+                    principal_myr=loan.principal_myr,
+                    gold_weight_g=loan.gold_weight_g,
+                    purity=loan.purity,
+                    tenure_days=loan.tenure_days,
+                    base_price_myr_per_g=metrics.gold_price_myr_per_g,
+                    daily_vol=metrics.gold_volatility,
+                    haircut_bps=metrics.haircut_bps,
+                    margin_call_ltv=metrics.margin_call_ltv,
+                    n_paths=cfg["MC_PATHS"],
+                    seed=cfg["MC_SEED"],
+                )
+                span_mc.set_attribute("metrics.margin_call_probability", metrics.margin_call_probability)
+                span_mc.set_attribute("mc.paths", cfg["MC_PATHS"])
+
         # 3) Rule explanations using policy thresholds
         print("[INFO] Step 3: Generating rule explanations...", file=sys.stderr)
         explanations = generate_explanations(
@@ -717,22 +1019,48 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
             abnormal_price_info=abnormal_detection,
         )
 
-        # 4) LLM recommendation
+        # 4) LLM recommendation (the same prompt is published in step 5)
         print("[INFO] Step 4: Getting LLM recommendation...", file=sys.stderr)
-        rec = build_recommendation_with_llm(
-            loan=loan,
-            metrics=metrics,
-            llm_model=cfg["DEFAULT_LLM_MODEL"],
-            base_url=cfg["OLLAMA_BASE_URL"],
-            tracer=tracer,
-            api_base=cfg["SILSILAT_API_BASE"],
-            input_topic_id=cfg["INPUT_TOPIC_ID"],
-            output_topic_id=cfg["OUTPUT_TOPIC_ID"],
-            encryption_key=cfg["IPFS_ENCRYPTION_KEY"],
-        )
-
-        # 5) Decision attributes and admin visibility
+        prompt = render_recommendation_prompt(loan, metrics, cfg["PROMPT_TOKEN_BUDGET"])
+        llm_timeout = deadline.stage_allowance("llm")
+        try:
+            ok, rec = deadline.run(
+                "llm", build_recommendation_with_llm,
+                loan=loan,
+                metrics=metrics,
+                llm_model=cfg["DEFAULT_LLM_MODEL"],
+                base_url=cfg["OLLAMA_BASE_URL"],
+                tracer=tracer,
+                timeout=llm_timeout,
+                pool=ollama_pool_from_config(cfg),
+                token_budget=cfg["PROMPT_TOKEN_BUDGET"],
+                keep_alive=cfg["OLLAMA_KEEP_ALIVE"],
+                prompt=prompt,
+            )
+            fallback_reason = f"LLM exceeded its {llm_timeout:.1f}s budget"
+        except Exception as e:
+            print(f"[WARN] LLM recommendation failed: {e}", file=sys.stderr)
+            ok, fallback_reason = False, "LLM unavailable"
+        if not ok:
+            deadline.mark_degraded("llm", "rule_based")
+            rec = build_rule_based_recommendation(metrics, fallback_reason)
+            print(f"[WARN] {fallback_reason}; using rule-based recommendation: {rec.action.upper()}", file=sys.stderr)
+
+        # 5) Publish prompt and decision to the Hedera topics
+        print("[INFO] Step 5: Publishing to Hedera topics...", file=sys.stderr)
+        ok, publish_mode = deadline.run("publish", publish_evaluation, cfg, prompt[0], rec, metrics,
+                                        timeout=deadline.stage_allowance("publish"), loan_id=loan.loan_id,
+                                        eval_id=eval_id, rule_codes=[e.code for e in explanations],
+                                        deadline=deadline)
+        span.set_attribute("publish.mode", publish_mode or "timeout")
+        if not ok:
+            deadline.mark_degraded("publish", "skipped")
+            print("[WARN] Publish stage ran out of budget; topic messages skipped", file=sys.stderr)
+
+        # 6) Decision attributes and admin visibility
         span.set_attribute("decision.action", rec.action)
+        span.set_attribute("deadline.elapsed_s", round(deadline.elapsed(), 3))
+        span.set_attribute("deadline.degraded", ",".join(deadline.degraded))
         
         # Enhanced admin visibility for abnormal prices
         if abnormal_detection["is_abnormal"]:
@@ -776,12 +1104,22 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
         recommendation=rec,
         explanations=explanations,
         policy=policy_meta,  # NEW
+        degraded=list(deadline.degraded),
+        market_snapshot_id=snapshot.snapshot_id,
     )
     
     # Track AI agent output (final evaluation result)
+    output_json = output.model_dump_json()
     current_span = get_current_span()
     if current_span:
-        current_span.set_attribute("output.value", output.model_dump_json())
+        current_span.set_attribute("output.value", output_json)
+    if cache_key and not deadline.degraded:
+        cache.put(cache_key, output_json)
+    if JOURNAL_ENABLED:
+        try:
+            get_journal_writer().append_json(output_json, eval_id, loan.loan_id, timestamp_utc)
+        except OSError as e:
+            print(f"[WARN] Could not journal evaluation {eval_id}: {e}", file=sys.stderr)
     
     print(f"[INFO] ========== Evaluation complete - Final recommendation: {rec.action.upper()} ==========", file=sys.stderr)
     print(f"[INFO] Trace ID: {trace_id_hex}", file=sys.stderr)
@@ -794,6 +1132,10 @@ def evaluate_loan(loan: LoanInput, cfg: Dict[str, Any], tracer: Tracer) -> Evalu
 # ------------------------------------------------------------------------------
 def main(argv: list[str]) -> int:
     print("[INFO] Gold Evaluator Agent starting...", file=sys.stderr)
+    # --telemetry-report: dump LLM/breaker metrics to stderr when the run finishes
+    telemetry_report = "--telemetry-report" in argv
+    argv = [a for a in argv if a != "--telemetry-report"]
+    policy.install_sighup_handler()
     cfg = load_config_with_policy()
     print("[INFO] Initializing Phoenix tracing...", file=sys.stderr)
     tracer = init_tracing(
@@ -824,6 +1166,8 @@ def main(argv: list[str]) -> int:
         output = evaluate_loan(loan, cfg, tracer)
         print("\n[INFO] Returning evaluation result...", file=sys.stderr)
         print(output.model_dump_json(indent=2, ensure_ascii=False))
+        if telemetry_report:
+            print(f"[INFO] Telemetry summary:\n{telemetry.summary_report()}", file=sys.stderr)
         return 0
     except Exception as e:
         print(f"[ERROR] Fatal error during evaluation: {e}", file=sys.stderr)
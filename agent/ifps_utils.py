@@ -16,6 +16,7 @@ import os
 import requests
 from typing import Optional, Dict, Any
 
+from circuit_breaker import guarded_request
 from dotenv import load_dotenv
 load_dotenv(".env")
 
@@ -81,7 +82,7 @@ def pinata_add_bytes(data: bytes, filename: str = "artifact.json", metadata: Opt
         "pinataOptions": json.dumps(pinata_options)
     }
     
-    resp = requests.post(url, files=files, data=data_payload, headers=headers, timeout=60)
+    resp = guarded_request("pinata", "POST", url, files=files, data=data_payload, headers=headers, timeout=60)
     resp.raise_for_status()
     
     result = resp.json()
@@ -136,7 +137,7 @@ def pinata_pin_by_hash(hash_to_pin: str, metadata: Optional[Dict[str, Any]] = No
         }
     }
     
-    resp = requests.post(url, json=payload, headers=headers, timeout=60)
+    resp = guarded_request("pinata", "POST", url, json=payload, headers=headers, timeout=60)
     resp.raise_for_status()
     return resp.json()
 
@@ -145,7 +146,7 @@ def pinata_unpin(hash_to_unpin: str) -> bool:
     url = f"{PINATA_API_URL}/pinning/unpin/{hash_to_unpin}"
     headers = _pinata_headers()
     
-    resp = requests.delete(url, headers=headers, timeout=60)
+    resp = guarded_request("pinata", "DELETE", url, headers=headers, timeout=60)
     return resp.status_code == 200
 
 def pinata_list_pins() -> Dict[str, Any]:
@@ -153,6 +154,6 @@ def pinata_list_pins() -> Dict[str, Any]:
     url = f"{PINATA_API_URL}/data/pinList"
     headers = _pinata_headers()
     
-    resp = requests.get(url, headers=headers, timeout=60)
+    resp = guarded_request("pinata", "GET", url, headers=headers, timeout=60)
     resp.raise_for_status()
     return resp.json()
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+journal.py
+
+Append-only, indexed journal of EvaluationOutput records.
+
+Every evaluation is appended to JOURNAL_DIR as one frame of a segment log:
+
+    seg-00000001.log   [u32 length][u32 crc32][zlib(EvaluationOutput JSON)] ...
+    seg-00000001.idx   fixed-width rows, one per frame (INDEX_DTYPE):
+                       ts (unix s), offset, length, eval key, loan key
+
+Segments rotate at JOURNAL_SEGMENT_MAX_BYTES; closed segments never change.
+The keys are blake2b digests of eval_id (16 bytes) and loan_id (8 bytes),
+so lookups are vectorized compares over the memory-mapped index and only
+the matching frames are read (through mmap) and decompressed. Loan keys
+are confirmed against the decoded record.
+
+Appends take an exclusive flock on journal.lock, so batch worker processes
+can share one journal. After a crash the newest segment is repaired on
+open: a partial index row is dropped, frames written but not indexed are
+re-indexed, and a torn frame at the end of the log is truncated.
+
+Queries:
+    Journal(path).get(eval_id)                  -> record or None
+    Journal(path).by_loan(loan_id, start, end)  -> records, oldest first
+    Journal(path).range(start, end)             -> records in [start, end)
+    Journal(path).iter_records()                -> every record
+
+CLI:
+    python journal.py stats [--dir data/journal]
+    python journal.py get EVAL_ID
+    python journal.py loan LOAN_ID [--start ISO] [--end ISO]
+    python journal.py range --start ISO [--end ISO]
+    python journal.py import evals.jsonl [more.jsonl ...]
+"""
+
+import contextlib
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:     # Windows: single-process appends only
+    fcntl = None
+
+load_dotenv(".env")
+
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "true").lower() == "true"
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data/journal")
+JOURNAL_SEGMENT_MAX_BYTES = int(os.getenv("JOURNAL_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+JOURNAL_COMPRESSION_LEVEL = int(os.getenv("JOURNAL_COMPRESSION_LEVEL", "6"))
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "false").lower() == "true"
+
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("offset", "<u8"), ("length", "<u4"),
+                        ("eval_key", "S16"), ("loan_key", "<u8")])
+_FRAME = struct.Struct("<II")
+_ROW = struct.Struct("<dQI16sQ")            # one INDEX_DTYPE row
+assert _ROW.size == INDEX_DTYPE.itemsize
+_SEGMENT_RE = re.compile(r"seg-(\d{8})\.log$")
+
+
+def eval_key(eval_id: str) -> bytes:
+    return hashlib.blake2b(eval_id.encode("utf-8"), digest_size=16).digest()
+
+
+def loan_key(loan_id: Optional[str]) -> int:
+    """0 means "no loan id"."""
+    if not loan_id:
+        return 0
+    return int.from_bytes(hashlib.blake2b(str(loan_id).encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+def to_unix(value: Any) -> float:
+    """Unix seconds from a number, datetime or ISO-8601 string (naive = UTC)."""
+    if value is None:
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _record_meta(record: Dict[str, Any]) -> Tuple[str, Optional[str], float]:
+    return (str(record.get("eval_id", "")), (record.get("inputs") or {}).get("loan_id"),
+            to_unix(record.get("timestamp_utc")))
+
+
+def _segment_paths(root: str, seq: int) -> Tuple[str, str]:
+    base = os.path.join(root, f"seg-{seq:08d}")
+    return f"{base}.log", f"{base}.idx"
+
+
+def _segment_seqs(root: str) -> List[int]:
+    seqs = []
+    for path in glob.glob(os.path.join(root, "seg-*.log")):
+        m = _SEGMENT_RE.search(path)
+        if m:
+            seqs.append(int(m.group(1)))
+    return sorted(seqs)
+
+
+# ------------------------------------------------------------------------------
+# Writing
+# ------------------------------------------------------------------------------
+class JournalWriter:
+    """Appends records to the newest segment, rotating at `segment_max_bytes`."""
+
+    def __init__(self, root: str = JOURNAL_DIR, segment_max_bytes: int = JOURNAL_SEGMENT_MAX_BYTES,
+                 compression_level: int = JOURNAL_COMPRESSION_LEVEL, fsync: bool = JOURNAL_FSYNC):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        self.compression_level = compression_level
+        self.fsync = fsync
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(root, "journal.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._seq = 0
+        self._log_fd: Optional[int] = None
+        self._idx_fd: Optional[int] = None
+        with self._locked():
+            seqs = _segment_seqs(root)
+            if seqs:
+                self._repair(seqs[-1])
+            self._open_segment(seqs[-1] if seqs else 1)
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open_segment(self, seq: int) -> None:
+        self._close_fds()
+        log_path, idx_path = _segment_paths(self.root, seq)
+        self._log_fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._idx_fd = os.open(idx_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._seq = seq
+
+    def _close_fds(self) -> None:
+        for fd in (self._log_fd, self._idx_fd):
+            if fd is not None:
+                os.close(fd)
+        self._log_fd = self._idx_fd = None
+
+    def _repair(self, seq: int) -> None:
+        """Make the newest segment's log and index agree after an interrupted append."""
+        log_path, idx_path = _segment_paths(self.root, seq)
+        if not os.path.exists(idx_path):
+            open(idx_path, "ab").close()
+        idx_size = os.path.getsize(idx_path)
+        whole = idx_size - idx_size % INDEX_DTYPE.itemsize
+        if whole != idx_size:
+            os.truncate(idx_path, whole)
+        rows = np.fromfile(idx_path, dtype=INDEX_DTYPE)
+        end = int(rows["offset"][-1] + rows["length"][-1]) if len(rows) else 0
+        log_size = os.path.getsize(log_path)
+        if log_size <= end:
+            return
+        recovered = []
+        with open(log_path, "rb") as f:
+            f.seek(end)
+            pos = end
+            while pos + _FRAME.size <= log_size:
+                length, crc = _FRAME.unpack(f.read(_FRAME.size))
+                blob = f.read(length)
+                if len(blob) != length or zlib.crc32(blob) != crc:
+                    break
+                eval_id, loan_id, ts = _record_meta(json.loads(zlib.decompress(blob)))
+                recovered.append((ts, pos + _FRAME.size, length, eval_key(eval_id), loan_key(loan_id)))
+                pos += _FRAME.size + length
+        if pos < log_size:
+            print(f"[WARN] Journal segment {log_path}: truncating {log_size - pos} bytes of a torn append",
+                  file=sys.stderr)
+            os.truncate(log_path, pos)
+        if recovered:
+            with open(idx_path, "ab") as f:
+                f.write(np.array(recovered, dtype=INDEX_DTYPE).tobytes())
+            print(f"[INFO] Journal segment {log_path}: re-indexed {len(recovered)} records", file=sys.stderr)
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        # Another process may have rotated already
+        while os.path.exists(_segment_paths(self.root, self._seq + 1)[0]):
+            self._open_segment(self._seq + 1)
+        size = os.fstat(self._log_fd).st_size
+        if size and size + incoming > self.segment_max_bytes:
+            self._open_segment(self._seq + 1)
+
+    def append_json(self, payload: str, eval_id: str, loan_id: Optional[str], ts: Any) -> Tuple[int, int]:
+        """Append one serialized record; returns (segment number, payload offset)."""
+        blob = zlib.compress(payload.encode("utf-8"), self.compression_level)
+        frame = _FRAME.pack(len(blob), zlib.crc32(blob)) + blob
+        with self._locked():
+            self._rotate_if_needed(len(frame))
+            offset = os.fstat(self._log_fd).st_size + _FRAME.size
+            os.write(self._log_fd, frame)
+            os.write(self._idx_fd, _ROW.pack(to_unix(ts), offset, len(blob), eval_key(eval_id), loan_key(loan_id)))
+            if self.fsync:
+                os.fsync(self._log_fd)
+                os.fsync(self._idx_fd)
+            return self._seq, offset
+
+    def append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        eval_id, loan_id, ts = _record_meta(record)
+        return self.append_json(json.dumps(record, separators=(",", ":"), ensure_ascii=False), eval_id, loan_id, ts)
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_fds()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+
+_writer: Optional[JournalWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_journal_writer() -> JournalWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = JournalWriter()
+    return _writer
+
+
+# ------------------------------------------------------------------------------
+# Reading
+# ------------------------------------------------------------------------------
+class Segment:
+    """Memory-mapped view of one segment; refresh() picks up appends to the newest one."""
+
+    def __init__(self, root: str, seq: int):
+        self.seq = seq
+        self.log_path, self.idx_path = _segment_paths(root, seq)
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self._log: Optional[mmap.mmap] = None
+        self._log_size = 0
+        self.refresh()
+
+    def refresh(self) -> None:
+        idx_size = os.path.getsize(self.idx_path) if os.path.exists(self.idx_path) else 0
+        n = idx_size // INDEX_DTYPE.itemsize
+        if n != len(self.index):
+            self.index = np.memmap(self.idx_path, dtype=INDEX_DTYPE, mode="r", shape=(n,)) if n else self.index
+        log_size = os.path.getsize(self.log_path)
+        if log_size != self._log_size and log_size:
+            with open(self.log_path, "rb") as f:
+                self._log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._log_size = log_size
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def ts_range(self) -> Tuple[float, float]:
+        ts = self.index["ts"]
+        ts = ts[np.isfinite(ts)]
+        if not len(ts):
+            return float("inf"), float("-inf")
+        return float(ts.min()), float(ts.max())
+
+    def read(self, row: int) -> Dict[str, Any]:
+        offset, length = int(self.index["offset"][row]), int(self.index["length"][row])
+        return json.loads(zlib.decompress(self._log[offset:offset + length]))
+
+    def read_rows(self, rows: np.ndarray) -> Iterator[Dict[str, Any]]:
+        for row in rows.tolist():
+            yield self.read(row)
+
+
+class Journal:
+    """Read side of a journal directory (safe while writers append)."""
+
+    def __init__(self, root: str = JOURNAL_DIR):
+        self.root = root
+        self.segments: List[Segment] = []
+        self.refresh()
+
+    def refresh(self) -> "Journal":
+        known = {s.seq for s in self.segments}
+        for seq in _segment_seqs(self.root):
+            if seq not in known:
+                self.segments.append(Segment(self.root, seq))
+        for seg in self.segments:
+            seg.refresh()                    # cheap stat; only segments that grew are remapped
+        return self
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self.segments)
+
+    def get(self, eval_id: str) -> Optional[Dict[str, Any]]:
+        key = eval_key(eval_id)
+        for seg in reversed(self.segments):
+            rows = np.flatnonzero(seg.index["eval_key"] == key)
+            for row in rows.tolist():
+                record = seg.read(row)
+                if record.get("eval_id") == eval_id:
+                    return record
+        return None
+
+    def _select(self, start: Optional[Any], end: Optional[Any], loan: Optional[str]
+                ) -> Iterator[Tuple[Segment, np.ndarray]]:
+        lo = to_unix(start) if start is not None else -np.inf
+        hi = to_unix(end) if end is not None else np.inf
+        key = loan_key(loan) if loan is not None else None
+        for seg in self.segments:
+            first, last = seg.ts_range
+            if last < lo or first >= hi:
+                continue
+            idx = seg.index
+            mask = (idx["ts"] >= lo) & (idx["ts"] < hi)
+            if key is not None:
+                mask &= idx["loan_key"] == key
+            rows = np.flatnonzero(mask)
+            if len(rows):
+                yield seg, rows[np.argsort(idx["ts"][rows], kind="stable")]
+
+    def range(self, start: Optional[Any] = None, end: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+        """Records with start <= timestamp_utc < end, oldest first within each segment."""
+        for seg, rows in self._select(start, end, None):
+            yield from seg.read_rows(rows)
+
+    def by_loan(self, loan_id: str, start: Optional[Any] = None, end: Optional[Any] = None) -> List[Dict[str, Any]]:
+        records = [r for seg, rows in self._select(start, end, loan_id) for r in seg.read_rows(rows)
+                   if (r.get("inputs") or {}).get("loan_id") == loan_id]
+        records.sort(key=lambda r: r.get("timestamp_utc") or "")
+        return records
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for seg in self.segments:
+            yield from seg.read_rows(np.arange(len(seg)))
+
+    def stats(self) -> Dict[str, Any]:
+        first = min((s.ts_range[0] for s in self.segments), default=float("inf"))
+        last = max((s.ts_range[1] for s in self.segments), default=float("-inf"))
+        return {
+            "dir": self.root,
+            "segments": len(self.segments),
+            "records": len(self),
+            "log_bytes": sum(os.path.getsize(s.log_path) for s in self.segments),
+            "index_bytes": sum(os.path.getsize(s.idx_path) for s in self.segments),
+            "first": datetime.fromtimestamp(first, timezone.utc).isoformat() if first <= last else None,
+            "last": datetime.fromtimestamp(last, timezone.utc).isoformat() if first <= last else None,
+        }
+
+
+def is_journal(path: str) -> bool:
+    return os.path.isdir(path) and bool(_segment_seqs(path))
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Query or fill the evaluation journal")
+    parser.add_argument("command", choices=("stats", "get", "loan", "range", "import"))
+    parser.add_argument("args", nargs="*", help="eval_id / loan_id / files to import")
+    parser.add_argument("--dir", default=JOURNAL_DIR)
+    parser.add_argument("--start", help="ISO-8601 or unix seconds")
+    parser.add_argument("--end", help="ISO-8601 or unix seconds (exclusive)")
+    args = parser.parse_args()
+
+    def when(value: Optional[str]) -> Any:
+        return float(value) if value and re.fullmatch(r"[\d.]+", value) else value
+
+    if args.command == "import":
+        from backtest import iter_records
+
+        writer = JournalWriter(args.dir)
+        started = time.perf_counter()
+        n = 0
+        for record in iter_records(args.args):
+            writer.append(record)
+            n += 1
+        writer.close()
+        print(f"[INFO] Imported {n} records in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+        sys.exit(0)
+
+    journal = Journal(args.dir)
+    if args.command == "stats":
+        print(json.dumps(journal.stats(), indent=2))
+    elif args.command == "get":
+        record = journal.get(args.args[0])
+        print(json.dumps(record, indent=2, ensure_ascii=False))
+        sys.exit(0 if record else 1)
+    elif args.command == "loan":
+        for record in journal.by_loan(args.args[0], when(args.start), when(args.end)):
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        for record in journal.range(when(args.start), when(args.end)):
+            print(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+loan_book.py
+
+Columnar on-disk loan book for bulk revaluation.
+
+A loan book is a directory with one .npy array per field plus a manifest:
+
+    manifest.json          row count, column dtypes, category lists
+    loan_id.npy            S<n>     UTF-8 bytes, fixed width
+    shop_id.npy            int32    code into manifest["categories"]["shop_id"]
+    principal_myr.npy      float64
+    gold_weight_g.npy      float64
+    purity.npy             int16
+    collateral_type.npy    int32    code into manifest["categories"]["collateral_type"]
+    tenure_days.npy        int32
+    fees_myr.npy           float64
+
+The fields are LoanInput's plus loan_id, shop_id, collateral_type and
+fees_myr, as sources.get_loan_details() maps them. open_loan_book() maps
+every array read-only (np.load(mmap_mode="r")), so LoanBook.arrays() hands
+scenarios.run_scenarios() / montecarlo.simulate_margin_calls() the columns
+without parsing JSON or building a LoanInput per loan.
+
+Paths ending in .parquet are written/read with pyarrow instead (same
+columns, strings dictionary-encoded), if pyarrow is installed.
+
+CLI:
+    python loan_book.py import loans.json book/       # JSON list, {"loans": [...]} or JSONL
+    python loan_book.py info book/
+"""
+
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: directory-of-.npy format only
+    pa = None
+    pq = None
+
+FORMAT = "silsilat-loan-book"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+# field -> storage dtype; "category" columns are int32 codes plus a category list
+FIELDS: Dict[str, str] = {
+    "loan_id": "bytes",
+    "shop_id": "category",
+    "principal_myr": "<f8",
+    "gold_weight_g": "<f8",
+    "purity": "<i2",
+    "collateral_type": "category",
+    "tenure_days": "<i4",
+    "fees_myr": "<f8",
+}
+DEFAULTS: Dict[str, Any] = {"shop_id": "", "collateral_type": "jewellery", "fees_myr": 0.0}
+NUMERIC_FIELDS = tuple(k for k, kind in FIELDS.items() if kind not in ("bytes", "category"))
+
+
+# ------------------------------------------------------------------------------
+# Building columns
+# ------------------------------------------------------------------------------
+def columns_from_records(loans: Iterable[Mapping[str, Any]]) -> Tuple[Dict[str, np.ndarray], Dict[str, List[str]]]:
+    """Encode get_loan_details()-shaped dicts into storage columns and category lists."""
+    rows = loans if isinstance(loans, list) else list(loans)
+    n = len(rows)
+    cols: Dict[str, np.ndarray] = {}
+    categories: Dict[str, List[str]] = {}
+    for name, kind in FIELDS.items():
+        default = DEFAULTS.get(name)
+        if kind == "bytes":
+            cols[name] = np.array([str(r.get(name, i)).encode("utf-8") for i, r in enumerate(rows)], dtype="S")
+        elif kind == "category":
+            values = [str(r.get(name) or default) for r in rows]
+            if name == "collateral_type":
+                values = [v.lower() for v in values]
+            cats, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+            categories[name] = [str(c) for c in cats]
+            cols[name] = codes.astype("<i4")
+        else:
+            try:
+                cols[name] = np.fromiter((r.get(name, default) for r in rows), dtype=np.dtype(kind), count=n)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{name}: missing or non-numeric value ({e})") from e
+    return cols, categories
+
+
+def validate_columns(cols: Mapping[str, np.ndarray]) -> None:
+    """Vectorized LoanInput constraints. Raises ValueError naming the first bad row."""
+    checks = (
+        ("principal_myr", cols["principal_myr"] <= 0, "must be > 0"),
+        ("gold_weight_g", cols["gold_weight_g"] <= 0, "must be > 0"),
+        ("purity", (cols["purity"] < 500) | (cols["purity"] > 999), "must be within 500-999"),
+        ("tenure_days", cols["tenure_days"] < 1, "must be >= 1"),
+    )
+    for name, bad, rule in checks:
+        if bad.any():
+            idx = int(np.flatnonzero(bad)[0])
+            raise ValueError(f"{name} {rule}: {int(bad.sum())} row(s), first loan_id "
+                             f"{cols['loan_id'][idx].decode('utf-8', 'replace')}")
+
+
+# ------------------------------------------------------------------------------
+# Loan book
+# ------------------------------------------------------------------------------
+class LoanBook:
+    """Read-only columnar loan book; numeric columns are memory-mapped (or Arrow buffers)."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, List[str]], path: str = ""):
+        self.path = path
+        self.columns = columns
+        self.categories = categories
+
+    def __len__(self) -> int:
+        return len(self.columns["principal_myr"])
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def decoded(self, name: str) -> np.ndarray:
+        """A category/bytes column as an array of str (allocates)."""
+        if FIELDS[name] == "category":
+            return np.asarray(self.categories[name], dtype=object)[self.columns[name]]
+        return np.char.decode(self.columns[name], "utf-8")
+
+    def code_of(self, name: str, value: str) -> int:
+        """Category code for `value`, -1 if it does not occur."""
+        try:
+            return self.categories[name].index(value)
+        except ValueError:
+            return -1
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Columns in the scenarios.loans_to_arrays() layout (numeric columns not copied)."""
+        return {
+            "principal_myr": self.columns["principal_myr"],
+            "gold_weight_g": self.columns["gold_weight_g"],
+            "purity": self.columns["purity"],
+            "tenure_days": self.columns["tenure_days"],
+            "is_bar": self.columns["collateral_type"] == self.code_of("collateral_type", "bar"),
+        }
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """One loan as a get_loan_details()-shaped dict."""
+        out: Dict[str, Any] = {}
+        for name, kind in FIELDS.items():
+            v = self.columns[name][i]
+            if kind == "bytes":
+                out[name] = v.decode("utf-8")
+            elif kind == "category":
+                out[name] = self.categories[name][int(v)]
+            else:
+                out[name] = v.item()
+        return out
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+
+def write_loan_book(path: str, loans: Iterable[Mapping[str, Any]], validate: bool = True) -> LoanBook:
+    """
+    Write loans (get_loan_details()-shaped dicts) to `path` and return it opened.
+    Directory books are written to a sibling temp directory and renamed into place.
+    """
+    cols, categories = columns_from_records(loans)
+    if validate and len(cols["principal_myr"]):
+        validate_columns(cols)
+    if path.endswith(".parquet"):
+        _write_parquet(path, cols, categories)
+        return open_loan_book(path)
+
+    tmp = f"{path.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    manifest = {"format": FORMAT, "version": FORMAT_VERSION, "rows": len(cols["principal_myr"]),
+                "columns": {}, "categories": categories}
+    for name, arr in cols.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr, allow_pickle=False)
+        manifest["columns"][name] = {"kind": FIELDS[name], "dtype": arr.dtype.str}
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.isdir(path):
+        old = f"{path.rstrip(os.sep)}.old-{os.getpid()}"
+        os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.rename(tmp, path)
+    return open_loan_book(path)
+
+
+def open_loan_book(path: str) -> LoanBook:
+    """
+    Open a loan book directory (or .parquet file) without copying its columns.
+
+    Raises:
+        ValueError: not a loan book, or a column length disagrees with the manifest
+    """
+    if path.endswith(".parquet"):
+        return _read_parquet(path)
+    with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a loan book (format={manifest.get('format')!r})")
+    cols = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+            for name in FIELDS}
+    for name, arr in cols.items():
+        if len(arr) != manifest["rows"]:
+            raise ValueError(f"{path}: column {name} has {len(arr)} rows, manifest says {manifest['rows']}")
+    return LoanBook(cols, manifest["categories"], path)
+
+
+# ------------------------------------------------------------------------------
+# Parquet (optional)
+# ------------------------------------------------------------------------------
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; use a loan book directory instead of .parquet")
+
+
+def _write_parquet(path: str, cols: Dict[str, np.ndarray], categories: Dict[str, List[str]]) -> None:
+    _require_pyarrow()
+    arrays = {}
+    for name, arr in cols.items():
+        if FIELDS[name] == "category":
+            arrays[name] = pa.DictionaryArray.from_arrays(pa.array(arr, pa.int32()), pa.array(categories[name]))
+        elif FIELDS[name] == "bytes":
+            arrays[name] = pa.array(np.char.decode(arr, "utf-8"), pa.string())
+        else:
+            arrays[name] = pa.array(arr)
+    pq.write_table(pa.table(arrays), path)
+
+
+def _read_parquet(path: str) -> LoanBook:
+    _require_pyarrow()
+    table = pq.read_table(path, memory_map=True).combine_chunks()
+    cols: Dict[str, np.ndarray] = {}
+    categories: Dict[str, List[str]] = {}
+    for name, kind in FIELDS.items():
+        col = table.column(name).chunk(0) if table.column(name).num_chunks else pa.array([])
+        if kind == "category":
+            if not pa.types.is_dictionary(col.type):
+                col = col.dictionary_encode()
+            categories[name] = col.dictionary.to_pylist()
+            cols[name] = col.indices.to_numpy(zero_copy_only=False).astype("<i4", copy=False)
+        elif kind == "bytes":
+            cols[name] = np.array([s.encode("utf-8") for s in col.to_pylist()], dtype="S")
+        else:
+            # zero-copy view of the mapped buffer when the column has no nulls
+            cols[name] = col.to_numpy(zero_copy_only=False).astype(kind, copy=False)
+    return LoanBook(cols, categories, path)
+
+
+# ------------------------------------------------------------------------------
+# Helpers for the bulk CLIs
+# ------------------------------------------------------------------------------
+def read_loan_records(path: str) -> List[Dict[str, Any]]:
+    """Loans from a JSON list, a {"loans": [...]} object or JSONL."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        raw = json.load(f)
+    return raw["loans"] if isinstance(raw, dict) else raw
+
+
+def load_loan_arrays(path: str, with_ids: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Loan columns from a loan book (directory / .parquet) or a JSON loans file,
+    in the scenarios.loans_to_arrays() layout; `with_ids` adds a "loan_id" column.
+    """
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        book = open_loan_book(path)
+        cols = book.arrays()
+        if with_ids:
+            cols["loan_id"] = book.decoded("loan_id")
+        return cols
+    from scenarios import loans_to_arrays
+    rows = read_loan_records(path)
+    cols = loans_to_arrays(rows)
+    if with_ids:
+        cols["loan_id"] = np.array([str(r.get("loan_id", i)) for i, r in enumerate(rows)], dtype=object)
+    return cols
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Columnar loan book tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_imp = sub.add_parser("import", help="convert a JSON/JSONL loans file into a loan book")
+    p_imp.add_argument("source")
+    p_imp.add_argument("dest", help="loan book directory, or a .parquet file")
+    p_info = sub.add_parser("info", help="summarize a loan book")
+    p_info.add_argument("path")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.cmd == "import":
+        book = write_loan_book(args.dest, read_loan_records(args.source))
+        print(f"[INFO] Wrote {len(book)} loans to {args.dest} in {time.perf_counter() - started:.3f}s",
+              file=sys.stderr)
+    else:
+        book = open_loan_book(args.path)
+        print(json.dumps({
+            "path": args.path,
+            "loans": len(book),
+            "principal_myr": float(np.sum(book.column("principal_myr"))),
+            "gold_weight_g": float(np.sum(book.column("gold_weight_g"))),
+            "shops": len(book.categories["shop_id"]),
+            "collateral_types": book.categories["collateral_type"],
+            "opened_in_s": round(time.perf_counter() - started, 4),
+        }, indent=2))
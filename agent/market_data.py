@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+market_data.py
+
+Versioned market-data snapshots for the Gold Collateral Evaluation Agent.
+
+A MarketSnapshot is an immutable bundle of everything an evaluation needs
+from the market: gold MYR/g, USD/oz, USD/MYR, yesterday's close, volatility,
+the PRICE_ABNORMAL state and provider agreement. Snapshots are built by
+refresh_market_snapshot() and published by swapping a single module-level
+reference, so readers never see a half-updated view.
+
+Long-running hosts (the batch_evaluator.py coordinator) call start_refresher(),
+which rebuilds the snapshot every MARKET_REFRESH_SECONDS in the background;
+evaluate_loan() then only reads current_snapshot() and does no market I/O.
+One-shot runs (`gold_evaluator.py -`) start no refresher: they build a
+snapshot on demand inside the price stage of the deadline and fall back to
+the last-known-good values in MARKET_CACHE_FILE (snapshot_from_cache) when
+that stage runs out of time or every provider fails.
+
+Every published snapshot is appended to MARKET_SNAPSHOT_LOG (JSONL) so an
+evaluation's market_snapshot_id can be resolved later with load_snapshot().
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+import telemetry
+from anomaly import get_anomaly_detector
+from price_store import FX_USD_MYR, GOLD_MYR_G, GOLD_USD_OZ
+from sources import (
+    detect_abnormal_price_change,
+    get_cached_market_data,
+    get_fx_rate,
+    get_gold_price_usd,
+    get_price_consensus,
+    get_volatility_estimate,
+    get_yesterday_gold_price_myr,
+    gold_price_myr_from,
+)
+
+MARKET_REFRESH_SECONDS = float(os.getenv("MARKET_REFRESH_SECONDS", "60"))
+MARKET_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("MARKET_SNAPSHOT_MAX_AGE_SECONDS", "300"))
+MARKET_SNAPSHOT_LOG = os.getenv("MARKET_SNAPSHOT_LOG", "data/market_snapshots.jsonl")
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    snapshot_id: str
+    version: int
+    as_of: str                                   # ISO-8601 UTC
+    source: str                                  # "live" or "cache"
+    gold_price_myr_per_g: float
+    gold_price_usd_per_oz: Optional[float] = None
+    fx_usd_myr: Optional[float] = None
+    yesterday_gold_price_myr_per_g: Optional[float] = None
+    gold_volatility: Optional[float] = None
+    gold_volatility_fallback: bool = False       # gold_volatility is VOL_FALLBACK, not measured
+    vol_window_days: int = 30
+    anomaly: Mapping[str, Any] = field(default_factory=lambda: _EMPTY)
+    gold_consensus: Mapping[str, Any] = field(default_factory=lambda: _EMPTY)
+    fx_consensus: Mapping[str, Any] = field(default_factory=lambda: _EMPTY)
+    built_in_s: float = 0.0
+    created_monotonic: float = field(default_factory=time.monotonic, compare=False, repr=False)
+
+    def age_s(self) -> float:
+        return time.monotonic() - self.created_monotonic
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "created_monotonic"}
+        for k in ("anomaly", "gold_consensus", "fx_consensus"):
+            d[k] = dict(d[k])
+        return d
+
+
+def _freeze(d: Optional[Dict[str, Any]]) -> Mapping[str, Any]:
+    return MappingProxyType(dict(d)) if d else _EMPTY
+
+
+def _snapshot_id(as_of: datetime, body: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()[:10]
+    return f"mkt-{as_of.strftime('%Y%m%dT%H%M%SZ')}-{digest}"
+
+
+# ------------------------------------------------------------------------------
+# Publication (atomic reference swap)
+# ------------------------------------------------------------------------------
+_current: Optional[MarketSnapshot] = None
+_version = 0
+_pinned = False                  # set by adopt_snapshot(pin=True) for a batch's lifetime
+_publish_lock = threading.Lock()
+_published = threading.Condition(_publish_lock)
+
+
+def current_snapshot(max_age_s: Optional[float] = None) -> Optional[MarketSnapshot]:
+    """
+    The latest published snapshot (lock-free read), or None if none / older
+    than `max_age_s`. A pinned snapshot (adopt_snapshot(pin=True)) is returned
+    whatever its age.
+    """
+    snap = _current
+    if snap is None or (max_age_s is not None and not _pinned and snap.age_s() > max_age_s):
+        return None
+    return snap
+
+
+def wait_for_snapshot(timeout: float) -> Optional[MarketSnapshot]:
+    with _published:
+        _published.wait_for(lambda: _current is not None, timeout=timeout)
+        return _current
+
+
+def _publish(source: str, values: Dict[str, Any], started: float) -> MarketSnapshot:
+    global _current, _version
+    now = datetime.now(timezone.utc)
+    with _published:
+        _version += 1
+        snap = MarketSnapshot(
+            snapshot_id=_snapshot_id(now, values),
+            version=_version,
+            as_of=now.isoformat(),
+            source=source,
+            built_in_s=round(time.monotonic() - started, 4),
+            **{k: _freeze(v) if k in ("anomaly", "gold_consensus", "fx_consensus") else v
+               for k, v in values.items()},
+        )
+        if not _pinned:
+            _current = snap
+        _published.notify_all()
+    telemetry.set_gauge("market_snapshot.version", snap.version)
+    telemetry.observe("market_snapshot.build_ms", snap.built_in_s * 1000, source=source)
+    _log_snapshot(snap)
+    return snap
+
+
+def adopt_snapshot(data: Mapping[str, Any], age_s: float = 0.0, pin: bool = False) -> MarketSnapshot:
+    """
+    Install a snapshot built in another process (MarketSnapshot.to_dict()) as
+    the current one, keeping its id and version. Nothing is re-fetched or logged.
+
+    With pin=True the snapshot stays current until unpin_snapshot(): it never
+    ages out (MARKET_SNAPSHOT_MAX_AGE_SECONDS) and snapshots published by a
+    refresher in this process are logged but not swapped in. Batches pin
+    theirs so every loan runs on it, however long the batch takes.
+    """
+    global _current, _pinned
+    names = {f.name for f in fields(MarketSnapshot)} - {"created_monotonic"}
+    snap = MarketSnapshot(
+        created_monotonic=time.monotonic() - age_s,
+        **{k: _freeze(v) if k in ("anomaly", "gold_consensus", "fx_consensus") else v
+           for k, v in data.items() if k in names},
+    )
+    with _published:
+        _current = snap
+        _pinned = pin
+        _published.notify_all()
+    return snap
+
+
+def unpin_snapshot() -> None:
+    """Release a pinned snapshot; the next refresh or fetch replaces it as usual."""
+    global _pinned
+    with _published:
+        _pinned = False
+
+
+def _log_snapshot(snap: MarketSnapshot) -> None:
+    if not MARKET_SNAPSHOT_LOG:
+        return
+    try:
+        os.makedirs(os.path.dirname(MARKET_SNAPSHOT_LOG) or ".", exist_ok=True)
+        with open(MARKET_SNAPSHOT_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snap.to_dict(), default=str) + "\n")
+    except OSError as e:
+        print(f"[WARN] Could not log market snapshot: {e}", file=sys.stderr)
+
+
+def load_snapshot(snapshot_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a logged snapshot by id (linear scan of MARKET_SNAPSHOT_LOG)."""
+    try:
+        with open(MARKET_SNAPSHOT_LOG, "r", encoding="utf-8") as f:
+            for line in f:
+                if snapshot_id in line:
+                    row = json.loads(line)
+                    if row.get("snapshot_id") == snapshot_id:
+                        return row
+    except OSError:
+        pass
+    return None
+
+
+# ------------------------------------------------------------------------------
+# Building snapshots
+# ------------------------------------------------------------------------------
+def read_price_anomaly(gold_price: float, yesterday_price: Optional[float],
+                       threshold_percent: float) -> Dict[str, Any]:
+    """
+    Current PRICE_ABNORMAL state for gold (MYR/g) from the streaming detector.
+
+    The backend's yesterday price seeds the detector only if it has not seen a
+    day close yet. Falls back to the one-off comparison when no tick has been
+    recorded for the price being evaluated.
+    """
+    detector = get_anomaly_detector(GOLD_MYR_G)
+    if detector.threshold_percent != threshold_percent:
+        detector.set_thresholds(threshold_percent=threshold_percent)
+    state = detector.set_reference_close(yesterday_price)
+    if state["current_price"] is None or abs(state["current_price"] - gold_price) > 1e-9:
+        return detect_abnormal_price_change(gold_price, yesterday_price, threshold_percent)
+    return dict(state)
+
+
+def refresh_market_snapshot(timeout: float = 15, vol_window_days: int = 30,
+                            deviation_threshold: float = 5.0) -> MarketSnapshot:
+    """Fetch prices from the providers, derive volatility/anomaly state and publish a new snapshot."""
+    started = time.monotonic()
+    usd_per_oz = float(get_gold_price_usd(timeout=timeout))
+    fx = float(get_fx_rate("USD/MYR", timeout=timeout))
+    gold_myr_g = gold_price_myr_from(usd_per_oz, fx)
+    yesterday = get_yesterday_gold_price_myr(timeout=timeout)
+    vol, vol_fallback = get_volatility_estimate("XAU/MYR", window=vol_window_days)
+    return _publish("live", {
+        "gold_price_myr_per_g": gold_myr_g,
+        "gold_price_usd_per_oz": usd_per_oz,
+        "fx_usd_myr": fx,
+        "yesterday_gold_price_myr_per_g": yesterday,
+        "gold_volatility": vol,
+        "gold_volatility_fallback": vol_fallback,
+        "vol_window_days": vol_window_days,
+        "anomaly": read_price_anomaly(gold_myr_g, yesterday, deviation_threshold),
+        "gold_consensus": get_price_consensus(GOLD_USD_OZ),
+        "fx_consensus": get_price_consensus(FX_USD_MYR),
+    }, started)
+
+
+def snapshot_from_cache(vol_window_days: int = 30, deviation_threshold: float = 5.0) -> MarketSnapshot:
+    """
+    Publish a snapshot from the last-known-good market cache (no network).
+
+    Raises:
+        LookupError: if no gold price was ever cached
+    """
+    started = time.monotonic()
+    cached_price = get_cached_market_data("gold_price_myr")
+    if cached_price is None:
+        raise LookupError("No cached gold price is available")
+    cached_yesterday = get_cached_market_data("yesterday_gold_price_myr")
+    cached_fx = get_cached_market_data(f"fx:{FX_USD_MYR}")
+    gold_myr_g = float(cached_price["value"])
+    yesterday = cached_yesterday["value"] if cached_yesterday else None
+    print(f"[WARN] Using cached gold price from {cached_price['fetched_at']}", file=sys.stderr)
+    vol, vol_fallback = get_volatility_estimate("XAU/MYR", window=vol_window_days)
+    return _publish("cache", {
+        "gold_price_myr_per_g": gold_myr_g,
+        "fx_usd_myr": cached_fx["value"] if cached_fx else None,
+        "yesterday_gold_price_myr_per_g": yesterday,
+        "gold_volatility": vol,
+        "gold_volatility_fallback": vol_fallback,
+        "vol_window_days": vol_window_days,
+        "anomaly": read_price_anomaly(gold_myr_g, yesterday, deviation_threshold),
+    }, started)
+
+
+# ------------------------------------------------------------------------------
+# Background refresher
+# ------------------------------------------------------------------------------
+class MarketDataRefresher:
+    """Daemon thread that republishes the market snapshot every `interval_s` seconds."""
+
+    def __init__(self, interval_s: float = MARKET_REFRESH_SECONDS, timeout: float = 15,
+                 vol_window_days: int = 30, deviation_threshold: float = 5.0):
+        self.interval_s = interval_s
+        self.timeout = timeout
+        self.vol_window_days = vol_window_days
+        self.deviation_threshold = deviation_threshold
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh_once(self) -> Optional[MarketSnapshot]:
+        try:
+            return refresh_market_snapshot(self.timeout, self.vol_window_days, self.deviation_threshold)
+        except Exception as e:
+            telemetry.inc("market_snapshot.refresh_errors")
+            print(f"[WARN] Market data refresh failed; keeping snapshot "
+                  f"{_current.snapshot_id if _current else 'none'}: {e}", file=sys.stderr)
+            return None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.refresh_once()
+            self._stop.wait(max(0.0, self.interval_s - (time.monotonic() - started)))
+
+    def start(self) -> "MarketDataRefresher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="market-data-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_refresher: Optional[MarketDataRefresher] = None
+
+
+def start_refresher(cfg: Dict[str, Any]) -> MarketDataRefresher:
+    """Start (once per process) the background refresher configured from base_env_config()."""
+    global _refresher
+    if _refresher is None:
+        _refresher = MarketDataRefresher(
+            interval_s=cfg.get("MARKET_REFRESH_SECONDS", MARKET_REFRESH_SECONDS),
+            vol_window_days=cfg["VOL_WINDOW"],
+            deviation_threshold=cfg["PRICE_DEVIATION_THRESHOLD"],
+        )
+    return _refresher.start()
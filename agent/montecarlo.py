@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+montecarlo.py
+
+Monte Carlo margin-call probabilities for single loans and the whole book.
+
+Gold (MYR/g) paths are simulated day by day, either as geometric Brownian
+motion with the daily volatility from sources.get_volatility(), or by
+bootstrapping daily log returns from the local price store.
+
+A loan is margin-called once its LTV reaches MARGIN_CALL_LTV, i.e. once the
+gold price falls to its trigger price
+
+    trigger = principal / (weight_g × purity/999 × (1 − haircut_bps/10 000) × margin_call_ltv)
+
+so its breach probability is the share of paths whose running minimum up
+to day `tenure_days` is at or below the trigger. Losses are the negative
+equity max(0, principal − collateral) at each loan's maturity; the book's
+per-path loss gives VaR and expected shortfall.
+
+Per path chunk, loans are grouped by tenure and matched against the sorted
+path minima / maturity prices with binary searches, so the cost is
+O(paths × horizon + (paths + loans) × log), never paths × loans. Chunks
+have their own SeedSequence children, so results are reproducible for a
+given seed regardless of how many worker processes run them.
+
+CLI:
+    python montecarlo.py loans.json [--paths 20000] [--method gbm|bootstrap]
+        [--vol 0.012] [--price 89.53] [--seed 7]
+"""
+
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import policy
+from price_store import GOLD_MYR_G, get_price_store
+
+# Paths × days simulated per chunk, and the total above which chunks go to a process pool.
+CHUNK_CELLS = 4_000_000
+PARALLEL_MIN_CELLS = 50_000_000
+
+
+@dataclass
+class MonteCarloResult:
+    method: str
+    n_paths: int
+    horizon_days: int
+    seed: Optional[int]
+    breach_probability: np.ndarray          # per loan
+    expected_loss_myr: float
+    var_myr: Dict[str, float]               # {"95": ..., "99": ...}
+    expected_shortfall_myr: Dict[str, float]
+
+    def summary(self) -> Dict[str, Any]:
+        p = self.breach_probability
+        return {
+            "method": self.method,
+            "paths": self.n_paths,
+            "horizon_days": self.horizon_days,
+            "seed": self.seed,
+            "loans": int(len(p)),
+            "expected_margin_calls": round(float(p.sum()), 3),
+            "max_breach_probability": round(float(p.max()), 4) if len(p) else 0.0,
+            "expected_loss_myr": round(self.expected_loss_myr, 2),
+            "var_myr": {k: round(v, 2) for k, v in self.var_myr.items()},
+            "expected_shortfall_myr": {k: round(v, 2) for k, v in self.expected_shortfall_myr.items()},
+        }
+
+
+# ------------------------------------------------------------------------------
+# Inputs
+# ------------------------------------------------------------------------------
+def daily_returns_from_store(symbol: str = GOLD_MYR_G) -> np.ndarray:
+    """Close-to-close daily log returns (UTC days) from the local price store."""
+    ts, px = get_price_store().series(symbol).window()
+    if len(ts) < 2:
+        return np.empty(0)
+    days = np.asarray(ts) // 86400
+    last_of_day = np.flatnonzero(np.diff(days, append=days[-1] + 1))
+    return np.diff(np.log(np.asarray(px)[last_of_day]))
+
+
+def _loan_terms(loans: Dict[str, np.ndarray], haircut_bps: Tuple[float, float],
+                margin_call_ltv: float) -> Dict[str, np.ndarray]:
+    """Per-loan value per MYR/g of gold, trigger price and break-even price."""
+    jewellery_bps, bar_bps = haircut_bps
+    haircut = np.where(loans["is_bar"], bar_bps, jewellery_bps)
+    value_per_price = loans["gold_weight_g"] * loans["purity"] / 999.0 * np.maximum(0.0, 1.0 - haircut / 10_000.0)
+    value_per_price = np.maximum(value_per_price, 1e-12)
+    principal = loans["principal_myr"]
+    return {
+        "principal": principal,
+        "value_per_price": value_per_price,
+        "trigger": principal / (value_per_price * margin_call_ltv),
+        "tenure": np.maximum(1, loans["tenure_days"]).astype(np.int64),
+    }
+
+
+def _tenure_groups(terms: Dict[str, np.ndarray]) -> List[Dict[str, np.ndarray]]:
+    """
+    Loans grouped by tenure, with loans sorted by trigger (for breach counts)
+    and by break-even price plus suffix sums (for negative-equity totals).
+    """
+    groups = []
+    for tenure in np.unique(terms["tenure"]):
+        idx = np.flatnonzero(terms["tenure"] == tenure)
+        be = terms["principal"][idx] / terms["value_per_price"][idx]
+        order = np.argsort(be)
+        a = terms["principal"][idx][order]
+        b = terms["value_per_price"][idx][order]
+        groups.append({
+            "tenure": int(tenure),
+            "idx": idx,
+            "trigger": terms["trigger"][idx],
+            "breakeven": be[order],
+            # suffix sums: loss(p) = Σ_{be > p} (principal − value_per_price × p)
+            "a_suffix": np.concatenate([np.cumsum(a[::-1])[::-1], [0.0]]),
+            "b_suffix": np.concatenate([np.cumsum(b[::-1])[::-1], [0.0]]),
+        })
+    return groups
+
+
+# ------------------------------------------------------------------------------
+# Kernel
+# ------------------------------------------------------------------------------
+def _simulate_chunk(n_paths: int, horizon: int, base_price: float, method: str,
+                    daily_vol: float, drift_daily: float, returns: Optional[np.ndarray],
+                    seed_seq: np.random.SeedSequence, groups: List[Dict[str, np.ndarray]],
+                    n_loans: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Breach counts per loan and book loss per path for one chunk of paths."""
+    rng = np.random.default_rng(seed_seq)
+    if method == "bootstrap":
+        steps = rng.choice(returns, size=(n_paths, horizon), replace=True)
+    else:
+        steps = rng.standard_normal((n_paths, horizon), dtype=np.float64)
+        steps *= daily_vol
+        steps += drift_daily - 0.5 * daily_vol * daily_vol
+    np.cumsum(steps, axis=1, out=steps)
+    prices = base_price * np.exp(steps)                    # (paths, horizon); day d at column d-1
+    running_min = np.minimum(np.minimum.accumulate(prices, axis=1), base_price)
+
+    breaches = np.zeros(n_loans, dtype=np.int64)
+    losses = np.zeros(n_paths, dtype=np.float64)
+    for g in groups:
+        col = g["tenure"] - 1
+        mins = np.sort(running_min[:, col])
+        breaches[g["idx"]] = np.searchsorted(mins, g["trigger"], side="right")
+        p_end = prices[:, col]
+        k = np.searchsorted(g["breakeven"], p_end, side="right")
+        losses += g["a_suffix"][k] - g["b_suffix"][k] * p_end
+    return breaches, losses
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(state: Dict[str, Any]) -> None:
+    # Tenure groups are shipped once per worker instead of with every chunk
+    _worker_state.update(state)
+
+
+def _worker_chunk(args):
+    n_paths, seed_seq = args
+    s = _worker_state
+    return _simulate_chunk(n_paths, s["horizon"], s["base_price"], s["method"], s["daily_vol"],
+                           s["drift_daily"], s["returns"], seed_seq, s["groups"], s["n_loans"])
+
+
+def simulate_margin_calls(
+    loans: Dict[str, np.ndarray],
+    base_price_myr_per_g: float,
+    daily_vol: Optional[float] = None,
+    n_paths: int = 10_000,
+    method: str = "gbm",
+    returns: Optional[np.ndarray] = None,
+    haircut_bps: Tuple[float, float] = (policy.POLICY["JEWELLERY_HAIRCUT_BPS"], policy.POLICY["BAR_HAIRCUT_BPS"]),
+    margin_call_ltv: float = policy.POLICY["MARGIN_CALL_LTV"],
+    drift_daily: float = 0.0,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> MonteCarloResult:
+    """
+    Margin-call probability per loan plus book VaR / expected shortfall.
+
+    Args:
+        loans: column arrays (scenarios.loans_to_arrays)
+        daily_vol: stddev of daily log returns (required for "gbm")
+        method: "gbm" or "bootstrap" (resamples `returns`, default: price-store history)
+        haircut_bps: (jewellery, bar) haircuts
+        seed: master seed; the same seed gives the same result for any `workers`
+        workers: process count for large simulations (1 disables the pool)
+    """
+    if method == "gbm" and not daily_vol:
+        raise ValueError("GBM simulation needs a daily volatility")
+    if method == "bootstrap":
+        returns = daily_returns_from_store() if returns is None else np.asarray(returns, dtype=np.float64)
+        if len(returns) < 20:
+            raise ValueError(f"Bootstrap needs at least 20 daily returns; have {len(returns)}")
+    elif method != "gbm":
+        raise ValueError(f"Unknown simulation method '{method}'")
+
+    n_loans = len(loans["principal_myr"])
+    terms = _loan_terms(loans, haircut_bps, margin_call_ltv)
+    horizon = int(terms["tenure"].max()) if n_loans else 1
+    groups = _tenure_groups(terms)
+
+    step = max(1, min(n_paths, CHUNK_CELLS // horizon))
+    sizes = [min(step, n_paths - i) for i in range(0, n_paths, step)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(sizes) > 1 and n_paths * horizon >= PARALLEL_MIN_CELLS:
+        state = {"horizon": horizon, "base_price": base_price_myr_per_g, "method": method,
+                 "daily_vol": daily_vol, "drift_daily": drift_daily, "returns": returns,
+                 "groups": groups, "n_loans": n_loans}
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes)),
+                                 initializer=_init_worker, initargs=(state,)) as pool:
+            parts = list(pool.map(_worker_chunk, zip(sizes, seeds)))
+    else:
+        parts = [_simulate_chunk(n, horizon, base_price_myr_per_g, method, daily_vol, drift_daily,
+                                 returns, ss, groups, n_loans) for n, ss in zip(sizes, seeds)]
+
+    breaches = np.sum([p[0] for p in parts], axis=0) if parts else np.zeros(n_loans)
+    losses = np.sort(np.concatenate([p[1] for p in parts]))
+    var, es = {}, {}
+    for level in (95, 99):
+        cut = int(np.floor(len(losses) * level / 100.0))
+        var[str(level)] = float(losses[min(cut, len(losses) - 1)])
+        es[str(level)] = float(losses[cut:].mean()) if cut < len(losses) else var[str(level)]
+
+    return MonteCarloResult(
+        method=method,
+        n_paths=n_paths,
+        horizon_days=horizon,
+        seed=seed,
+        breach_probability=breaches / float(n_paths),
+        expected_loss_myr=float(losses.mean()),
+        var_myr=var,
+        expected_shortfall_myr=es,
+    )
+
+
+def margin_call_probability(principal_myr: float, gold_weight_g: float, purity: float, tenure_days: int,
+                            base_price_myr_per_g: float, daily_vol: float, haircut_bps: float,
+                            margin_call_ltv: float, n_paths: int = 2_000, seed: Optional[int] = None) -> float:
+    """Single-loan GBM breach probability (haircut_bps applied as given)."""
+    loan = {
+        "principal_myr": np.array([principal_myr], dtype=np.float64),
+        "gold_weight_g": np.array([gold_weight_g], dtype=np.float64),
+        "purity": np.array([purity], dtype=np.float64),
+        "tenure_days": np.array([tenure_days], dtype=np.int64),
+        "is_bar": np.array([False]),
+    }
+    result = simulate_margin_calls(loan, base_price_myr_per_g, daily_vol, n_paths=n_paths,
+                                   haircut_bps=(haircut_bps, haircut_bps),
+                                   margin_call_ltv=margin_call_ltv, seed=seed, workers=1)
+    return float(result.breach_probability[0])
+
+
+# ------------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from loan_book import load_loan_arrays
+
+    parser = argparse.ArgumentParser(description="Monte Carlo margin-call probabilities for a loan book")
+    parser.add_argument("loans", help="JSON file with a list of loans (LoanInput fields, optional collateral_type), "
+                                      "or a loan book (loan_book.py)")
+    parser.add_argument("--paths", type=int, default=10_000)
+    parser.add_argument("--method", choices=("gbm", "bootstrap"), default="gbm")
+    parser.add_argument("--vol", type=float, help="daily volatility (default: get_volatility)")
+    parser.add_argument("--vol-window", type=int, default=30)
+    parser.add_argument("--price", type=float, help="gold MYR/g (default: last cached price)")
+    parser.add_argument("--margin-call-ltv", type=float, default=policy.POLICY["MARGIN_CALL_LTV"])
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--per-loan", action="store_true", help="include per-loan probabilities")
+    args = parser.parse_args()
+
+    price, vol = args.price, args.vol
+    if price is None:
+        from sources import get_cached_market_data
+        cached = get_cached_market_data("gold_price_myr")
+        if cached is None:
+            parser.error("--price is required when no gold price has been cached yet")
+        price = float(cached["value"])
+    if vol is None and args.method == "gbm":
+        from sources import get_volatility_estimate
+        vol, fallback = get_volatility_estimate("XAU/MYR", window=args.vol_window)
+        if vol is None or fallback:
+            parser.error("--vol is required until enough price history is recorded")
+
+    loan_cols = load_loan_arrays(args.loans, with_ids=args.per_loan)
+    n_loans = len(loan_cols["principal_myr"])
+
+    started = time.perf_counter()
+    result = simulate_margin_calls(loan_cols, price, vol, n_paths=args.paths, method=args.method,
+                                   margin_call_ltv=args.margin_call_ltv, seed=args.seed, workers=args.workers)
+    print(f"[INFO] {args.paths} paths × {n_loans} loans in {time.perf_counter() - started:.3f}s", file=sys.stderr)
+    out = result.summary()
+    if args.per_loan:
+        out["breach_probability"] = [
+            {"loan_id": loan_id, "probability": round(float(p), 4)}
+            for loan_id, p in zip(loan_cols["loan_id"].tolist(), result.breach_probability)
+        ]
+    print(json.dumps(out, indent=2))
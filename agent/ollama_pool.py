@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+ollama_pool.py
+
+Client-side pool over one or more Ollama inference endpoints.
+
+Features:
+  • Least-outstanding-requests balancing (ties broken by recent latency)
+  • Active health checks against GET /api/tags (background thread every
+    OLLAMA_HEALTH_INTERVAL_SECONDS; 0 disables them)
+  • Ejection of failing nodes (consecutive errors) and slow nodes
+    (median latency far above the rest of the pool), with timed re-admission
+  • Optional hedged requests: if the first node has not answered after the
+    pool's p95 latency, a duplicate goes to a second node and the first
+    successful answer wins
+
+Configured from the environment by gold_evaluator.base_env_config():
+    OLLAMA_BASE_URLS          comma-separated list (falls back to OLLAMA_BASE_URL)
+    OLLAMA_HEDGE              "true" to enable hedging
+    OLLAMA_HEDGE_MIN_DELAY_MS lower bound on the hedge delay
+    OLLAMA_HEALTH_INTERVAL_SECONDS  seconds between health probes (0 = off)
+"""
+
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+
+class OllamaPoolError(RuntimeError):
+    """Raised when no endpoint in the pool produced a successful response."""
+
+
+def parse_endpoints(value: str) -> List[str]:
+    """Split a comma/whitespace separated endpoint list, dropping blanks and trailing slashes."""
+    urls = [u.strip().rstrip("/") for u in value.replace(" ", ",").split(",")]
+    return [u for u in urls if u]
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+# ------------------------------------------------------------------------------
+# Per-endpoint state
+# ------------------------------------------------------------------------------
+class OllamaNode:
+    def __init__(self, url: str, latency_window: int = 50):
+        self.url = url
+        self.outstanding = 0
+        self.latencies: deque = deque(maxlen=latency_window)
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def median_latency(self) -> Optional[float]:
+        return statistics.median(self.latencies) if self.latencies else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        med = self.median_latency()
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "median_latency_s": round(med, 4) if med is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": time.monotonic() < self.ejected_until,
+            "requests": self.total_requests,
+            "failures": self.total_failures,
+        }
+
+
+# ------------------------------------------------------------------------------
+# Pool
+# ------------------------------------------------------------------------------
+class OllamaPool:
+    """
+    Balances requests across Ollama endpoints.
+
+    Args:
+        urls: endpoint base URLs, e.g. ["http://box1:11434", "http://box2:11434"]
+        hedge: send a duplicate request to a second node after the hedge delay
+        hedge_min_delay_s: lower bound on the hedge delay
+        hedge_default_delay_s: delay used until enough latency samples exist
+        eject_after_failures: consecutive failures before a node is ejected
+        eject_seconds: how long an ejected node stays out of rotation
+        slow_factor: eject a node whose median latency exceeds slow_factor × the
+            median of the other nodes' medians (needs min_samples on each)
+        min_samples: latency samples required before p95/slow-node logic kicks in
+        health_timeout_s: timeout for GET /api/tags health probes
+        health_interval_s: start background health checks at this interval (0 = none)
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        hedge: bool = False,
+        hedge_min_delay_s: float = 0.5,
+        hedge_default_delay_s: float = 10.0,
+        eject_after_failures: int = 3,
+        eject_seconds: float = 30.0,
+        slow_factor: float = 3.0,
+        min_samples: int = 20,
+        health_timeout_s: float = 2.0,
+        health_interval_s: float = 0.0,
+        session: Optional[requests.Session] = None,
+    ):
+        if not urls:
+            raise ValueError("OllamaPool requires at least one endpoint URL")
+        self.nodes = [OllamaNode(u.rstrip("/")) for u in urls]
+        self.hedge = hedge and len(self.nodes) > 1
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.hedge_default_delay_s = hedge_default_delay_s
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.slow_factor = slow_factor
+        self.min_samples = min_samples
+        self.health_timeout_s = health_timeout_s
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=200)  # pool-wide, drives the hedge delay
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.nodes)),
+                                            thread_name_prefix="ollama-pool")
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        if health_interval_s > 0:
+            self.start_health_checks(health_interval_s)
+
+    # -- selection -------------------------------------------------------------
+    def _pick(self, exclude: Tuple[str, ...] = (), panic: bool = True) -> Optional[OllamaNode]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [n for n in self.nodes if n.url not in exclude and n.is_available(now)]
+            if not candidates and panic:
+                # Every node is ejected: rather than failing outright, fall back
+                # to the node whose ejection expires first (panic routing).
+                candidates = sorted(
+                    (n for n in self.nodes if n.url not in exclude),
+                    key=lambda n: n.ejected_until,
+                )[:1]
+            if not candidates:
+                return None
+            node = min(candidates, key=lambda n: (n.outstanding, n.median_latency() or 0.0))
+            node.outstanding += 1
+            node.total_requests += 1
+            return node
+
+    def _record(self, node: OllamaNode, ok: bool, latency: float) -> None:
+        with self._lock:
+            node.outstanding -= 1
+            if ok:
+                node.consecutive_failures = 0
+                node.latencies.append(latency)
+                self._latencies.append(latency)
+                self._maybe_eject_slow(node)
+            else:
+                node.consecutive_failures += 1
+                node.total_failures += 1
+                if node.consecutive_failures >= self.eject_after_failures:
+                    self._eject(node, f"{node.consecutive_failures} consecutive failures")
+
+    def _eject(self, node: OllamaNode, reason: str) -> None:
+        node.ejected_until = time.monotonic() + self.eject_seconds
+        print(f"[WARN] Ejecting Ollama node {node.url} for {self.eject_seconds:.0f}s: {reason}", file=sys.stderr)
+
+    def _maybe_eject_slow(self, node: OllamaNode) -> None:
+        if len(self.nodes) < 2 or len(node.latencies) < self.min_samples:
+            return
+        peers = [n.median_latency() for n in self.nodes
+                 if n is not node and len(n.latencies) >= self.min_samples]
+        if not peers:
+            return
+        baseline = statistics.median(peers)
+        mine = node.median_latency() or 0.0
+        if baseline > 0 and mine > self.slow_factor * baseline:
+            self._eject(node, f"median latency {mine:.2f}s vs pool {baseline:.2f}s")
+            node.latencies.clear()  # re-admitted nodes start with a clean slate
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.hedge_default_delay_s
+        return max(self.hedge_min_delay_s, _percentile(samples, 95))
+
+    # -- requests --------------------------------------------------------------
+    def _send(self, node: OllamaNode, path: str, payload: Dict[str, Any], timeout: float) -> requests.Response:
+        start = time.monotonic()
+        try:
+            resp = self.session.post(f"{node.url}{path}", json=payload, timeout=timeout)
+            resp.raise_for_status()
+        except Exception:
+            self._record(node, False, time.monotonic() - start)
+            raise
+        self._record(node, True, time.monotonic() - start)
+        return resp
+
+    def post(self, path: str, payload: Dict[str, Any], timeout: float = 120) -> requests.Response:
+        """
+        POST `payload` to `path` on the best available node.
+
+        On failure the request fails over to the next node. With hedging
+        enabled a duplicate is sent to a second, non-ejected node once the
+        hedge delay elapses, and whichever succeeds first is returned.
+
+        Raises:
+            OllamaPoolError: if every attempted node failed
+        """
+        deadline = time.monotonic() + timeout
+        tried: Tuple[str, ...] = ()
+        errors: List[str] = []
+        pending = {}
+
+        def launch(hedge: bool = False) -> bool:
+            nonlocal tried
+            # A hedge is only worth sending to a healthy node; failover may panic-route.
+            node = self._pick(exclude=tried, panic=not hedge)
+            if node is None:
+                return False
+            tried += (node.url,)
+            remaining = max(0.1, deadline - time.monotonic())
+            pending[self._executor.submit(self._send, node, path, payload, remaining)] = node
+            return True
+
+        if not launch():
+            raise OllamaPoolError("No Ollama endpoints configured")
+
+        hedged = not self.hedge
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining if hedged else min(remaining, self.hedge_delay())
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not done:
+                # Hedge timer fired with the primary still outstanding.
+                hedged = True
+                launch(hedge=True)
+                continue
+            for fut in done:
+                node = pending.pop(fut)
+                try:
+                    return fut.result()
+                except Exception as e:
+                    errors.append(f"{node.url}: {e}")
+            if not pending:
+                # Fail over to a node we have not tried yet.
+                launch()
+
+        raise OllamaPoolError(f"All Ollama endpoints failed: {'; '.join(errors) or 'timed out'}")
+
+    # -- health ----------------------------------------------------------------
+    def check_health(self) -> Dict[str, bool]:
+        """Probe every node with GET /api/tags; eject failures, re-admit recoveries."""
+        results: Dict[str, bool] = {}
+        for node in self.nodes:
+            try:
+                resp = self.session.get(f"{node.url}/api/tags", timeout=self.health_timeout_s)
+                ok = resp.ok
+            except Exception:
+                ok = False
+            with self._lock:
+                if ok:
+                    node.consecutive_failures = 0
+                    node.ejected_until = 0.0
+                elif time.monotonic() >= node.ejected_until:
+                    self._eject(node, "health check failed")
+            results[node.url] = ok
+        return results
+
+    def start_health_checks(self, interval_s: float = 15.0) -> None:
+        """Run check_health() every `interval_s` seconds on a daemon thread."""
+        if self._health_thread and self._health_thread.is_alive():
+            return
+
+        def loop() -> None:
+            while not self._stop.wait(interval_s):
+                self.check_health()
+
+        self._health_thread = threading.Thread(target=loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [n.snapshot() for n in self.nodes]
+
+
+# ------------------------------------------------------------------------------
+# Process-wide pool cache (one pool per endpoint set and options)
+# ------------------------------------------------------------------------------
+_pools: Dict[Tuple[Tuple[str, ...], Tuple[Tuple[str, Any], ...]], OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(urls: Sequence[str], **options: Any) -> OllamaPool:
+    """
+    Return the shared pool for this endpoint list and these OllamaPool
+    options, creating it on first use; callers asking for different options
+    get their own pool.
+    """
+    endpoints = tuple(u.rstrip("/") for u in urls)
+    key = (endpoints, tuple(sorted(options.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = OllamaPool(endpoints, **options)
+            _pools[key] = pool
+        return pool
+
+
+# ------------------------------------------------------------------------------
+# Simple test run against local stub servers
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def stub_server(delay_s: float) -> ThreadingHTTPServer:
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(delay_s)
+                body = json.dumps({"message": {"content": f"Action: approve (delay {delay_s}s)"}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        return srv
+
+    fast, slow = stub_server(0.02), stub_server(0.5)
+    urls = [f"http://127.0.0.1:{s.server_address[1]}" for s in (fast, slow)]
+    pool = OllamaPool(urls, hedge=True, hedge_default_delay_s=0.1, min_samples=5)
+    print("Health:", pool.check_health())
+    for _ in range(20):
+        t0 = time.monotonic()
+        pool.post("/api/chat", {"model": "stub"}, timeout=5)
+        print(f"  request took {time.monotonic() - t0:.3f}s")
+    print("Stats:", json.dumps(pool.stats(), indent=2))
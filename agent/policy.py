@@ -3,11 +3,26 @@ Centralized, versioned policy for Gold Collateral Evaluation.
 Update VERSION when any effective threshold/logic changes.
 
 You may load this from a config service or repo later; for now it's local.
+
+The effective policy is compiled once into an immutable CompiledPolicy
+(values frozen, hash and id computed at load time) and served by current().
+If POLICY_FILE is set, its values overlay POLICY and the file is re-read
+when it changes (checked at most every POLICY_RELOAD_CHECK_SECONDS) or on
+SIGHUP once install_sighup_handler() has been called. Every reload that
+changes the policy bumps `revision`, which caches can key on.
 """
 
 import hashlib
 import json
+import os
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
 
 
 VERSION = "gold-risk-2025.10.1"  # bump on any policy change
@@ -29,23 +44,214 @@ POLICY = {
     }
 }
 
+# Optional JSON file overlaying POLICY: either {"version": ..., "values": {...}}
+# (get_current_policy()["body"] shape) or a bare values object.
+POLICY_FILE = os.getenv("POLICY_FILE", "")
+POLICY_RELOAD_CHECK_SECONDS = float(os.getenv("POLICY_RELOAD_CHECK_SECONDS", "5"))
+
 def _hash_policy(payload: dict) -> str:
     # Stable JSON for hashing
     blob = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
     return hashlib.sha256(blob).hexdigest()
 
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    return value
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    return value
+
+
+@dataclass(frozen=True)
+class CompiledPolicy:
+    version: str
+    values: Mapping[str, Any]      # read-only, nested RISK_LEVEL included
+    hash: str                      # sha256 of the values
+    id: str                        # "<version>:<sha256 of the values>", the same in every process
+    updated_at: str                # when this policy was loaded (ISO-8601 UTC); metadata, not part of id
+    revision: int                  # bumped on every reload that changes the hash
+    source: str = "builtin"        # "builtin" or the POLICY_FILE path
+
+    def as_dict(self) -> dict:
+        """The get_current_policy() shape (fresh, mutable copy)."""
+        return {
+            "id": self.id,
+            "version": self.version,
+            "hash": self.hash,
+            "body": {"version": self.version, "updated_at": self.updated_at, "values": _thaw(self.values)},
+        }
+
+    def to_state(self) -> dict:
+        """Plain-JSON form for handing the compiled policy to another process (see install())."""
+        return {"version": self.version, "values": _thaw(self.values), "hash": self.hash, "id": self.id,
+                "updated_at": self.updated_at, "revision": self.revision, "source": self.source}
+
+
+def compile_policy(values: Mapping[str, Any], version: str = VERSION, revision: int = 1,
+                   source: str = "builtin") -> CompiledPolicy:
+    plain = _thaw(values)
+    values_hash = _hash_policy(plain)
+    return CompiledPolicy(
+        version=version,
+        values=_freeze(plain),
+        hash=values_hash,
+        id=f"{version}:{values_hash}",
+        updated_at=datetime.now(timezone.utc).isoformat(),
+        revision=revision,
+        source=source,
+    )
+
+
+def _read_policy_file(path: str) -> Tuple[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    doc = doc.get("body", doc)
+    version = doc.get("version", VERSION) if "values" in doc else VERSION
+    overlay = doc.get("values", doc) if "values" in doc else doc
+    merged = _thaw(POLICY)
+    for k, v in overlay.items():
+        if k == "RISK_LEVEL":
+            merged[k] = {**merged[k], **v}
+        elif k in POLICY:
+            merged[k] = v
+        else:
+            print(f"[WARN] Ignoring unknown policy key in {path}: {k}", file=sys.stderr)
+    validate_values(merged)
+    return version, merged
+
+
+# Accepted (inclusive) range of each scalar policy value
+VALUE_RANGES: Dict[str, Tuple[float, float]] = {
+    "MAX_SAFE_LTV": (0.0, 2.0),
+    "MARGIN_CALL_LTV": (0.0, 2.0),
+    "JEWELLERY_HAIRCUT_BPS": (0, 10000),
+    "BAR_HAIRCUT_BPS": (0, 10000),
+    "VOL_THRESHOLD": (0.0, 10.0),
+    "TENURE_LIMIT_DAYS": (1, 36500),
+}
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_values(values: Mapping[str, Any]) -> None:
+    """
+    Check policy values before they are compiled: numbers within VALUE_RANGES,
+    MAX_SAFE_LTV ≤ MARGIN_CALL_LTV, and exactly the POLICY RISK_LEVEL bands
+    with non-decreasing edges in (0, 2].
+
+    Raises:
+        ValueError: naming the first offending value
+    """
+    for key, (lo, hi) in VALUE_RANGES.items():
+        value = values.get(key)
+        if not _is_number(value) or not lo <= value <= hi:
+            raise ValueError(f"{key} must be a number in [{lo}, {hi}], got {value!r}")
+    if values["MAX_SAFE_LTV"] > values["MARGIN_CALL_LTV"]:
+        raise ValueError(f"MAX_SAFE_LTV {values['MAX_SAFE_LTV']} exceeds MARGIN_CALL_LTV {values['MARGIN_CALL_LTV']}")
+    bands = values.get("RISK_LEVEL")
+    if not isinstance(bands, Mapping) or set(bands) != set(POLICY["RISK_LEVEL"]):
+        raise ValueError(f"RISK_LEVEL must define exactly {', '.join(POLICY['RISK_LEVEL'])}")
+    previous = 0.0
+    for band in POLICY["RISK_LEVEL"]:
+        edge = bands[band]
+        if not _is_number(edge) or not 0 < edge <= 2.0 or edge < previous:
+            raise ValueError(f"RISK_LEVEL.{band} must be a number in (0, 2.0], at least {previous}, got {edge!r}")
+        previous = edge
+
+
+# ------------------------------------------------------------------------------
+# Current policy (atomic swap, hot reload)
+# ------------------------------------------------------------------------------
+_current: Optional[CompiledPolicy] = None
+_file_stamp: Optional[Tuple[float, int]] = None
+_next_check = 0.0
+_reload_requested = False
+_generation = 0                 # bumped on every SIGHUP, also used for env config
+_lock = threading.Lock()
+
+def _stamp(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime, st.st_size)
+    except OSError:
+        return None
+
+def reload(force: bool = False) -> CompiledPolicy:
+    """
+    Rebuild the policy from POLICY (+ POLICY_FILE) and swap it in if it changed.
+    A malformed file, or one whose values fail validate_values(), keeps the
+    previous policy (the builtin one if none was loaded yet).
+    """
+    global _current, _file_stamp, _next_check, _reload_requested
+    with _lock:
+        _reload_requested = False
+        _next_check = time.monotonic() + POLICY_RELOAD_CHECK_SECONDS
+        stamp = _stamp(POLICY_FILE) if POLICY_FILE else None
+        if _current is not None and not force and stamp == _file_stamp:
+            return _current
+        version, values, source = VERSION, POLICY, "builtin"
+        if POLICY_FILE:
+            try:
+                version, values = _read_policy_file(POLICY_FILE)
+                source = POLICY_FILE
+            except (OSError, ValueError, AttributeError, TypeError) as e:
+                print(f"[WARN] Could not load POLICY_FILE {POLICY_FILE}: {e}", file=sys.stderr)
+                _file_stamp = stamp     # don't retry until the file changes again
+                if _current is not None:
+                    return _current
+        _file_stamp = stamp
+        revision = _current.revision if _current else 0
+        candidate = compile_policy(values, version, revision + 1, source)
+        if _current is not None and candidate.hash == _current.hash and candidate.version == _current.version:
+            return _current
+        _current = candidate
+        if revision:
+            print(f"[INFO] Policy reloaded - Version: {candidate.version}, Hash: {candidate.hash}, "
+                  f"revision {candidate.revision}", file=sys.stderr)
+        return candidate
+
+def install(state: Mapping[str, Any]) -> CompiledPolicy:
+    """Adopt a policy compiled elsewhere (CompiledPolicy.to_state()), e.g. in a worker process."""
+    global _current, _file_stamp, _next_check
+    pol = CompiledPolicy(**{**state, "values": _freeze(state["values"])})
+    with _lock:
+        _current = pol
+        _file_stamp = _stamp(POLICY_FILE) if POLICY_FILE else None
+        _next_check = time.monotonic() + POLICY_RELOAD_CHECK_SECONDS
+    return pol
+
+def current() -> CompiledPolicy:
+    """The compiled policy; re-checks POLICY_FILE at most every POLICY_RELOAD_CHECK_SECONDS."""
+    pol = _current
+    if pol is None or _reload_requested or (POLICY_FILE and time.monotonic() >= _next_check):
+        pol = reload(force=_reload_requested)
+    return pol
+
+def revision() -> int:
+    return current().revision
+
+def generation() -> int:
+    """Counter bumped by SIGHUP; configuration caches outside this module key on it."""
+    return _generation
+
+def _on_sighup(signum, frame) -> None:
+    # Only flag it: the reload runs on the next current() outside the handler.
+    global _reload_requested, _generation
+    _reload_requested = True
+    _generation += 1
+
+def install_sighup_handler() -> bool:
+    """Reload policy (and env-derived config) on SIGHUP. Main thread only; no-op on Windows."""
+    if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signal.SIGHUP, _on_sighup)
+    return True
+
 def get_current_policy() -> dict:
     """
     Returns a self-describing policy object with id/version/hash.
     """
-    body = {
-        "version": VERSION,
-        "updated_at": datetime.now(timezone.utc).isoformat(),
-        "values": POLICY,
-    }
-    return {
-        "id": f"{VERSION}:{_hash_policy(body)}",
-        "version": VERSION,
-        "hash": _hash_policy(POLICY),
-        "body": body,
-    }
\ No newline at end of file
+    return current().as_dict()
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+portfolio.py
+
+In-memory structure-of-arrays container for the open loan book.
+
+A Portfolio keeps one typed numpy array per field instead of a LoanInput /
+dict per loan:
+
+    principal_myr    float64        haircut_bps      int32
+    gold_weight_g    float64        tenure_days      int32
+    purity           int16          is_bar           bool
+    value_per_price  float64        collateral MYR per 1 MYR/g of gold, after haircut
+    trigger_price    float64        gold MYR/g at which LTV reaches MARGIN_CALL_LTV
+    band             int8           risk band (rules.RISK_BANDS) at Portfolio.price
+
+plus a loan_id -> row dict. Arrays grow by doubling; remove() moves the last
+row into the hole, so add/remove/update are O(1) and the live rows are
+always the prefix [:len(portfolio)]. Derived columns are recomputed for the
+touched row only; reprice() refreshes every band in one vectorized pass.
+
+portfolio[loan_id] returns a LoanView, a __slots__ object that reads and
+writes the arrays directly, for code that wants per-loan attribute access.
+arrays() exposes the live columns in the scenarios.loans_to_arrays() layout
+so run_scenarios() / simulate_margin_calls() work on the resident book.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+import policy
+from rules import RISK_BANDS, risk_band_index
+
+_COLUMNS = {
+    "principal_myr": np.float64,
+    "gold_weight_g": np.float64,
+    "purity": np.int16,
+    "haircut_bps": np.int32,
+    "tenure_days": np.int32,
+    "is_bar": np.bool_,
+    "value_per_price": np.float64,
+    "trigger_price": np.float64,
+    "band": np.int8,
+}
+# Fields a caller may set; the rest are derived from them.
+INPUT_FIELDS = ("principal_myr", "gold_weight_g", "purity", "haircut_bps", "tenure_days", "is_bar")
+# Fields every added loan must carry (haircut_bps / is_bar have defaults).
+REQUIRED_FIELDS = ("principal_myr", "gold_weight_g", "purity", "tenure_days")
+
+
+class LoanView:
+    """Attribute access to one loan's row. Stays valid across other loans' add/remove."""
+
+    __slots__ = ("_portfolio", "loan_id")
+
+    def __init__(self, portfolio: "Portfolio", loan_id: str):
+        self._portfolio = portfolio
+        self.loan_id = loan_id
+
+    def _get(self, name: str) -> Any:
+        p = self._portfolio
+        return p._cols[name][p._index[self.loan_id]].item()
+
+    principal_myr = property(lambda self: self._get("principal_myr"))
+    gold_weight_g = property(lambda self: self._get("gold_weight_g"))
+    purity = property(lambda self: self._get("purity"))
+    haircut_bps = property(lambda self: self._get("haircut_bps"))
+    tenure_days = property(lambda self: self._get("tenure_days"))
+    is_bar = property(lambda self: self._get("is_bar"))
+    value_per_price = property(lambda self: self._get("value_per_price"))
+    trigger_price = property(lambda self: self._get("trigger_price"))
+
+    @property
+    def risk_level(self) -> Optional[str]:
+        band = self._get("band")
+        return RISK_BANDS[band] if band >= 0 else None
+
+    def ltv(self, price: Optional[float] = None) -> float:
+        p = self._portfolio
+        price = p.price if price is None else price
+        return self.principal_myr / (self.value_per_price * price) if price else float("nan")
+
+    def update(self, **fields: Any) -> None:
+        self._portfolio.update(self.loan_id, **fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        p = self._portfolio
+        row = p._index[self.loan_id]
+        out = {"loan_id": self.loan_id}
+        out.update({name: col[row].item() for name, col in p._cols.items()})
+        out["collateral_type"] = "bar" if out.pop("is_bar") else "jewellery"
+        return out
+
+    def __repr__(self) -> str:
+        return f"LoanView({self.loan_id!r}, principal_myr={self.principal_myr}, ltv={self.ltv():.4f})"
+
+
+class Portfolio:
+    """Structure-of-arrays loan book with O(1) add/remove/update by loan_id."""
+
+    def __init__(self, capacity: int = 1024, price: Optional[float] = None,
+                 values: Optional[Mapping[str, Any]] = None):
+        pol = values or policy.current().values
+        self.margin_call_ltv = float(pol["MARGIN_CALL_LTV"])
+        self.jewellery_haircut_bps = int(pol["JEWELLERY_HAIRCUT_BPS"])
+        self.bar_haircut_bps = int(pol["BAR_HAIRCUT_BPS"])
+        self.edges = dict(pol["RISK_LEVEL"])
+        self.price = price
+        self._n = 0
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._cols: Dict[str, np.ndarray] = {name: np.zeros(max(1, capacity), dtype=dt)
+                                             for name, dt in _COLUMNS.items()}
+
+    # -- sizing ----------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, loan_id: str) -> bool:
+        return loan_id in self._index
+
+    @property
+    def capacity(self) -> int:
+        return len(self._cols["principal_myr"])
+
+    def _reserve(self, n: int) -> None:
+        if n <= self.capacity:
+            return
+        new_cap = max(n, self.capacity * 2)
+        for name, col in self._cols.items():
+            grown = np.zeros(new_cap, dtype=col.dtype)
+            grown[:self._n] = col[:self._n]
+            self._cols[name] = grown
+
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self._cols.values())
+
+    # -- derived columns -------------------------------------------------------
+    def _derive(self, rows: Any) -> None:
+        c = self._cols
+        c["value_per_price"][rows] = np.maximum(
+            c["gold_weight_g"][rows] * c["purity"][rows] / 999.0
+            * np.maximum(0.0, 1.0 - c["haircut_bps"][rows] / 10_000.0), 1e-12)
+        c["trigger_price"][rows] = c["principal_myr"][rows] / (c["value_per_price"][rows] * self.margin_call_ltv)
+        if self.price:
+            c["band"][rows] = risk_band_index(c["principal_myr"][rows] / (c["value_per_price"][rows] * self.price),
+                                              self.edges)
+        else:
+            c["band"][rows] = -1
+
+    def reprice(self, price: float) -> np.ndarray:
+        """Set the reference gold price (MYR/g) and refresh every risk band; returns the bands."""
+        self.price = price
+        self._derive(slice(0, self._n))
+        return self._cols["band"][:self._n]
+
+    def set_policy(self, values: Mapping[str, Any]) -> None:
+        """Re-derive trigger prices and bands for new policy values (haircuts of existing loans kept)."""
+        self.margin_call_ltv = float(values.get("MARGIN_CALL_LTV", self.margin_call_ltv))
+        self.jewellery_haircut_bps = int(values.get("JEWELLERY_HAIRCUT_BPS", self.jewellery_haircut_bps))
+        self.bar_haircut_bps = int(values.get("BAR_HAIRCUT_BPS", self.bar_haircut_bps))
+        self.edges = dict(values.get("RISK_LEVEL", self.edges))
+        self._derive(slice(0, self._n))
+
+    # -- mutation --------------------------------------------------------------
+    def _normalize(self, loan: Mapping[str, Any], new: bool = True) -> Dict[str, Any]:
+        """Input fields of `loan`; the policy haircut applies unless one is given (or, on update, collateral is unchanged)."""
+        row = {k: loan[k] for k in INPUT_FIELDS if k in loan}
+        if "is_bar" not in row and "collateral_type" in loan:
+            row["is_bar"] = str(loan["collateral_type"]).lower() == "bar"
+        if "haircut_bps" not in row and (new or "is_bar" in row):
+            row["haircut_bps"] = self.bar_haircut_bps if row.get("is_bar") else self.jewellery_haircut_bps
+        if new:
+            row.setdefault("is_bar", False)
+        return row
+
+    def _validated(self, loans: Iterable[Mapping[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        (loan_id, typed input fields) per new loan, checked before any row is written.
+
+        Raises:
+            KeyError: loan_id missing, already present or repeated
+            ValueError: a required field is missing or not convertible to its column type
+        """
+        rows: List[Tuple[str, Dict[str, Any]]] = []
+        seen = set()
+        for loan in loans:
+            if "loan_id" not in loan:
+                raise KeyError("loan_id")
+            loan_id = str(loan["loan_id"])
+            if loan_id in self._index or loan_id in seen:
+                raise KeyError(f"loan {loan_id} is already in the portfolio")
+            missing = [k for k in REQUIRED_FIELDS if loan.get(k) is None]
+            if missing:
+                raise ValueError(f"loan {loan_id}: missing {', '.join(missing)}")
+            try:
+                fields = {name: _COLUMNS[name](value) for name, value in self._normalize(loan).items()}
+            except (TypeError, ValueError, OverflowError) as e:
+                raise ValueError(f"loan {loan_id}: {e}") from e
+            seen.add(loan_id)
+            rows.append((loan_id, fields))
+        return rows
+
+    def _append(self, rows: List[Tuple[str, Dict[str, Any]]]) -> None:
+        start = self._n
+        self._reserve(start + len(rows))
+        for loan_id, fields in rows:
+            for name, value in fields.items():
+                self._cols[name][self._n] = value
+            self._ids.append(loan_id)
+            self._index[loan_id] = self._n
+            self._n += 1
+        self._derive(slice(start, self._n))
+
+    def add(self, loan: Mapping[str, Any]) -> LoanView:
+        """
+        Add one loan (LoanInput fields, loan_id, optional collateral_type / haircut_bps).
+
+        Raises:
+            KeyError: loan_id already present
+            ValueError: a required field is missing or malformed
+        """
+        rows = self._validated([loan])
+        self._append(rows)
+        return LoanView(self, rows[0][0])
+
+    def extend(self, loans: Iterable[Mapping[str, Any]]) -> int:
+        """
+        Bulk add; all loans are validated before any is written (all or nothing)
+        and derived columns are computed once for the new rows. Returns the count added.
+        """
+        rows = self._validated(loans)
+        self._append(rows)
+        return len(rows)
+
+    def update(self, loan_id: str, **fields: Any) -> None:
+        """Change input fields of one loan in place (e.g. a part repayment of principal_myr)."""
+        row = self._index[loan_id]
+        unknown = set(fields) - set(INPUT_FIELDS) - {"collateral_type"}
+        if unknown:
+            raise KeyError(f"not updatable: {', '.join(sorted(unknown))}")
+        for name, value in self._normalize(fields, new=False).items():
+            self._cols[name][row] = value
+        self._derive(slice(row, row + 1))
+
+    def remove(self, loan_id: str) -> None:
+        """Drop a loan; the last row moves into its slot and the freed row is zeroed."""
+        row = self._index.pop(loan_id)
+        last = self._n - 1
+        if row != last:
+            for col in self._cols.values():
+                col[row] = col[last]
+            moved = self._ids[last]
+            self._ids[row] = moved
+            self._index[moved] = row
+        for col in self._cols.values():
+            col[last] = 0
+        self._ids.pop()
+        self._n = last
+
+    # -- reading ---------------------------------------------------------------
+    def __getitem__(self, loan_id: str) -> LoanView:
+        if loan_id not in self._index:
+            raise KeyError(loan_id)
+        return LoanView(self, loan_id)
+
+    def __iter__(self) -> Iterator[LoanView]:
+        return (LoanView(self, loan_id) for loan_id in list(self._ids))
+
+    def column(self, name: str) -> np.ndarray:
+        """Live view of one column (rows [:len(self)]); invalidated by growth."""
+        return self._cols[name][:self._n]
+
+    @property
+    def loan_ids(self) -> List[str]:
+        return list(self._ids)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Live columns in the scenarios.loans_to_arrays() layout."""
+        return {name: self.column(name) for name in ("principal_myr", "gold_weight_g", "purity", "tenure_days", "is_bar")}
+
+    def ltv(self, price: Optional[float] = None) -> np.ndarray:
+        price = self.price if price is None else price
+        return self.column("principal_myr") / (self.column("value_per_price") * price)
+
+    def margin_calls(self, price: Optional[float] = None) -> List[str]:
+        """loan_ids whose trigger price is at or above `price` (default: the reference price)."""
+        price = self.price if price is None else price
+        idx = np.flatnonzero(self.column("trigger_price") >= price)
+        return [self._ids[i] for i in idx.tolist()]
+
+    def band_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.column("band")[self.column("band") >= 0], minlength=len(RISK_BANDS))
+        return {name: int(counts[i]) for i, name in enumerate(RISK_BANDS)}
+
+    @classmethod
+    def from_loan_book(cls, book: Any, price: Optional[float] = None,
+                       values: Optional[Mapping[str, Any]] = None) -> "Portfolio":
+        """Load a loan_book.LoanBook with array copies (no per-loan objects)."""
+        p = cls(capacity=max(1024, len(book)), price=price, values=values)
+        n = len(book)
+        cols = book.arrays()
+        for name in ("principal_myr", "gold_weight_g", "purity", "tenure_days", "is_bar"):
+            p._cols[name][:n] = cols[name]
+        p._cols["haircut_bps"][:n] = np.where(cols["is_bar"], p.bar_haircut_bps, p.jewellery_haircut_bps)
+        p._ids = book.decoded("loan_id").tolist()
+        p._index = {loan_id: i for i, loan_id in enumerate(p._ids)}
+        if len(p._index) != n:
+            raise ValueError("loan book has duplicate loan_ids")
+        p._n = n
+        p._derive(slice(0, n))
+        return p
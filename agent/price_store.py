@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+price_store.py
+
+Local, append-only time-series store for gold and FX prices.
+
+Each symbol is kept as two flat little-endian files under PRICE_STORE_DIR:
+
+    <symbol>.ts   int64   epoch seconds (non-decreasing)
+    <symbol>.px   float64 price
+
+Reads go through numpy memory maps, so window queries are a binary search
+on the timestamp column and return zero-copy slices of the mapped files.
+
+Appends hold an exclusive flock on <symbol>.lock, so evaluator and batch
+worker processes can share the store: the ordering check and the pair of
+writes happen as one step, and a torn pair left by a crashed writer is
+truncated to the common length before the next append.
+
+Symbols written by sources.py:
+    XAU/USD      gold, USD per troy ounce
+    USD/MYR      FX rate
+    XAU/MYR_G    gold, MYR per gram (derived)
+
+CLI:
+    python price_store.py import prices.csv [--symbol XAU/MYR_G]
+    python price_store.py tail XAU/MYR_G [-n 10]
+"""
+
+import contextlib
+import csv
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows: single-process appends only
+    fcntl = None
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "data/prices")
+
+GOLD_USD_OZ = "XAU/USD"
+FX_USD_MYR = "USD/MYR"
+GOLD_MYR_G = "XAU/MYR_G"
+
+_TS_DTYPE = np.dtype("<i8")
+_PX_DTYPE = np.dtype("<f8")
+
+
+def _as_epoch(ts: Optional[float]) -> int:
+    return int(time.time() if ts is None else ts)
+
+
+class PriceSeries:
+    """Append-only (timestamp, price) series for a single symbol."""
+
+    def __init__(self, directory: str, symbol: str):
+        self.symbol = symbol
+        safe = symbol.replace("/", "_")
+        self.ts_path = os.path.join(directory, f"{safe}.ts")
+        self.px_path = os.path.join(directory, f"{safe}.px")
+        self.lock_path = os.path.join(directory, f"{safe}.lock")
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._mapped_size = -1
+        self._ts = np.empty(0, dtype=_TS_DTYPE)
+        self._px = np.empty(0, dtype=_PX_DTYPE)
+        os.makedirs(directory, exist_ok=True)
+
+    # -- reading ---------------------------------------------------------------
+    def _columns(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Current memory maps, remapped only when the files have grown."""
+        try:
+            size = min(os.path.getsize(self.ts_path) // 8, os.path.getsize(self.px_path) // 8)
+        except OSError:
+            size = 0
+        with self._lock:
+            if size != self._mapped_size:
+                if size:
+                    # A torn append (crash between the two writes) leaves one file
+                    # longer than the other; only the common prefix is visible.
+                    self._ts = np.memmap(self.ts_path, dtype=_TS_DTYPE, mode="r", shape=(size,))
+                    self._px = np.memmap(self.px_path, dtype=_PX_DTYPE, mode="r", shape=(size,))
+                else:
+                    self._ts = np.empty(0, dtype=_TS_DTYPE)
+                    self._px = np.empty(0, dtype=_PX_DTYPE)
+                self._mapped_size = size
+            return self._ts, self._px
+
+    def __len__(self) -> int:
+        return len(self._columns()[0])
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, prices) with start <= ts < end, as views into the mapped files."""
+        ts, px = self._columns()
+        lo = 0 if start is None else int(np.searchsorted(ts, int(start), side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, int(end), side="left"))
+        return ts[lo:hi], px[lo:hi]
+
+    def tail(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        ts, px = self._columns()
+        return ts[-n:], px[-n:]
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        ts, px = self._columns()
+        if not len(ts):
+            return None
+        return int(ts[-1]), float(px[-1])
+
+    def value_at(self, ts: float) -> Optional[Tuple[int, float]]:
+        """Last observation at or before `ts`."""
+        col_ts, col_px = self._columns()
+        idx = int(np.searchsorted(col_ts, int(ts), side="right")) - 1
+        if idx < 0:
+            return None
+        return int(col_ts[idx]), float(col_px[idx])
+
+    # -- writing ---------------------------------------------------------------
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._write_lock:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)    # releases the flock
+
+    def _repair(self) -> int:
+        """Truncate both columns to their common length (a torn pair of appends); returns it."""
+        sizes = [os.path.getsize(p) if os.path.exists(p) else 0 for p in (self.ts_path, self.px_path)]
+        n = min(sizes) // 8
+        for path, size in zip((self.ts_path, self.px_path), sizes):
+            if size != n * 8:
+                print(f"[WARN] Price series {self.symbol}: truncating {size - n * 8} bytes of a torn append "
+                      f"in {path}", file=sys.stderr)
+                with open(path, "ab") as f:
+                    f.truncate(n * 8)
+        return n
+
+    def _last_ts(self, n: int) -> Optional[int]:
+        if not n:
+            return None
+        with open(self.ts_path, "rb") as f:
+            f.seek((n - 1) * 8)
+            return int(np.frombuffer(f.read(8), dtype=_TS_DTYPE)[0])
+
+    def extend(self, timestamps: np.ndarray, prices: np.ndarray) -> int:
+        """
+        Append observations. Points older than the last stored timestamp are
+        dropped so the timestamp column stays sorted. Returns the number written.
+        """
+        ts = np.asarray(timestamps, dtype=_TS_DTYPE)
+        px = np.asarray(prices, dtype=_PX_DTYPE)
+        if ts.shape != px.shape:
+            raise ValueError("timestamps and prices must have the same length")
+        if not len(ts):
+            return 0
+        order = np.argsort(ts, kind="stable")
+        ts, px = ts[order], px[order]
+        with self._locked():
+            last = self._last_ts(self._repair())
+            if last is not None:
+                keep = ts >= last
+                ts, px = ts[keep], px[keep]
+            if not len(ts):
+                return 0
+            with open(self.ts_path, "ab") as f_ts, open(self.px_path, "ab") as f_px:
+                f_ts.write(ts.tobytes())
+                f_px.write(px.tobytes())
+        return len(ts)
+
+    def append(self, price: float, ts: Optional[float] = None) -> bool:
+        return self.extend(np.array([_as_epoch(ts)]), np.array([price])) == 1
+
+
+class PriceStore:
+    """Directory of PriceSeries, one per symbol."""
+
+    def __init__(self, directory: str = PRICE_STORE_DIR):
+        self.directory = directory
+        self._series: Dict[str, PriceSeries] = {}
+        self._lock = threading.Lock()
+
+    def series(self, symbol: str) -> PriceSeries:
+        with self._lock:
+            s = self._series.get(symbol)
+            if s is None:
+                s = self._series[symbol] = PriceSeries(self.directory, symbol)
+            return s
+
+    def record(self, symbol: str, price: float, ts: Optional[float] = None) -> bool:
+        return self.series(symbol).append(price, ts)
+
+    def daily_close(self, symbol: str, day: datetime) -> Optional[float]:
+        """Last price recorded during the UTC calendar day `day`, or None."""
+        start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        end = start + timedelta(days=1)
+        ts, px = self.series(symbol).window(start.timestamp(), end.timestamp())
+        return float(px[-1]) if len(px) else None
+
+    def import_csv(self, path: str, symbol: Optional[str] = None) -> int:
+        """
+        Bulk-load a CSV with columns `timestamp,price` (plus `symbol` when
+        `symbol` is not given). Timestamps may be epoch seconds or ISO-8601.
+        Returns the number of points written.
+        """
+        rows: Dict[str, list] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                sym = symbol or row["symbol"]
+                raw_ts = row["timestamp"].strip()
+                try:
+                    ts = float(raw_ts)
+                except ValueError:
+                    parsed = datetime.fromisoformat(raw_ts.replace("Z", "+00:00"))
+                    if parsed.tzinfo is None:
+                        parsed = parsed.replace(tzinfo=timezone.utc)
+                    ts = parsed.timestamp()
+                rows.setdefault(sym, []).append((ts, float(row["price"])))
+        written = 0
+        for sym, points in rows.items():
+            arr = np.array(points, dtype=np.float64)
+            written += self.series(sym).extend(arr[:, 0], arr[:, 1])
+        return written
+
+
+_store: Optional[PriceStore] = None
+
+
+def get_price_store() -> PriceStore:
+    """Process-wide store rooted at PRICE_STORE_DIR."""
+    global _store
+    if _store is None:
+        _store = PriceStore()
+    return _store
+
+
+# ------------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local gold/FX price history store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_imp = sub.add_parser("import", help="import a CSV (timestamp,price[,symbol])")
+    p_imp.add_argument("path")
+    p_imp.add_argument("--symbol")
+    p_tail = sub.add_parser("tail", help="print the latest points of a symbol")
+    p_tail.add_argument("symbol")
+    p_tail.add_argument("-n", type=int, default=10)
+    args = parser.parse_args()
+
+    store = get_price_store()
+    if args.cmd == "import":
+        n = store.import_csv(args.path, args.symbol)
+        print(f"[INFO] Imported {n} points into {store.directory}", file=sys.stderr)
+    else:
+        ts, px = store.series(args.symbol).tail(args.n)
+        for t, p in zip(ts, px):
+            print(datetime.fromtimestamp(int(t), tz=timezone.utc).isoformat(), float(p))
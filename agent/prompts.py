@@ -6,20 +6,30 @@ Prompt templates for the Gold Collateral Evaluation Agent.
 These are model-agnostic and work with local LLMs via Ollama.
 
 Used by gold_evaluator.py:
-  - SYSTEM_PROMPT
-  - RECOMMENDATION_PROMPT (expects .format(loan_json=..., metrics_json=..., allowed_actions="..."))
+  - SYSTEM_PROMPT (fully rendered; byte-identical on every call)
+  - build_recommendation_prompt(loan, metrics) → (user prompt, estimated tokens)
+
+Prompt layout is ordered for Ollama's KV prefix cache: everything that never
+changes (system prompt, then the static part of the user prompt) comes first,
+and the per-loan key=value data comes last.
 """
 
+import re
+import sys
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+
+ALLOWED_ACTIONS = "approve | monitor | margin_call | reject"
+
 # ------------------------------------------------------------------------------
 # SYSTEM PROMPT
 # ------------------------------------------------------------------------------
-SYSTEM_PROMPT = """
+_SYSTEM_PROMPT_TEMPLATE = """
 You are the **Gold Collateral Evaluation Agent**, operating in a regulated
 micro-lending / pawn context. Your mission is to convert numeric risk metrics
 about a gold-collateralized loan into a concise, investor-grade recommendation.
 
 Your responsibilities:
-1) Read the loan inputs and computed risk metrics provided as JSON.
+1) Read the loan inputs and computed risk metrics provided as key=value pairs.
 2) Choose exactly ONE action from the allowed set when asked:
    {allowed_actions}
 3) Provide a short, professional rationale grounded ONLY in the provided data.
@@ -46,15 +56,18 @@ Safety & privacy:
 You must comply with all of the above.
 """.strip()
 
+# Rendered once at import so the prefix Ollama sees never varies between calls.
+SYSTEM_PROMPT = _SYSTEM_PROMPT_TEMPLATE.format(allowed_actions=ALLOWED_ACTIONS)
+
 
 # ------------------------------------------------------------------------------
 # RECOMMENDATION PROMPT
 # ------------------------------------------------------------------------------
-# This prompt is rendered with:
+# Rendered by build_recommendation_prompt() with:
 #   RECOMMENDATION_PROMPT.format(
-#       loan_json=loan.model_dump_json(),
-#       metrics_json=metrics.model_dump_json(),
-#       allowed_actions="approve | monitor | margin_call | reject",
+#       loan_kv="principal_myr=5000 gold_weight_g=25 purity=916 tenure_days=90",
+#       metrics_kv="ltv=0.83 max_safe_ltv=0.8 ...",
+#       allowed_actions=ALLOWED_ACTIONS,
 #   )
 #
 # The model should return plain text like:
@@ -63,22 +76,95 @@ You must comply with all of the above.
 #
 RECOMMENDATION_PROMPT = """
 You will receive:
-- loan_json: the basic loan inputs
-- metrics_json: computed risk metrics (e.g., LTV, thresholds, volatility)
+- loan: the basic loan inputs
+- metrics: computed risk metrics (e.g., LTV, thresholds, volatility)
+Both are space-separated key=value pairs; fields that are not provided are omitted.
 
 Allowed actions (choose EXACTLY ONE): {allowed_actions}
 
 Instructions:
-1) Read both JSON payloads carefully.
+1) Read both payloads carefully.
 2) On the FIRST line, output the chosen action in the format: “Action: <one_token>”.
 3) On the SECOND line, output “Rationale: ...” with a short explanation (≤ 120 words).
 4) Ground your rationale in the provided metrics. Name the key fields you used (e.g., LTV, max_safe_ltv).
 5) If a helpful observation exists (e.g., jewellery haircut, shop rating, volatility), include it succinctly.
 6) Do NOT output any other sections, bullets, or extraneous text.
 
-loan_json:
-{loan_json}
-
-metrics_json:
-{metrics_json}
+loan: {loan_kv}
+metrics: {metrics_kv}
 """.strip()
+
+
+# ------------------------------------------------------------------------------
+# Compact prompt builder
+# ------------------------------------------------------------------------------
+# Fixed field order keeps the encoding (and therefore the cached prefix up to
+# the first differing value) stable. Fields the guidance never refers to
+# (purity_factor, haircut_factor, fx_usd_myr, duplicated principal) are left out.
+LOAN_PROMPT_FIELDS: Tuple[str, ...] = ("principal_myr", "gold_weight_g", "purity", "tenure_days")
+METRIC_PROMPT_FIELDS: Tuple[str, ...] = (
+    "ltv", "max_safe_ltv", "margin_call_ltv", "haircut_bps",
+    "collateral_value_myr", "gold_price_myr_per_g",
+    "gold_volatility", "vol_window_days", "shop_rating",
+)
+# Dropped in this order when a prompt exceeds its token budget.
+OPTIONAL_METRIC_FIELDS: Tuple[str, ...] = (
+    "shop_rating", "vol_window_days", "gold_price_myr_per_g", "collateral_value_myr",
+)
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate token count for Llama-family tokenizers: one token per word,
+    per run of up to three digits and per punctuation mark. Ollama's own
+    prompt_eval_count is the ground truth once a response comes back.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+
+def _fmt_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def encode_kv(data: Mapping[str, Any], fields: Iterable[str]) -> str:
+    """Render `fields` of `data` as "k=v k=v", in the given order, skipping missing/None values."""
+    return " ".join(f"{k}={_fmt_value(data[k])}" for k in fields if data.get(k) is not None)
+
+
+def build_recommendation_prompt(loan: Mapping[str, Any], metrics: Mapping[str, Any],
+                                token_budget: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Render RECOMMENDATION_PROMPT with compact loan/metrics encodings.
+
+    If `token_budget` is given and SYSTEM_PROMPT + user prompt would exceed it,
+    optional metric fields are dropped (see OPTIONAL_METRIC_FIELDS); if the
+    prompt still does not fit, a warning is logged and it is returned as is.
+
+    Returns:
+        (user_prompt, estimated total prompt tokens including SYSTEM_PROMPT)
+    """
+    fields: List[str] = list(METRIC_PROMPT_FIELDS)
+    loan_kv = encode_kv(loan, LOAN_PROMPT_FIELDS)
+    while True:
+        prompt = RECOMMENDATION_PROMPT.format(
+            loan_kv=loan_kv,
+            metrics_kv=encode_kv(metrics, fields),
+            allowed_actions=ALLOWED_ACTIONS,
+        )
+        tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(prompt)
+        if token_budget is None or tokens <= token_budget:
+            return prompt, tokens
+        droppable = [f for f in OPTIONAL_METRIC_FIELDS if f in fields and metrics.get(f) is not None]
+        if not droppable:
+            print(f"[WARN] Prompt needs ~{tokens} tokens, over budget of {token_budget}", file=sys.stderr)
+            return prompt, tokens
+        fields.remove(droppable[0])
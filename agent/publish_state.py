@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+publish_state.py
+
+Last-published state per loan and topic, so re-evaluations only reach the
+Hedera topics when the decision changes.
+
+Periodic book revaluations re-evaluate every open loan; without this each
+one sends two near-identical encrypted messages (input and output topic).
+For every loan id and topic ("input" / "output") the index keeps what was
+last published there:
+
+    risk_level, action, policy_hash, metrics digest, eval_id, timestamps
+
+The topics are tracked separately so that when one send fails only that
+topic is retried by the next evaluation; a message that did go out is not
+sent twice.
+
+The metrics digest covers the material parts of an evaluation only: LTV
+bucketed to PUBLISH_LTV_STEP, principal, haircut, shop rating, the
+margin-call probability bucketed to PUBLISH_MC_STEP and the fired rule
+codes. Price noise inside a bucket therefore does not count as a change.
+
+decide() returns:
+    "publish"    first evaluation of the loan, or anything material changed
+    "heartbeat"  unchanged, but nothing was sent for PUBLISH_HEARTBEAT_SECONDS;
+                 a small {"type": "heartbeat", ...} message (encrypted like
+                 the others) goes to the output topic (the input topic
+                 treats it as "skip")
+    "skip"       unchanged; nothing is sent
+
+Evaluations without a loan id are always published. The index is a SQLite
+table (PUBLISH_STATE_DB) so it survives restarts and is shared by batch
+worker processes. PUBLISH_DEDUP=false restores publish-every-time.
+
+CLI:
+    python publish_state.py show LOAN_ID
+    python publish_state.py forget LOAN_ID     # force the next publish
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+PUBLISH_DEDUP = os.getenv("PUBLISH_DEDUP", "true").lower() == "true"
+PUBLISH_STATE_DB = os.getenv("PUBLISH_STATE_DB", "data/publish_state.sqlite")
+PUBLISH_HEARTBEAT_SECONDS = float(os.getenv("PUBLISH_HEARTBEAT_SECONDS", "86400"))  # 0 = never
+PUBLISH_LTV_STEP = float(os.getenv("PUBLISH_LTV_STEP", "0.01"))
+PUBLISH_MC_STEP = float(os.getenv("PUBLISH_MC_STEP", "0.05"))
+
+PUBLISH, HEARTBEAT, SKIP = "publish", "heartbeat", "skip"
+INPUT_TOPIC, OUTPUT_TOPIC = "input", "output"
+
+
+def _bucket(value: Optional[float], step: float) -> Optional[int]:
+    if value is None or step <= 0 or not math.isfinite(value):
+        return None
+    return int(math.floor(value / step))
+
+
+def metrics_digest(metrics: Mapping[str, Any], rule_codes: Iterable[str] = ()) -> str:
+    """Digest of the material metrics (RiskMetrics.model_dump()) and fired rule codes."""
+    material = {
+        "ltv": _bucket(metrics.get("ltv"), PUBLISH_LTV_STEP),
+        "principal_myr": metrics.get("principal_myr"),
+        "haircut_bps": metrics.get("haircut_bps"),
+        "shop_rating": metrics.get("shop_rating"),
+        "mc": _bucket(metrics.get("margin_call_probability"), PUBLISH_MC_STEP),
+        "rules": sorted(rule_codes),
+    }
+    blob = json.dumps(material, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+class PublishStateIndex:
+    """(loan_id, topic) -> last published decision, in SQLite (memory-only if the file cannot be opened)."""
+
+    def __init__(self, db_path: str = PUBLISH_STATE_DB, heartbeat_s: float = PUBLISH_HEARTBEAT_SECONDS):
+        self.db_path = db_path
+        self.heartbeat_s = heartbeat_s
+        self._lock = threading.Lock()
+        try:
+            if db_path != ":memory:":
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            print(f"[WARN] Publish state database {db_path} unavailable; memory only: {e}", file=sys.stderr)
+            self._db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS publish_topic_state ("
+            "loan_id TEXT NOT NULL, topic TEXT NOT NULL, risk_level TEXT, action TEXT, policy_hash TEXT, "
+            "digest TEXT, eval_id TEXT, published_unix REAL, last_sent_unix REAL, PRIMARY KEY (loan_id, topic))")
+
+    def get(self, loan_id: str, topic: str = OUTPUT_TOPIC) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cur = self._db.execute("SELECT * FROM publish_topic_state WHERE loan_id = ? AND topic = ?",
+                                   (loan_id, topic))
+            row = cur.fetchone()
+            return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def decide(self, loan_id: Optional[str], state: Mapping[str, Any], topic: str = OUTPUT_TOPIC,
+               now: Optional[float] = None) -> str:
+        """PUBLISH, HEARTBEAT or SKIP on `topic` for `state` (risk_level, action, policy_hash, digest)."""
+        if not loan_id:
+            return PUBLISH
+        last = self.get(loan_id, topic)
+        if last is None or any(last[k] != state.get(k) for k in ("risk_level", "action", "policy_hash", "digest")):
+            return PUBLISH
+        now = time.time() if now is None else now
+        if self.heartbeat_s > 0 and now - (last["last_sent_unix"] or 0.0) >= self.heartbeat_s:
+            return HEARTBEAT
+        return SKIP
+
+    def record(self, loan_id: str, state: Mapping[str, Any], mode: str, topic: str = OUTPUT_TOPIC,
+               now: Optional[float] = None) -> None:
+        """Remember a successful PUBLISH (full state) or HEARTBEAT (send time only) on `topic`."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if mode == HEARTBEAT:
+                self._db.execute("UPDATE publish_topic_state SET last_sent_unix = ? WHERE loan_id = ? AND topic = ?",
+                                 (now, loan_id, topic))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO publish_topic_state VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (loan_id, topic, state.get("risk_level"), state.get("action"), state.get("policy_hash"),
+                     state.get("digest"), state.get("eval_id"), now, now))
+
+    def forget(self, loan_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM publish_topic_state WHERE loan_id = ?", (loan_id,))
+
+
+_index: Optional[PublishStateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_publish_state() -> PublishStateIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PublishStateIndex()
+    return _index
+
+
+def heartbeat_message(loan_id: str, state: Mapping[str, Any], last: Optional[Mapping[str, Any]]) -> str:
+    """The compact output-topic message for an unchanged decision."""
+    return json.dumps({
+        "type": "heartbeat",
+        "loan_id": loan_id,
+        "risk_level": state.get("risk_level"),
+        "action": state.get("action"),
+        "policy_hash": state.get("policy_hash"),
+        "digest": state.get("digest"),
+        "since_eval_id": (last or {}).get("eval_id"),
+    }, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the last-published state of a loan")
+    parser.add_argument("command", choices=("show", "forget"))
+    parser.add_argument("loan_id")
+    args = parser.parse_args()
+
+    index = get_publish_state()
+    if args.command == "forget":
+        index.forget(args.loan_id)
+        print(f"[INFO] Forgot publish state of {args.loan_id}; its next evaluation is published", file=sys.stderr)
+    else:
+        print(json.dumps({topic: index.get(args.loan_id, topic) for topic in (INPUT_TOPIC, OUTPUT_TOPIC)}, indent=2))
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+rules.py
+
+Declarative rule table behind the evaluation's explanations (RuleHit codes).
+
+Every rule is one row of RULE_TABLE: code, severity, a predicate over the
+loan's values and a lazily rendered message/details. compile_rules() binds
+the table to a policy once (risk-band edges, MAX_SAFE_LTV, MARGIN_CALL_LTV,
+VOL_THRESHOLD, TENURE_LIMIT_DAYS) and returns a RuleSet, which
+
+  - evaluates one loan or whole column arrays with the same predicates and
+    returns the hits as integer bitmasks (bit i = RuleSet.codes[i]);
+  - renders code/severity/message/details only for the masks you ask for.
+
+So a backtest or stress test over the whole book costs a handful of numpy
+comparisons, and only a single evaluation pays for strings and RuleHits.
+
+Values the predicates read (scalars or arrays of equal length):
+    ltv, tenure_days               required
+    gold_volatility                NaN/None = unknown (no VOL_* rule fires)
+    price_abnormal                 1/0, NaN/None = no anomaly info (no PRICE_*)
+    max_safe_ltv, margin_call_ltv, vol_threshold, tenure_limit_days
+                                   optional per-record overrides of the policy
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+import policy
+
+RISK_BANDS = ("VERY_LOW", "LOW", "MEDIUM", "HIGH", "VERY_HIGH")
+RISK_SEVERITY = ("info", "info", "warn", "warn", "critical")
+
+_PRICE_DETAILS = (("current_price", "current_price"), ("yesterday_price", "yesterday_price"),
+                  ("deviation_percent", "deviation_percent"), ("threshold_percent", "threshold_percent"),
+                  ("z_score", "z_score"), ("roc_percent", "roc_percent"))
+
+
+@dataclass(frozen=True)
+class Rule:
+    code: str
+    severity: str
+    when: Callable[[Dict[str, Any]], Any]          # vectorized predicate over the value namespace
+    message: Callable[[Dict[str, Any]], str]       # rendered only on request
+    details: Tuple[Tuple[str, str], ...] = ()      # (detail key, value key)
+
+
+def risk_band_index(ltv: np.ndarray, edges: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """
+    Index into RISK_BANDS for each LTV (policy RISK_LEVEL edges by default).
+    VERY_LOW below the first edge (inclusive lower bound for LOW), then
+    LOW/MEDIUM/HIGH up to and including their upper edges.
+    """
+    e = edges or policy.current().values["RISK_LEVEL"]
+    return ((ltv >= e["VERY_LOW"]).astype(np.int8) + (ltv > e["LOW"]) + (ltv > e["MEDIUM"]) + (ltv > e["HIGH"]))
+
+
+def _band_ranges(edges: Mapping[str, float]) -> Dict[str, str]:
+    """Human-readable band bounds for messages, e.g. LOW -> "between 61-69%"."""
+    pct = {k: int(round(v * 100)) for k, v in edges.items()}
+    return {
+        "VERY_LOW": f"< {pct['VERY_LOW']}%",
+        "LOW": f"between {pct['VERY_LOW'] + 1}-{pct['LOW']}%",
+        "MEDIUM": f"between {pct['LOW'] + 1}-{pct['MEDIUM']}%",
+        "HIGH": f"between {pct['MEDIUM'] + 1}-{pct['HIGH']}%",
+        "VERY_HIGH": f"> {pct['HIGH']}%",
+    }
+
+
+def _risk_rules(edges: Mapping[str, float]) -> List[Rule]:
+    ranges = _band_ranges(edges)
+    return [
+        Rule(
+            code=f"RISK_LEVEL_{name}",
+            severity=RISK_SEVERITY[i],
+            when=lambda v, i=i: v["band"] == i,
+            message=lambda v, name=name: f"Risk level {name} (LTV {v['ltv']:.2%} {ranges[name]})",
+            details=(("ltv", "ltv"), ("risk_level", "risk_level")),
+        )
+        for i, name in enumerate(RISK_BANDS)
+    ]
+
+
+# ------------------------------------------------------------------------------
+# The table
+# ------------------------------------------------------------------------------
+# Rows after the risk bands; output order is table order.
+RULE_TABLE: Tuple[Rule, ...] = (
+    # LTV thresholds
+    Rule("LTV_CRITICAL", "critical",
+         lambda v: v["ltv"] >= v["margin_call_ltv"],
+         lambda v: f"LTV {v['ltv']:.2f} ≥ margin-call threshold {v['margin_call_ltv']:.2f}.",
+         (("ltv", "ltv"), ("margin_call_ltv", "margin_call_ltv"))),
+    Rule("LTV_ELEVATED", "warn",
+         lambda v: (v["ltv"] < v["margin_call_ltv"]) & (v["ltv"] > v["max_safe_ltv"]),
+         lambda v: f"LTV {v['ltv']:.2f} above safe limit {v['max_safe_ltv']:.2f}.",
+         (("ltv", "ltv"), ("max_safe_ltv", "max_safe_ltv"))),
+    Rule("LTV_OK", "info",
+         lambda v: (v["ltv"] < v["margin_call_ltv"]) & (v["ltv"] <= v["max_safe_ltv"]),
+         lambda v: f"LTV {v['ltv']:.2f} within safe limit {v['max_safe_ltv']:.2f}.",
+         (("ltv", "ltv"), ("max_safe_ltv", "max_safe_ltv"))),
+    # Collateral haircut context
+    Rule("HAIRCUT_APPLIED", "info",
+         lambda v: True,
+         lambda v: f"Applied haircut {v['haircut_bps']} bps.",
+         (("haircut_bps", "haircut_bps"),)),
+    # Volatility vs policy threshold (unknown volatility compares False both ways)
+    Rule("VOL_ELEVATED", "warn",
+         lambda v: v["gold_volatility"] >= v["vol_threshold"],
+         lambda v: f"30d volatility {v['gold_volatility']:.2%} ≥ policy threshold {v['vol_threshold']:.2%}.",
+         (("volatility_30d", "gold_volatility"), ("policy_vol_threshold", "vol_threshold"))),
+    Rule("VOL_NORMAL", "info",
+         lambda v: v["gold_volatility"] < v["vol_threshold"],
+         lambda v: f"30d volatility {v['gold_volatility']:.2%} below policy threshold {v['vol_threshold']:.2%}.",
+         (("volatility_30d", "gold_volatility"), ("policy_vol_threshold", "vol_threshold"))),
+    # Tenure
+    Rule("TENURE_LONG", "warn",
+         lambda v: v["tenure_days"] >= v["tenure_limit_days"],
+         lambda v: f"Tenure {v['tenure_days']}d ≥ policy limit {v['tenure_limit_days']}d.",
+         (("tenure_days", "tenure_days"), ("policy_tenure_limit_days", "tenure_limit_days"))),
+    Rule("TENURE_NORMAL", "info",
+         lambda v: v["tenure_days"] < v["tenure_limit_days"],
+         lambda v: f"Tenure {v['tenure_days']}d within policy limit {v['tenure_limit_days']}d.",
+         (("tenure_days", "tenure_days"), ("policy_tenure_limit_days", "tenure_limit_days"))),
+    # Abnormal price detection
+    Rule("PRICE_ABNORMAL", "critical",
+         lambda v: v["price_abnormal"] == 1,
+         lambda v: f"Gold price shows abnormal deviation: {v['reason']}",
+         _PRICE_DETAILS),
+    Rule("PRICE_NORMAL", "info",
+         lambda v: v["price_abnormal"] == 0,
+         lambda v: f"Gold price within normal range: {v['reason']}",
+         _PRICE_DETAILS),
+)
+
+
+# ------------------------------------------------------------------------------
+# Compiled rule set
+# ------------------------------------------------------------------------------
+class RuleSet:
+    """RULE_TABLE bound to one policy. Build with compile_rules()."""
+
+    def __init__(self, values: Mapping[str, Any]):
+        self.edges = dict(values["RISK_LEVEL"])
+        self.thresholds = {
+            "max_safe_ltv": float(values["MAX_SAFE_LTV"]),
+            "margin_call_ltv": float(values["MARGIN_CALL_LTV"]),
+            "vol_threshold": float(values["VOL_THRESHOLD"]),
+            "tenure_limit_days": int(values["TENURE_LIMIT_DAYS"]),
+        }
+        self.rules: Tuple[Rule, ...] = tuple(_risk_rules(self.edges)) + RULE_TABLE
+        self.codes: Tuple[str, ...] = tuple(r.code for r in self.rules)
+        self.bits: Dict[str, int] = {code: 1 << i for i, code in enumerate(self.codes)}
+
+    def risk_level(self, ltv: float) -> str:
+        return RISK_BANDS[int(risk_band_index(np.asarray(ltv, dtype=np.float64), self.edges))]
+
+    def _namespace(self, values: Mapping[str, Any]) -> Dict[str, Any]:
+        v = dict(self.thresholds)
+        v.update({k: x for k, x in values.items() if x is not None})
+        v["ltv"] = np.asarray(v["ltv"], dtype=np.float64)
+        v["gold_volatility"] = np.asarray(v.get("gold_volatility", np.nan), dtype=np.float64)
+        v["price_abnormal"] = np.asarray(v.get("price_abnormal", np.nan), dtype=np.float64)
+        v["band"] = risk_band_index(v["ltv"], self.edges)
+        return v
+
+    def evaluate(self, values: Mapping[str, Any]) -> np.ndarray:
+        """Bitmask of the rules that fire, one uint32 per record (0-d for scalar input)."""
+        v = self._namespace(values)
+        mask = np.zeros(np.shape(v["ltv"]), dtype=np.uint32)
+        for bit, rule in enumerate(self.rules):
+            mask |= np.where(rule.when(v), np.uint32(1 << bit), np.uint32(0))
+        return mask
+
+    def evaluate_one(self, **values: Any) -> int:
+        return int(self.evaluate(values))
+
+    def decode(self, mask: int) -> List[str]:
+        return [code for i, code in enumerate(self.codes) if mask >> i & 1]
+
+    def hits_by_code(self, masks: np.ndarray) -> Dict[str, np.ndarray]:
+        """One boolean array per rule code from an array of masks."""
+        return {code: (masks & np.uint32(bit)) != 0 for code, bit in self.bits.items()}
+
+    def counts(self, masks: np.ndarray) -> Dict[str, int]:
+        return {code: int(np.count_nonzero(hit)) for code, hit in self.hits_by_code(masks).items()}
+
+    def render(self, mask: int, values: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        """code/severity/message/details for each rule in `mask`, from one loan's scalar values."""
+        v = dict(self.thresholds)
+        v.update(values)
+        v.setdefault("risk_level", self.risk_level(v["ltv"]))
+        out = []
+        for i, rule in enumerate(self.rules):
+            if mask >> i & 1:
+                out.append({
+                    "code": rule.code,
+                    "severity": rule.severity,
+                    "message": rule.message(v),
+                    "details": {k: v.get(src) for k, src in rule.details},
+                })
+        return out
+
+
+def compile_rules(values: Optional[Mapping[str, Any]] = None) -> RuleSet:
+    """Bind RULE_TABLE to policy `values` (current policy by default, missing keys filled from it)."""
+    merged = dict(policy.current().values)
+    if values:
+        merged.update(values)
+    return RuleSet(merged)
+
+
+_default: Optional[Tuple[int, RuleSet]] = None
+
+
+def get_rules() -> RuleSet:
+    """RuleSet compiled from the current policy (recompiled when its revision changes)."""
+    global _default
+    rev = policy.revision()
+    if _default is None or _default[0] != rev:
+        _default = (rev, compile_rules())
+    return _default[1]
+
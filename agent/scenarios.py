@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+scenarios.py
+
+Vectorized stress testing of the open loan book.
+
+A ScenarioGrid is the cartesian product of gold-price shocks, FX shocks,
+haircut settings and policy variations (MAX_SAFE_LTV / MARGIN_CALL_LTV).
+run_scenarios() evaluates every loan under every scenario with numpy
+broadcasting over a (scenarios × loans) matrix, using the same valuation as
+gold_evaluator.compute_metrics():
+
+    collateral = weight_g × purity/999 × price_myr_per_g × (1 − haircut_bps/10 000)
+    ltv        = principal / collateral
+
+and aggregates per scenario: risk-band distribution, loans above
+max_safe_ltv, margin calls, shortfall to bring every loan back to
+max_safe_ltv and negative equity (principal above collateral). Scenarios are
+processed in chunks to bound memory; large grids are split across CPU cores.
+
+CLI:
+    python scenarios.py loans.json --gold=-30:10:1 --fx=-10:10:5 \
+        [--haircut 500,800] [--margin-call-ltv 0.85,0.80] [--price 89.53] [--csv out.csv]
+"""
+
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import policy
+from rules import RISK_BANDS, risk_band_index
+
+# Cells (scenarios × loans) evaluated per chunk, and the grid size above which
+# chunks are farmed out to a process pool.
+CHUNK_CELLS = 2_000_000
+PARALLEL_MIN_CELLS = 20_000_000
+
+
+# ------------------------------------------------------------------------------
+# Inputs
+# ------------------------------------------------------------------------------
+def loans_to_arrays(loans: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Column arrays from LoanInput-shaped dicts (principal_myr, gold_weight_g,
+    purity, tenure_days, optional collateral_type — "bar" uses the bar
+    haircut, anything else the jewellery haircut).
+    """
+    rows = list(loans)
+    return {
+        "principal_myr": np.array([float(r["principal_myr"]) for r in rows], dtype=np.float64),
+        "gold_weight_g": np.array([float(r["gold_weight_g"]) for r in rows], dtype=np.float64),
+        "purity": np.array([float(r["purity"]) for r in rows], dtype=np.float64),
+        "tenure_days": np.array([int(r.get("tenure_days", 0)) for r in rows], dtype=np.int64),
+        "is_bar": np.array([str(r.get("collateral_type", "jewellery")).lower() == "bar" for r in rows], dtype=bool),
+    }
+
+
+@dataclass
+class ScenarioGrid:
+    gold_shocks: Sequence[float] = (0.0,)          # fractional, e.g. -0.30 for −30%
+    fx_shocks: Sequence[float] = (0.0,)            # fractional USD/MYR moves
+    jewellery_haircut_bps: Sequence[int] = (policy.POLICY["JEWELLERY_HAIRCUT_BPS"],)
+    bar_haircut_bps: Sequence[int] = (policy.POLICY["BAR_HAIRCUT_BPS"],)
+    max_safe_ltv: Sequence[float] = (policy.POLICY["MAX_SAFE_LTV"],)
+    margin_call_ltv: Sequence[float] = (policy.POLICY["MARGIN_CALL_LTV"],)
+
+    @staticmethod
+    def shock_range(start_pct: float, stop_pct: float, step_pct: float) -> List[float]:
+        """Inclusive percentage range as fractions: shock_range(-30, 10, 1) → −0.30 … +0.10."""
+        n = int(round((stop_pct - start_pct) / step_pct)) + 1
+        return [round((start_pct + i * step_pct) / 100.0, 10) for i in range(n)]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """One array per parameter, one entry per scenario (cartesian product)."""
+        product = list(itertools.product(
+            self.gold_shocks, self.fx_shocks, self.jewellery_haircut_bps,
+            self.bar_haircut_bps, self.max_safe_ltv, self.margin_call_ltv,
+        ))
+        cols = np.array(product, dtype=np.float64).reshape(-1, 6)
+        names = ("gold_shock", "fx_shock", "jewellery_haircut_bps", "bar_haircut_bps",
+                 "max_safe_ltv", "margin_call_ltv")
+        return {name: cols[:, i] for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return (len(self.gold_shocks) * len(self.fx_shocks) * len(self.jewellery_haircut_bps)
+                * len(self.bar_haircut_bps) * len(self.max_safe_ltv) * len(self.margin_call_ltv))
+
+
+@dataclass
+class ScenarioResult:
+    base_price_myr_per_g: float
+    loan_count: int
+    scenarios: Dict[str, np.ndarray]               # grid parameters per scenario
+    metrics: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        keys = list(self.scenarios) + list(self.metrics)
+        cols = [*self.scenarios.values(), *self.metrics.values()]
+        return [dict(zip(keys, (c[i].item() for c in cols))) for i in range(len(cols[0]))]
+
+    def worst(self, metric: str = "shortfall_to_safe_myr") -> Dict[str, Any]:
+        """Scenario with the highest `metric` (ties broken by book LTV)."""
+        idx = int(np.lexsort((self.metrics["book_ltv"], self.metrics[metric]))[-1])
+        return self.to_rows()[idx]
+
+
+# ------------------------------------------------------------------------------
+# Kernel
+# ------------------------------------------------------------------------------
+def _evaluate_chunk(loans: Dict[str, np.ndarray], base_price: float,
+                    sc: Dict[str, np.ndarray], edges: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """All metrics for a block of scenarios; intermediate arrays are (S, N)."""
+    n_sc = len(sc["gold_shock"])
+    price = base_price * (1.0 + sc["gold_shock"]) * (1.0 + sc["fx_shock"])           # (S,)
+    haircut = np.where(loans["is_bar"][None, :], sc["bar_haircut_bps"][:, None],
+                       sc["jewellery_haircut_bps"][:, None])                          # (S, N)
+    fine_g = loans["gold_weight_g"] * loans["purity"] / 999.0                         # (N,)
+    collateral = fine_g[None, :] * price[:, None] * np.maximum(0.0, 1.0 - haircut / 10_000.0)
+    principal = loans["principal_myr"][None, :]
+    ltv = principal / np.maximum(collateral, 1e-9)
+
+    bands = risk_band_index(ltv, edges)
+    offsets = (np.arange(n_sc, dtype=np.int64) * len(RISK_BANDS))[:, None]
+    band_counts = np.bincount((bands + offsets).ravel(), minlength=n_sc * len(RISK_BANDS))
+    band_counts = band_counts.reshape(n_sc, len(RISK_BANDS))
+
+    max_safe = sc["max_safe_ltv"][:, None]
+    out = {
+        "gold_price_myr_per_g": price,
+        "total_collateral_myr": collateral.sum(axis=1),
+        "book_ltv": loans["principal_myr"].sum() / np.maximum(collateral.sum(axis=1), 1e-9),
+        "max_ltv": ltv.max(axis=1) if ltv.shape[1] else np.zeros(n_sc),
+        "above_max_safe": (ltv > max_safe).sum(axis=1),
+        "margin_calls": (ltv >= sc["margin_call_ltv"][:, None]).sum(axis=1),
+        "shortfall_to_safe_myr": np.maximum(0.0, principal - max_safe * collateral).sum(axis=1),
+        "negative_equity_myr": np.maximum(0.0, principal - collateral).sum(axis=1),
+    }
+    for i, band in enumerate(RISK_BANDS):
+        out[f"band_{band.lower()}"] = band_counts[:, i]
+    return out
+
+
+_worker_loans: Dict[str, np.ndarray] = {}
+
+
+def _init_worker(loans: Dict[str, np.ndarray]) -> None:
+    # Loan columns are shipped once per worker instead of with every chunk
+    global _worker_loans
+    _worker_loans = loans
+
+
+def _worker_chunk(args):
+    base_price, sc, edges = args
+    return _evaluate_chunk(_worker_loans, base_price, sc, edges)
+
+
+def run_scenarios(loans: Dict[str, np.ndarray], grid: ScenarioGrid, base_price_myr_per_g: float,
+                  workers: Optional[int] = None) -> ScenarioResult:
+    """
+    Evaluate `loans` (see loans_to_arrays) under every scenario in `grid`.
+
+    Args:
+        base_price_myr_per_g: unshocked gold price (MYR per gram)
+        workers: process count for large grids (default: CPU count; 1 disables the pool)
+    """
+    sc = grid.columns()
+    n_loans = len(loans["principal_myr"])
+    n_sc = len(sc["gold_shock"])
+    edges = dict(policy.current().values["RISK_LEVEL"])
+    step = max(1, CHUNK_CELLS // max(n_loans, 1))
+    chunks = [{k: v[i:i + step] for k, v in sc.items()} for i in range(0, n_sc, step)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(chunks) > 1 and n_sc * n_loans >= PARALLEL_MIN_CELLS:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 initializer=_init_worker, initargs=(loans,)) as pool:
+            parts = list(pool.map(_worker_chunk, [(base_price_myr_per_g, c, edges) for c in chunks]))
+    else:
+        parts = [_evaluate_chunk(loans, base_price_myr_per_g, c, edges) for c in chunks]
+
+    metrics = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]} if parts else {}
+    return ScenarioResult(base_price_myr_per_g, n_loans, sc, metrics)
+
+
+# ------------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------------
+def _parse_range(value: str) -> List[float]:
+    """'-30:10:1' → percentage range as fractions; '-5,0,5' → list of fractions."""
+    if ":" in value:
+        start, stop, step = (float(x) for x in value.split(":"))
+        return ScenarioGrid.shock_range(start, stop, step)
+    return [float(x) / 100.0 for x in value.split(",")]
+
+
+def _parse_list(value: Optional[str], cast, default):
+    return [cast(x) for x in value.split(",")] if value else list(default)
+
+
+if __name__ == "__main__":
+    import argparse
+    import csv
+    import time
+
+    parser = argparse.ArgumentParser(description="Stress-test a loan book over gold/FX/haircut/policy scenarios")
+    parser.add_argument("loans", help="JSON file with a list of loans (LoanInput fields, optional collateral_type), "
+                                      "or a loan book (loan_book.py)")
+    parser.add_argument("--gold", default="-30:10:1", help="gold shocks in %%: start:stop:step or a,b,c")
+    parser.add_argument("--fx", default="0", help="USD/MYR shocks in %%: start:stop:step or a,b,c")
+    parser.add_argument("--haircut", help="jewellery haircut bps list")
+    parser.add_argument("--bar-haircut", help="bar haircut bps list")
+    parser.add_argument("--max-safe-ltv", help="MAX_SAFE_LTV list")
+    parser.add_argument("--margin-call-ltv", help="MARGIN_CALL_LTV list")
+    parser.add_argument("--price", type=float, help="base gold price MYR/g (default: last cached price)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--csv", help="write one row per scenario to this CSV")
+    args = parser.parse_args()
+
+    price = args.price
+    if price is None:
+        from sources import get_cached_market_data
+        cached = get_cached_market_data("gold_price_myr")
+        if cached is None:
+            parser.error("--price is required when no gold price has been cached yet")
+        price = float(cached["value"])
+
+    from loan_book import load_loan_arrays
+    loan_cols = load_loan_arrays(args.loans)
+    grid = ScenarioGrid(
+        gold_shocks=_parse_range(args.gold),
+        fx_shocks=_parse_range(args.fx),
+        jewellery_haircut_bps=_parse_list(args.haircut, int, ScenarioGrid.jewellery_haircut_bps),
+        bar_haircut_bps=_parse_list(args.bar_haircut, int, ScenarioGrid.bar_haircut_bps),
+        max_safe_ltv=_parse_list(args.max_safe_ltv, float, ScenarioGrid.max_safe_ltv),
+        margin_call_ltv=_parse_list(args.margin_call_ltv, float, ScenarioGrid.margin_call_ltv),
+    )
+
+    started = time.perf_counter()
+    result = run_scenarios(loan_cols, grid, price, workers=args.workers)
+    print(f"[INFO] {len(grid)} scenarios × {result.loan_count} loans in "
+          f"{time.perf_counter() - started:.3f}s", file=sys.stderr)
+
+    rows = result.to_rows()
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"[INFO] Wrote {len(rows)} scenarios to {args.csv}", file=sys.stderr)
+    print(json.dumps({"base_price_myr_per_g": price, "loans": result.loan_count,
+                      "scenarios": len(rows), "worst": result.worst()}, indent=2))
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+shop_registry.py
+
+In-memory pawnshop rating registry for the Gold Collateral Evaluation Agent.
+
+All shop ratings (A-E) are bulk-loaded once into a read-only index, so
+RiskMetrics.shop_rating costs a dict lookup per evaluation instead of a
+registry round trip per loan. Ratings come from, in order:
+
+  - SHOP_REGISTRY_URL: a backend endpoint returning
+        {"version": "...", "shops": {"SHOP-001": "A", ...}}
+    ("shops" may also be a list of {"shop_id", "rating"} objects). Refreshes
+    send If-None-Match with the last ETag, and ?since=<version> when the
+    server reported a version; a 304 keeps the index, and a response with
+    "delta": true is merged (shop ids listed under "removed" are dropped);
+  - SHOP_REGISTRY_FILE: the same JSON, or a bare {shop_id: rating} object,
+    re-read only when its mtime/size changes.
+
+Every successful backend load is written to SHOP_REGISTRY_FILE (and a 304
+re-stamps it), which then serves as the last-known-good copy when the
+backend is down.
+
+Lookups never do I/O. The registry is loaded on first use: a persisted copy
+younger than SHOP_REGISTRY_TTL_SECONDS is used as-is, so one-shot runs do
+not bulk-load from SHOP_REGISTRY_URL each time; only an older or missing
+copy triggers a backend load. Long-running hosts (the batch_evaluator.py
+coordinator) call start_refresher() to refresh it every
+SHOP_REGISTRY_REFRESH_SECONDS in the background, which keeps the persisted
+copy fresh for one-shot runs too. batch_evaluator.py hands the parent's
+index to its workers (to_state() / install()).
+
+CLI:
+    python shop_registry.py [SHOP_ID ...]     # load and print ratings
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+import telemetry
+from circuit_breaker import guarded_request
+
+load_dotenv(".env")
+
+SHOP_REGISTRY_URL = os.getenv("SHOP_REGISTRY_URL", "")
+SHOP_REGISTRY_FILE = os.getenv("SHOP_REGISTRY_FILE", "data/shop_ratings.json")
+SHOP_REGISTRY_REFRESH_SECONDS = float(os.getenv("SHOP_REGISTRY_REFRESH_SECONDS", "300"))
+SHOP_REGISTRY_TIMEOUT_SECONDS = float(os.getenv("SHOP_REGISTRY_TIMEOUT_SECONDS", "10"))
+# A persisted SHOP_REGISTRY_FILE younger than this is loaded without asking SHOP_REGISTRY_URL
+SHOP_REGISTRY_TTL_SECONDS = float(os.getenv("SHOP_REGISTRY_TTL_SECONDS", "3600"))
+# Rating for shops missing from the registry (unset = no rating)
+SHOP_RATING_DEFAULT = os.getenv("SHOP_RATING_DEFAULT") or None
+
+RATINGS = ("A", "B", "C", "D", "E")
+
+
+def parse_ratings(doc: Any) -> Tuple[Optional[str], Dict[str, str], Tuple[str, ...], bool]:
+    """
+    (version, {shop_id: rating}, removed shop_ids, is_delta) from a registry
+    document. Entries with a rating outside A-E are skipped with a warning.
+    """
+    if not isinstance(doc, Mapping):
+        raise ValueError("shop registry document must be a JSON object")
+    shops = doc["shops"] if "shops" in doc else doc
+    if isinstance(shops, Mapping):
+        pairs: Iterable[Tuple[Any, Any]] = shops.items()
+    elif isinstance(shops, list):
+        pairs = ((s.get("shop_id"), s.get("rating")) for s in shops if isinstance(s, Mapping))
+    else:
+        raise ValueError("'shops' must be an object or a list")
+    ratings: Dict[str, str] = {}
+    bad = 0
+    for shop_id, rating in pairs:
+        rating = str(rating or "").strip().upper()
+        if shop_id is None or rating not in RATINGS:
+            bad += 1
+            continue
+        ratings[str(shop_id)] = rating
+    if bad:
+        print(f"[WARN] Shop registry: skipped {bad} entries without a valid shop_id / A-E rating", file=sys.stderr)
+    removed = tuple(str(s) for s in doc.get("removed") or ()) if "shops" in doc else ()
+    version = doc.get("version") if "shops" in doc else None
+    return (None if version is None else str(version)), ratings, removed, bool(doc.get("delta")) and "shops" in doc
+
+
+class ShopRegistry:
+    """Read-only shop_id -> rating index, swapped atomically on refresh."""
+
+    def __init__(self, url: str = SHOP_REGISTRY_URL, path: str = SHOP_REGISTRY_FILE,
+                 timeout: float = SHOP_REGISTRY_TIMEOUT_SECONDS, default: Optional[str] = SHOP_RATING_DEFAULT,
+                 ttl_s: float = SHOP_REGISTRY_TTL_SECONDS):
+        self.url = url
+        self.path = path
+        self.timeout = timeout
+        self.ttl_s = ttl_s
+        self.default = default
+        self._index: Mapping[str, str] = MappingProxyType({})
+        self.version: Optional[str] = None
+        self.etag: Optional[str] = None
+        self.source = "empty"
+        self.loaded_unix: Optional[float] = None
+        self._file_stamp: Optional[Tuple[float, int]] = None
+        self._lock = threading.Lock()          # serializes refreshes, not lookups
+        self._session = requests.Session()
+
+    # -- lookups (no I/O) ------------------------------------------------------
+    def rating(self, shop_id: Optional[str]) -> Optional[str]:
+        if not shop_id:
+            return None
+        return self._index.get(shop_id, self.default)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, shop_id: str) -> bool:
+        return shop_id in self._index
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_unix is not None
+
+    # -- refresh ---------------------------------------------------------------
+    def _swap(self, ratings: Mapping[str, str], version: Optional[str], source: str) -> None:
+        self._index = MappingProxyType(dict(ratings))
+        self.version = version
+        self.source = source
+        self.loaded_unix = time.time()
+        telemetry.set_gauge("shop_registry.shops", len(ratings))
+
+    def _refresh_from_url(self) -> bool:
+        """True if the index changed. Raises on transport/HTTP/payload errors."""
+        headers = {"Accept": "application/json"}
+        api_key = os.getenv("SILSILAT_API_KEY")
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        params = {}
+        if self.loaded and self.source == "api":
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.version:
+                params["since"] = self.version
+        resp = guarded_request("shop_registry", "GET", self.url, session=self._session,
+                               headers=headers, params=params, timeout=self.timeout)
+        if resp.status_code == 304:
+            telemetry.inc("shop_registry.not_modified")
+            self.loaded_unix = time.time()
+            self._touch()
+            return False
+        resp.raise_for_status()
+        doc = resp.json()
+        version, ratings, removed, delta = parse_ratings(doc)
+        if delta and self.source == "api":
+            merged = dict(self._index)
+            merged.update(ratings)
+            for shop_id in removed:
+                merged.pop(shop_id, None)
+            ratings = merged
+        self.etag = resp.headers.get("ETag")
+        self._swap(ratings, version, "api")
+        telemetry.inc("shop_registry.delta_loads" if delta else "shop_registry.full_loads")
+        self._save(doc if not delta else {"version": version, "shops": ratings})
+        return True
+
+    def _refresh_from_file(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        stamp = (st.st_mtime, st.st_size)
+        if stamp == self._file_stamp and self.loaded:
+            return False
+        self._file_stamp = stamp
+        with open(self.path, "r", encoding="utf-8") as f:
+            version, ratings, _, _ = parse_ratings(json.load(f))
+        self._swap(ratings, version, "file")
+        return True
+
+    def _save(self, doc: Mapping[str, Any]) -> None:
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(doc, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+            st = os.stat(self.path)
+            self._file_stamp = (st.st_mtime, st.st_size)
+        except OSError as e:
+            print(f"[WARN] Could not write {self.path}: {e}", file=sys.stderr)
+
+    def _touch(self) -> None:
+        """Re-stamp the persisted copy after the backend confirmed it (restarts its TTL)."""
+        try:
+            os.utime(self.path)
+            st = os.stat(self.path)
+            self._file_stamp = (st.st_mtime, st.st_size)
+        except OSError:
+            pass
+
+    def file_age(self) -> Optional[float]:
+        """Seconds since the persisted copy was written or confirmed, or None if there is none."""
+        try:
+            return max(0.0, time.time() - os.stat(self.path).st_mtime)
+        except OSError:
+            return None
+
+    def refresh(self) -> bool:
+        """
+        Reload from SHOP_REGISTRY_URL, falling back to SHOP_REGISTRY_FILE.
+        Returns True if the index changed; on failure the current index is kept.
+        """
+        with self._lock:
+            if self.url:
+                try:
+                    return self._refresh_from_url()
+                except Exception as e:
+                    telemetry.inc("shop_registry.refresh_errors")
+                    print(f"[WARN] Shop registry refresh from {self.url} failed: {e}", file=sys.stderr)
+                    if self.source == "api":
+                        return False        # keep the fresher API copy over the file
+            try:
+                return self._refresh_from_file()
+            except (OSError, ValueError) as e:
+                telemetry.inc("shop_registry.refresh_errors")
+                print(f"[WARN] Could not load shop registry file {self.path}: {e}", file=sys.stderr)
+                return False
+
+    def ensure_loaded(self) -> "ShopRegistry":
+        """Load once: from a persisted copy within its TTL, else as refresh() does."""
+        if not self.loaded:
+            age = self.file_age() if self.url else None
+            if age is not None and age <= self.ttl_s:
+                with self._lock:
+                    try:
+                        self._refresh_from_file()
+                    except (OSError, ValueError) as e:
+                        print(f"[WARN] Could not load shop registry file {self.path}: {e}", file=sys.stderr)
+            if not self.loaded:
+                self.refresh()
+            if not self.loaded:
+                self.loaded_unix = time.time()  # nothing to load; don't retry per lookup
+        return self
+
+    # -- hand-off to worker processes ------------------------------------------
+    def to_state(self) -> Dict[str, Any]:
+        return {"ratings": dict(self._index), "version": self.version, "etag": self.etag,
+                "source": self.source, "default": self.default}
+
+    def install(self, state: Mapping[str, Any]) -> None:
+        """Adopt an index loaded elsewhere (to_state()), e.g. in a batch worker."""
+        with self._lock:
+            self.etag = state.get("etag")
+            self.default = state.get("default", self.default)
+            self._swap(state["ratings"], state.get("version"), state.get("source", "installed"))
+
+
+# ------------------------------------------------------------------------------
+# Process-wide registry and background refresh
+# ------------------------------------------------------------------------------
+_registry: Optional[ShopRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_shop_registry() -> ShopRegistry:
+    """The process's registry, bulk-loaded on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ShopRegistry().ensure_loaded()
+    return _registry
+
+
+def get_shop_rating(shop_id: Optional[str]) -> Optional[str]:
+    return get_shop_registry().rating(shop_id)
+
+
+def install(state: Mapping[str, Any]) -> ShopRegistry:
+    """Make an index loaded in another process (ShopRegistry.to_state()) this process's registry."""
+    global _registry
+    registry = ShopRegistry()
+    registry.install(state)
+    with _registry_lock:
+        _registry = registry
+    return registry
+
+
+class ShopRegistryRefresher:
+    """Daemon thread that refreshes the registry every `interval_s` seconds."""
+
+    def __init__(self, registry: ShopRegistry, interval_s: float = SHOP_REGISTRY_REFRESH_SECONDS):
+        self.registry = registry
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.registry.refresh()
+
+    def start(self) -> "ShopRegistryRefresher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="shop-registry-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_refresher: Optional[ShopRegistryRefresher] = None
+
+
+def start_refresher(interval_s: float = SHOP_REGISTRY_REFRESH_SECONDS) -> ShopRegistryRefresher:
+    """Start (once per process) background refreshes of get_shop_registry()."""
+    global _refresher
+    if _refresher is None:
+        _refresher = ShopRegistryRefresher(get_shop_registry(), interval_s)
+    return _refresher.start()
+
+
+if __name__ == "__main__":
+    registry = get_shop_registry()
+    print(f"[INFO] {len(registry)} shops loaded from {registry.source} (version {registry.version})",
+          file=sys.stderr)
+    for shop_id in sys.argv[1:]:
+        print(f"{shop_id}: {registry.rating(shop_id)}")
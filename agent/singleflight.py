@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+singleflight.py
+
+Coalescing of concurrent identical calls.
+
+SingleFlight.do(key, fn, ...) runs fn for the first caller of a key (the
+leader); callers arriving with the same key while it runs wait for that
+result instead of starting their own. Once the call finishes the key is
+forgotten, so later callers run fn again (result reuse across time is
+eval_cache.py's job).
+
+Coalescing is in-process only: calls in different processes (one-shot
+`gold_evaluator.py -` runs spawned by the backend, batch workers) never
+share a call. Across processes, repeats are caught after the fact by the
+shared evaluation cache (EVAL_CACHE_DB) and change-detection publishing
+(publish_state.py), not by waiting on each other.
+
+Cancellation safety:
+  - a waiter that gives up (timeout) only stops waiting and gets
+    WaitTimeout; the leader's call and the other waiters are unaffected;
+  - if the leader fails, every waiter gets the same exception; if it is
+    interrupted (KeyboardInterrupt, SystemExit), waiters get a RuntimeError
+    instead of hanging, and the key is released either way.
+
+Asyncio callers can share the same group through a thread executor:
+    await loop.run_in_executor(None, functools.partial(group.do, key, fn, ...))
+"""
+
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import telemetry
+
+
+class WaitTimeout(FuturesTimeoutError):
+    """A waiter's timeout elapsed while the identical call was still running."""
+
+
+class SingleFlight:
+    """A group of keyed in-flight calls."""
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any,
+           timeout: Optional[float] = None, **kwargs: Any) -> Tuple[Any, bool]:
+        """
+        fn(*args, **kwargs), or the result of an identical call already running.
+
+        Returns:
+            (result, shared) - shared is True when this caller waited on another's call
+
+        Raises:
+            WaitTimeout: a waiter's `timeout` elapsed (the leader is not affected)
+        """
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+        if not leader:
+            telemetry.inc("singleflight.calls", group=self.name, role="waiter")
+            try:
+                return fut.result(timeout), True
+            except FuturesTimeoutError:
+                if fut.done():
+                    # finished just now, or the shared call itself raised a TimeoutError
+                    return fut.result(0), True
+                telemetry.inc("singleflight.wait_timeouts", group=self.name)
+                raise WaitTimeout(f"{self.name}: identical call still running after {timeout}s") from None
+
+        telemetry.inc("singleflight.calls", group=self.name, role="leader")
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._release(key, fut)
+            fut.set_exception(e if isinstance(e, Exception)
+                              else RuntimeError(f"shared call was interrupted: {e!r}"))
+            raise
+        self._release(key, fut)
+        fut.set_result(result)
+        return result, False
+
+    def _release(self, key: Hashable, fut: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
@@ -5,23 +5,42 @@ sources.py
 External data and policy access layer for the Gold Collateral Evaluation Agent.
 
 Responsibilities:
-1. Retrieve loan details from the Silsilat API endpoint (API or stubbed call).
-2. Fetch live gold price (USD per troy ounce) from https://metalpriceapi.com.
-3. Fetch live FX rate (USD→MYR) from https://www.fastforex.io.
+1. Retrieve loan details from the Silsilat API endpoint (API or stubbed call),
+   one at a time or in bulk (bounded concurrent fetch, paginated listing).
+2. Fetch gold price (USD per troy ounce) as a median across providers
+   (https://metalpriceapi.com, the backend gold-price feed, a local file feed).
+3. Fetch FX rate (USD→MYR) the same way (https://www.fastforex.io, backend, file).
 4. Retrieve regulatory & operational policy thresholds from policy.py.
+5. Record fetched prices into the local price history (price_store.py).
+6. Maintain streaming gold volatility from recorded prices (volatility.py).
+7. Feed recorded prices to the streaming anomaly detector (anomaly.py).
 
 These are lightweight helpers called by gold_evaluator.py.
 """
 
 import os
+import re
+import sys
 import json
+import time
+import functools
+import statistics
+import tempfile
+import threading
 import requests
-from datetime import datetime
-from typing import Optional, Dict, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, List, Tuple
 from dotenv import load_dotenv
 
 # Import policy settings (max LTVs, haircut policy, etc.)
 import policy
+import shop_registry
+import telemetry
+from circuit_breaker import guarded_request
+from price_store import FX_USD_MYR, GOLD_MYR_G, GOLD_USD_OZ, get_price_store
+from volatility import get_volatility_engine
+from anomaly import get_anomaly_detector
 
 # Load env configuration
 load_dotenv(".env")
@@ -30,46 +49,94 @@ load_dotenv(".env")
 # ------------------------------------------------------------------------------
 # 1. Retrieve loan details from Silsilat API (stub / API placeholder)
 # ------------------------------------------------------------------------------
-def get_loan_details(loan_id: str) -> dict:
+LOAN_FETCH_TIMEOUT_SECONDS = float(os.getenv("LOAN_FETCH_TIMEOUT_SECONDS", "15"))
+LOAN_FETCH_CONCURRENCY = int(os.getenv("LOAN_FETCH_CONCURRENCY", "16"))
+
+
+class LoanFetchError(Exception):
+    """A loan could not be fetched or mapped; carries the loan id."""
+
+    def __init__(self, loan_id: str, message: str):
+        super().__init__(f"{loan_id}: {message}")
+        self.loan_id = loan_id
+        self.message = message
+
+
+def map_loan_details(loan_id: str, record: Dict[str, Any]) -> dict:
     """
-    Fetch loan details from the Silsilat API endpoint.
-    The endpoint should return a JSON with Silsilat data that will be mapped to loan details format:
-        loan_id, shop_id, principal_myr, gold_weight_g, purity, collateral_type, tenure_days, fees_myr
-    If API is unavailable, a local stub will be used.
+    Map one Silsilat (SAG) record to the loan details format (see get_loan_details).
 
-    Returns:
-        dict: parsed loan details ready for LoanInput model
+    sagProperties carries both the karat number (22) and the fineness (916);
+    the evaluator takes the fineness. The shop is the pawnshop account that
+    created the SAG (originalOwner), the same id the backend sends as shop_id.
     """
-    base_url = os.getenv("SILSILAT_API_BASE", "https://api.silsilat.finance")
+    Silsilat_properties = record.get("SilsilatProperties") or record.get("sagProperties") or {}
+    return {
+        "loan_id": loan_id,
+        "shop_id": record.get("shopId") or record.get("shop_id") or record.get("originalOwner") or None,
+        "principal_myr": Silsilat_properties.get("loan", 0),
+        "gold_weight_g": Silsilat_properties.get("weightG", 0),
+        "purity": Silsilat_properties.get("purity") or 916,  # fineness in parts per 1000 (916 = 22k)
+        "collateral_type": Silsilat_properties.get("assetType", "jewellery"),
+        "tenure_days": Silsilat_properties.get("tenorM", 3) * 30,  # Convert months to days
+        "fees_myr": 0.0,  # Default fees
+    }
+
+
+def _silsilat_api() -> tuple:
+    base_url = os.getenv("SILSILAT_API_BASE", "https://api.silsilat.finance").rstrip("/")
     api_key = os.getenv("SILSILAT_API_KEY")
+    return base_url, ({"Authorization": f"Bearer {api_key}"} if api_key else {})
 
-    url = f"{base_url}/Silsilat/{loan_id}"
-    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
 
+_http = threading.local()
+
+
+def _session() -> requests.Session:
+    """Per-thread keep-alive session for bulk fetches."""
+    session = getattr(_http, "session", None)
+    if session is None:
+        session = _http.session = requests.Session()
+    return session
+
+
+def fetch_loan_details(loan_id: str, timeout: float = LOAN_FETCH_TIMEOUT_SECONDS,
+                       session: Optional[requests.Session] = None) -> dict:
+    """
+    Fetch and map one loan from the Silsilat API.
+
+    Raises:
+        LoanFetchError: transport error, open breaker, non-2xx, unexpected payload
+            or a record that cannot be mapped (e.g. "tenorM": null)
+    """
+    base_url, headers = _silsilat_api()
+    url = f"{base_url}/Silsilat/{loan_id}"
     try:
-        resp = requests.get(url, headers=headers, timeout=15)
+        resp = guarded_request("silsilat_api", "GET", url, session=session, headers=headers, timeout=timeout)
         resp.raise_for_status()
         data = resp.json()
-        
-        # Map Silsilat data to loan details format
-        if data.get("success") and data.get("data"):
-            Silsilat_data = data["data"]
-            Silsilat_properties = Silsilat_data.get("SilsilatProperties", {})
-            
-            return {
-                "loan_id": loan_id,
-                "shop_id": "Silsilat-SHOP",  # Default shop ID for Silsilat-based loans
-                "principal_myr": Silsilat_properties.get("loan", 0),
-                "gold_weight_g": Silsilat_properties.get("weightG", 0),
-                "purity": Silsilat_properties.get("karat", 916),  # Convert karat to purity (916 = 22k)
-                "collateral_type": Silsilat_properties.get("assetType", "jewellery"),
-                "tenure_days": Silsilat_properties.get("tenorM", 3) * 30,  # Convert months to days
-                "fees_myr": 0.0,  # Default fees
-            }
-        else:
+        if not (data.get("success") and data.get("data")):
             raise ValueError("Invalid Silsilat API response format")
-            
+        # Map Silsilat data to loan details format
+        return map_loan_details(loan_id, data["data"])
     except Exception as e:
+        raise LoanFetchError(loan_id, str(e)) from e
+
+
+def get_loan_details(loan_id: str) -> dict:
+    """
+    Fetch loan details from the Silsilat API endpoint.
+    The endpoint should return a JSON with Silsilat data that will be mapped to loan details format:
+        loan_id, shop_id, principal_myr, gold_weight_g, purity, collateral_type, tenure_days, fees_myr
+    If API is unavailable, a local stub will be used (bulk callers use
+    fetch_loan_details / iter_loan_details, which report failures instead).
+
+    Returns:
+        dict: parsed loan details ready for LoanInput model
+    """
+    try:
+        return fetch_loan_details(loan_id)
+    except LoanFetchError as e:
         # Fallback stub (for local testing)
         print(f"[WARN] Silsilat API not reachable ({e}); using stub data.")
         return {
@@ -78,143 +145,504 @@ def get_loan_details(loan_id: str) -> dict:
             "principal_myr": 4000,
             "gold_weight_g": 25.0,
             "purity": 916,
-            "collateral_type": "jewellery",-
+            "collateral_type": "jewellery",
             "tenure_days": 90,
             "fees_myr": 0.0,
         }
 
 
+def iter_loan_details(loan_ids: Iterable[str], concurrency: int = LOAN_FETCH_CONCURRENCY,
+                      timeout: float = LOAN_FETCH_TIMEOUT_SECONDS
+                      ) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    Fetch many loans concurrently and yield (loan_id, details, None) or
+    (loan_id, None, error) as each completes. At most 2×`concurrency`
+    requests are queued, so `loan_ids` may be a long or lazy sequence.
+    """
+    def fetch(loan_id: str) -> dict:
+        return fetch_loan_details(loan_id, timeout=timeout, session=_session())
+
+    ids = iter(loan_ids)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="loan-fetch") as pool:
+        pending: Dict[Any, str] = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < 2 * max(1, concurrency):
+                loan_id = next(ids, None)
+                if loan_id is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(fetch, str(loan_id))] = str(loan_id)
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                loan_id = pending.pop(fut)
+                try:
+                    yield loan_id, fut.result(), None
+                    telemetry.inc("loan_fetch.ok")
+                except LoanFetchError as e:
+                    telemetry.inc("loan_fetch.failed")
+                    yield loan_id, None, e.message
+
+
+def iter_listed_loans(status: str = "active", page_size: int = 100,
+                      timeout: float = LOAN_FETCH_TIMEOUT_SECONDS
+                      ) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    Page through the backend SAG listing (/api/v1/sag?status=...) and yield
+    (loan_id, details, None) per record; the listing already carries the
+    properties, so no per-loan request is made. A record that cannot be
+    mapped yields (loan_id, None, error) and the listing goes on. Pages are
+    ordered by sag_id so that offsets are stable from one page to the next.
+
+    Raises:
+        LoanFetchError: a page could not be fetched (loan_id is "page <n>");
+            the loans of earlier pages have already been yielded
+    """
+    base_url, headers = _silsilat_api()
+    page = 1
+    while True:
+        try:
+            resp = guarded_request("silsilat_api", "GET", f"{base_url}/api/v1/sag", session=_session(),
+                                   headers=headers, timeout=timeout,
+                                   params={"status": status, "page_size": page_size, "page_number": page,
+                                           "sort_by": "sag_id", "sort_order": "ASC"})
+            resp.raise_for_status()
+            body = resp.json()
+        except Exception as e:
+            raise LoanFetchError(f"page {page}", str(e)) from e
+        for record in body.get("data") or []:
+            loan_id = str(record.get("sagId") or record.get("id") or "")
+            if not loan_id:
+                yield "", None, "listing record without sagId"
+                continue
+            try:
+                details = map_loan_details(loan_id, record)
+            except Exception as e:
+                yield loan_id, None, f"Could not map listing record: {e}"
+                continue
+            yield loan_id, details, None
+        if not (body.get("pagination") or {}).get("hasNextPage"):
+            return
+        page += 1
+
+
+def parse_loan_ids(spec: str) -> List[str]:
+    """
+    Loan ids from a CLI spec: comma-separated ids, numeric ranges with an
+    optional prefix ("SAG-0001..SAG-0250" or "1000..1200"), or "@file" with
+    one id per line.
+    """
+    ids: List[str] = []
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        if part.startswith("@"):
+            with open(part[1:], "r", encoding="utf-8") as f:
+                ids.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+            continue
+        m = re.fullmatch(r"(.*?)(\d+)\.\.(?:\1)?(\d+)", part)
+        if m:
+            prefix, start, end = m.group(1), m.group(2), m.group(3)
+            ids.extend(f"{prefix}{n:0{len(start)}d}" for n in range(int(start), int(end) + 1))
+        else:
+            ids.append(part)
+    return ids
+
+
 # ------------------------------------------------------------------------------
-# 2. Get gold price from MetalPriceAPI (USD per troy ounce)
-#    Docs: https://metalpriceapi.com/
+# 1.1. Last-known-good market data cache
+#      Used when an evaluation's deadline leaves no time for a live fetch.
 # ------------------------------------------------------------------------------
-def get_gold_price_usd() -> float:
+MARKET_CACHE_FILE = os.getenv("MARKET_CACHE_FILE", "data/market_cache.json")
+_market_cache: Dict[str, Dict[str, Any]] = {}
+_market_cache_loaded = False
+
+
+def _load_market_cache() -> None:
+    global _market_cache_loaded
+    if _market_cache_loaded:
+        return
+    _market_cache_loaded = True
+    try:
+        with open(MARKET_CACHE_FILE, "r", encoding="utf-8") as f:
+            _market_cache.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+
+def remember_market_data(key: str, value: float) -> None:
     """
-    Fetch latest gold spot price in USD per troy ounce.
+    Record a successfully fetched market value (in memory and, best effort, on disk).
 
-    Environment:
-        METALPRICE_API_KEY
-    Returns:
-        float: gold price (USD/oz)
+    The file is only rewritten when the value changed (fetched_at on disk is
+    then the time the value was first seen). Each process writes its own
+    temporary file and renames it into place, so concurrent writers never
+    publish each other's half-written files.
+
+    Keys in use: "gold_price_myr", "yesterday_gold_price_myr", "fx:USD/MYR".
     """
+    _load_market_cache()
+    previous = _market_cache.get(key)
+    _market_cache[key] = {"value": value, "fetched_at": datetime.now(timezone.utc).isoformat()}
+    if previous is not None and previous.get("value") == value:
+        return
+    directory = os.path.dirname(MARKET_CACHE_FILE) or "."
+    tmp = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=".market_cache.",
+                                         suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            json.dump(_market_cache, f)
+        os.replace(tmp, MARKET_CACHE_FILE)
+        tmp = None
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[WARN] Could not persist market data cache: {e}", file=sys.stderr)
+    finally:
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def record_price(symbol: str, value: float) -> None:
+    """Append a fetched price to the local price history, volatility engine and anomaly detector (best effort)."""
+    now = datetime.now(timezone.utc).timestamp()
+    # Streaming state first: a first-use warm start replays the store, which must not yet hold this tick
+    get_volatility_engine().update(symbol, now, value)
+    get_anomaly_detector(symbol).update(now, value)
+    try:
+        get_price_store().record(symbol, value, now)
+    except OSError as e:
+        print(f"[WARN] Could not record {symbol} price: {e}", file=sys.stderr)
+
+
+def get_cached_market_data(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the last known value for `key` as {"value": ..., "fetched_at": ...},
+    or None if it was never fetched.
+    """
+    _load_market_cache()
+    return _market_cache.get(key)
+
+
+# ------------------------------------------------------------------------------
+# 2. Price providers and median consensus
+#    Each configured provider is queried concurrently with a per-source
+#    deadline; the median of the answers that arrive in time is used, so one
+#    slow or outlying provider neither delays nor skews the price.
+# ------------------------------------------------------------------------------
+TROY_OUNCE_G = 31.1034768
+PRICE_SOURCE_TIMEOUT_SECONDS = float(os.getenv("PRICE_SOURCE_TIMEOUT_SECONDS", "3"))
+PRICE_FEED_FILE = os.getenv("PRICE_FEED_FILE", "data/price_feed.json")
+PRICE_FEED_MAX_AGE_SECONDS = float(os.getenv("PRICE_FEED_MAX_AGE_SECONDS", "900"))
+# A source further than this from the median is reported as an outlier
+PRICE_OUTLIER_PERCENT = float(os.getenv("PRICE_OUTLIER_PERCENT", "2.0"))
+
+# Stub values used by the "stub" provider (local development default)
+STUB_GOLD_USD_OZ = 592.48
+STUB_FX_RATES = {"USD/MYR": 4.70}
+
+_provider_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="price-src")
+_consensus: Dict[str, Dict[str, Any]] = {}
+_backend_latest: Dict[str, Any] = {"at": 0.0, "data": None}
+_backend_latest_lock = threading.Lock()
+
+
+def _gold_from_metalpriceapi(timeout: float) -> float:
     api_key = os.getenv("METALPRICE_API_KEY")
+    if not api_key:
+        raise ValueError("METALPRICE_API_KEY not set")
     url = f"https://api.metalpriceapi.com/v1/latest?api_key={api_key}&base=USD&currencies=XAU"
+    resp = guarded_request("metalpriceapi", "GET", url, timeout=timeout)
+    resp.raise_for_status()
+    # The API returns something like {"rates": {"XAU": 0.00044}, "base": "USD"}
+    rate_xau = resp.json()["rates"]["XAU"]
+    if rate_xau == 0:
+        raise ValueError("Invalid XAU rate (0)")
+    return 1.0 / rate_xau
 
+
+def _fx_from_fastforex(pair: str, timeout: float) -> float:
+    api_key = os.getenv("FASTFOREX_API_KEY")
+    if not api_key:
+        raise ValueError("FASTFOREX_API_KEY not set")
+    base, quote = pair.split("/")
+    url = f"https://api.fastforex.io/fetch-one?from={base}&to={quote}&api_key={api_key}"
+    resp = guarded_request("fastforex", "GET", url, timeout=timeout)
+    resp.raise_for_status()
+    return float(resp.json()["result"][quote])
+
+
+def _backend_latest_price(timeout: float) -> Dict[str, Any]:
+    """Backend's /gold-price/latest row, shared by the gold and FX providers for a few seconds."""
+    with _backend_latest_lock:
+        if _backend_latest["data"] is not None and time.monotonic() - _backend_latest["at"] < 5.0:
+            return _backend_latest["data"]
+    base_url = os.getenv("SILSILAT_API_BASE", "http://localhost:9487")
+    api_key = os.getenv("SILSILAT_API_KEY")
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    resp = guarded_request("silsilat_api", "GET", f"{base_url}/api/v1/gold-price/latest",
+                           headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    body = resp.json()
+    if not body.get("success") or not body.get("data"):
+        raise ValueError(f"Invalid response from latest gold price API: {body}")
+    with _backend_latest_lock:
+        _backend_latest.update(at=time.monotonic(), data=body["data"])
+    return body["data"]
+
+
+def _gold_from_backend(timeout: float) -> float:
+    return float(_backend_latest_price(timeout)["pricePerGramUsd"]) * TROY_OUNCE_G
+
+
+def _fx_from_backend(pair: str, timeout: float) -> float:
+    if pair != "USD/MYR":
+        raise ValueError(f"Backend feed has no {pair} rate")
+    return float(_backend_latest_price(timeout)["exchangeRate"])
+
+
+def _from_feed_file(symbol: str) -> float:
+    """Local JSON feed: {"XAU/USD": 2650.4, "USD/MYR": 4.47}; rejected when stale."""
+    age = time.time() - os.path.getmtime(PRICE_FEED_FILE)
+    if age > PRICE_FEED_MAX_AGE_SECONDS:
+        raise ValueError(f"{PRICE_FEED_FILE} is stale ({age:.0f}s old)")
+    with open(PRICE_FEED_FILE, "r", encoding="utf-8") as f:
+        return float(json.load(f)[symbol])
+
+
+def _fx_stub(pair: str, timeout: float) -> float:
+    if pair not in STUB_FX_RATES:
+        raise ValueError(f"No stub rate for {pair}")
+    return STUB_FX_RATES[pair]
+
+
+GOLD_PRICE_PROVIDERS: Dict[str, Callable[[float], float]] = {
+    "metalpriceapi": _gold_from_metalpriceapi,
+    "silsilat": _gold_from_backend,
+    "file": lambda timeout: _from_feed_file(GOLD_USD_OZ),
+    "stub": lambda timeout: STUB_GOLD_USD_OZ,
+}
+
+FX_PROVIDERS: Dict[str, Callable[[str, float], float]] = {
+    "fastforex": _fx_from_fastforex,
+    "silsilat": _fx_from_backend,
+    "file": lambda pair, timeout: _from_feed_file(pair),
+    "stub": _fx_stub,
+}
+
+
+def _configured_providers(env_key: str, registry: Dict[str, Callable], default: str = "stub") -> List[str]:
+    names = [n.strip() for n in os.getenv(env_key, default).split(",") if n.strip()]
+    unknown = [n for n in names if n not in registry]
+    if unknown:
+        raise ValueError(f"{env_key}: unknown provider(s) {', '.join(unknown)}")
+    return names
+
+
+def aggregate_price(symbol: str, providers: Dict[str, Callable[[float], float]],
+                    timeout: float) -> float:
+    """
+    Query `providers` concurrently and return the median of the values that
+    arrive within min(timeout, PRICE_SOURCE_TIMEOUT_SECONDS). Late providers
+    are abandoned, not waited for.
+
+    The per-source breakdown, source count and dispersion are kept for
+    get_price_consensus(symbol) and exported as telemetry.
+
+    Raises:
+        RuntimeError: if no provider answered in time
+    """
+    source_timeout = max(0.05, min(timeout, PRICE_SOURCE_TIMEOUT_SECONDS))
+    started = time.monotonic()
+
+    def timed(name: str, fn: Callable[[float], float]) -> float:
+        value = float(fn(source_timeout))
+        telemetry.observe("price_source.latency_ms", (time.monotonic() - started) * 1000,
+                          symbol=symbol, provider=name)
+        if not value > 0:
+            raise ValueError(f"non-positive price {value}")
+        return value
+
+    futures = {_provider_executor.submit(timed, name, fn): name for name, fn in providers.items()}
+    done, late = wait(futures, timeout=source_timeout)
+
+    values: Dict[str, float] = {}
+    failed: Dict[str, str] = {}
+    for fut in done:
+        name = futures[fut]
+        try:
+            values[name] = fut.result()
+        except Exception as e:
+            failed[name] = str(e)
+            telemetry.inc("price_source.errors", symbol=symbol, provider=name)
+    for fut in late:
+        failed[futures[fut]] = f"no answer within {source_timeout:.1f}s"
+        telemetry.inc("price_source.timeouts", symbol=symbol, provider=futures[fut])
+    if not values:
+        raise RuntimeError(f"No price source answered for {symbol}: {failed}")
+
+    value = statistics.median(values.values())
+    dispersion = (max(values.values()) - min(values.values())) / value * 100
+    outliers = sorted(n for n, v in values.items() if abs(v - value) / value * 100 > PRICE_OUTLIER_PERCENT)
+    for name in outliers:
+        telemetry.inc("price_source.outliers", symbol=symbol, provider=name)
+    _consensus[symbol] = {
+        "value": value,
+        "sources": values,
+        "failed": failed,
+        "outliers": outliers,
+        "source_count": len(values),
+        "dispersion_percent": round(dispersion, 4),
+    }
+    telemetry.set_gauge("price_sources.count", len(values), symbol=symbol)
+    telemetry.set_gauge("price_sources.dispersion_percent", dispersion, symbol=symbol)
+    if failed:
+        print(f"[WARN] {symbol}: {len(values)}/{len(providers)} price sources answered; failed: {failed}", file=sys.stderr)
+    return value
+
+
+def get_price_consensus(symbol: str) -> Optional[Dict[str, Any]]:
+    """
+    Breakdown of the last aggregate_price() for `symbol`:
+    {"value", "sources", "failed", "outliers", "source_count", "dispersion_percent"}.
+    """
+    return _consensus.get(symbol)
+
+
+def _answered_live(symbol: str) -> bool:
+    """
+    True if the last consensus for `symbol` includes a real provider. Values
+    answered by the "stub" provider alone are returned to the caller but never
+    cached or recorded, so they cannot pose as market history.
+    """
+    consensus = _consensus.get(symbol)
+    return bool(consensus) and any(name != "stub" for name in consensus["sources"])
+
+
+def get_gold_price_usd(timeout: float = 15) -> float:
+    """
+    Latest gold spot price in USD per troy ounce, as the median across the
+    providers listed in GOLD_PRICE_PROVIDERS.
+
+    Environment:
+        GOLD_PRICE_PROVIDERS  comma list of metalpriceapi, silsilat, file, stub (default: stub)
+        METALPRICE_API_KEY    for metalpriceapi
+    Args:
+        timeout: request timeout in seconds
+    Returns:
+        float: gold price (USD/oz)
+    Raises:
+        RuntimeError: if no provider answered (callers fall back to the market cache)
+    """
     try:
-        # resp = requests.get(url, timeout=15)
-        # resp.raise_for_status()
-        # data = resp.json()
-        # # The API returns something like {"rates": {"XAU": 0.00044}, "base": "USD"}
-        # rate_xau = data["rates"]["XAU"]
-        # if rate_xau == 0:
-        #     raise ValueError("Invalid XAU rate (0)")
-        # gold_price_usd_per_oz = 1.0 / rate_xau
-        # return gold_price_usd_per_oz
-        return 592.48 
+        names = _configured_providers("GOLD_PRICE_PROVIDERS", GOLD_PRICE_PROVIDERS)
+        gold_price_usd_per_oz = aggregate_price(GOLD_USD_OZ, {n: GOLD_PRICE_PROVIDERS[n] for n in names}, timeout)
     except Exception as e:
-        print(f"[ERROR] Could not fetch gold price: {e}")
-        # Fallback to a safe default (approx)
-        return 592.48  # USD/oz
+        print(f"[ERROR] Could not fetch gold price: {e}", file=sys.stderr)
+        raise
+    if _answered_live(GOLD_USD_OZ):
+        record_price(GOLD_USD_OZ, gold_price_usd_per_oz)
+    return gold_price_usd_per_oz
 
 
 # ------------------------------------------------------------------------------
-# 3. Get FX rate USD→MYR from FastForex.io
-#    Docs: https://www.fastforex.io/documentation
+# 3. Get FX rate (USD→MYR) as the median across FX providers
+#    FastForex docs: https://www.fastforex.io/documentation
 # ------------------------------------------------------------------------------
-def get_fx_rate(pair: str = "USD/MYR") -> float:
+def get_fx_rate(pair: str = "USD/MYR", timeout: float = 10) -> float:
     """
-    Fetch latest FX rate (USD to MYR).
+    Latest FX rate (USD to MYR), as the median across the providers listed
+    in FX_PROVIDERS.
 
     Environment:
-        FASTFOREX_API_KEY
+        FX_PROVIDERS       comma list of fastforex, silsilat, file, stub (default: stub)
+        FASTFOREX_API_KEY  for fastforex
+    Args:
+        pair: currency pair "BASE/QUOTE"
+        timeout: request timeout in seconds
     Returns:
         float: exchange rate (1 USD = ? MYR)
+    Raises:
+        RuntimeError: if no provider answered (callers fall back to the market cache)
     """
-    api_key = os.getenv("FASTFOREX_API_KEY")
-    if not api_key:
-        raise ValueError("FASTFOREX_API_KEY not set in .env.local")
-
-    base, quote = pair.split("/")
-    url = f"https://api.fastforex.io/fetch-one?from={base}&to={quote}&api_key={api_key}"
-
     try:
-        # resp = requests.get(url, timeout=10)
-        # resp.raise_for_status()
-        # data = resp.json()
-        # rate = float(data["result"][quote])
-        # return rate
-        return 4.70
+        names = _configured_providers("FX_PROVIDERS", FX_PROVIDERS)
+        providers = {n: functools.partial(FX_PROVIDERS[n], pair) for n in names}
+        rate = aggregate_price(pair, providers, timeout)
     except Exception as e:
-        print(f"[ERROR] Could not fetch FX rate {pair}: {e}")
-        return 4.70  # safe default (USD→MYR)
+        print(f"[ERROR] Could not fetch FX rate {pair}: {e}", file=sys.stderr)
+        raise
+    if _answered_live(pair):
+        remember_market_data(f"fx:{pair}", rate)
+        record_price(pair, rate)
+    return rate
 
 
 # ------------------------------------------------------------------------------
 # 4. Compute gold price in MYR per gram (helper for evaluator)
 # ------------------------------------------------------------------------------
-def get_gold_price_myr() -> float:
+def get_gold_price_myr(timeout: float = 15) -> float:
     """
     Convert USD/oz gold price to MYR/gram using live FX rate.
 
     1 troy ounce = 31.1034768 grams
 
+    Args:
+        timeout: per-request timeout in seconds
     Returns:
         float: gold price in MYR per gram
     """
-    usd_per_oz = get_gold_price_usd()
-    usd_to_myr = get_fx_rate("USD/MYR")
-    myr_per_gram = (usd_per_oz * usd_to_myr) / 31.1034768
-    return round(myr_per_gram, 2)
+    usd_per_oz = get_gold_price_usd(timeout=timeout)
+    usd_to_myr = get_fx_rate("USD/MYR", timeout=timeout)
+    return gold_price_myr_from(usd_per_oz, usd_to_myr)
+
+
+def gold_price_myr_from(usd_per_oz: float, usd_to_myr: float) -> float:
+    """
+    MYR/gram from already-fetched USD/oz and USD/MYR; cached and recorded like
+    a live fetch when both inputs came from a live provider.
+    """
+    myr_per_gram = round((usd_per_oz * usd_to_myr) / TROY_OUNCE_G, 2)
+    if _answered_live(GOLD_USD_OZ) and _answered_live(FX_USD_MYR):
+        remember_market_data("gold_price_myr", myr_per_gram)
+        record_price(GOLD_MYR_G, myr_per_gram)
+    return myr_per_gram
 
 
 # ------------------------------------------------------------------------------
-# 4.1. Get yesterday's gold price from backend API
+# 4.1. Get yesterday's gold price (local price history, then backend API)
 # ------------------------------------------------------------------------------
-def get_yesterday_gold_price_myr() -> Optional[float]:
+def get_yesterday_gold_price_myr(timeout: float = 10) -> Optional[float]:
     """
-    Fetch yesterday's gold price in MYR per gram from the backend API.
-    
-    Environment:
-        SILSILAT_API_BASE
-        SILSILAT_API_KEY (optional, for authentication)
-    
+    Yesterday's gold price in MYR per gram.
+
+    Read from the local price store (last XAU/MYR_G point of the previous UTC
+    day) without any network call. The backend endpoint
+    (/api/v1/gold-price/yesterday) is not wired in yet, so with nothing in the
+    store for yesterday there is no yesterday price and the caller's
+    no-yesterday path applies.
+
+    Args:
+        timeout: reserved for the backend request
+
     Returns:
         Optional[float]: yesterday's gold price in MYR per gram, or None if unavailable
     """
-    base_url = os.getenv("SILSILAT_API_BASE", "http://localhost:9487")
-    api_key = os.getenv("SILSILAT_API_KEY")
-    url = f"{base_url}/api/v1/gold-price/yesterday"
-    
-    # Prepare headers with authentication if API key is available
-    headers = {}
-    if api_key:
-        headers["Authorization"] = f"Bearer {api_key}"
-    
     try:
-        # resp = requests.get(url, headers=headers, timeout=10)
-        # resp.raise_for_status()
-        # data = resp.json()
-        
-        # if data.get("success") and data.get("data"):
-        #     price_per_gram_myr = float(data["data"]["pricePerGramMyr"])
-        #     return round(price_per_gram_myr, 2)
-        # else:
-        #     print(f"[WARN] Invalid response from yesterday gold price API: {data}")
-        #     return None
-
-        return 90.00
-            
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 401:
-            print(f"[WARN] Authentication required for gold price API. Set SILSILAT_API_KEY in environment.")
-        elif e.response.status_code == 404:
-            print(f"[WARN] No gold price data found for yesterday")
-        else:
-            print(f"[WARN] HTTP error fetching yesterday's gold price: {e}")
-        return None
-    except Exception as e:
-        print(f"[WARN] Could not fetch yesterday's gold price: {e}")
+        stored = get_price_store().daily_close(GOLD_MYR_G, datetime.now(timezone.utc) - timedelta(days=1))
+    except OSError as e:
+        print(f"[WARN] Price store unavailable: {e}", file=sys.stderr)
+        stored = None
+    if stored is None:
         return None
+    price = round(stored, 2)
+    remember_market_data("yesterday_gold_price_myr", price)
+    return price
 
 
 # ------------------------------------------------------------------------------
@@ -224,6 +652,9 @@ def detect_abnormal_price_change(current_price: float, yesterday_price: Optional
                                max_deviation_percent: float = 5.0) -> Dict[str, Any]:
     """
     Detect if current gold price shows abnormal deviation from yesterday's price.
+
+    One-off comparison; evaluations read the streaming verdict from
+    anomaly.get_anomaly_detector() and only use this when no tick was recorded.
     
     Args:
         current_price: Current gold price in MYR per gram
@@ -264,35 +695,62 @@ def detect_abnormal_price_change(current_price: float, yesterday_price: Optional
 
 
 # ------------------------------------------------------------------------------
-# 5. Get recent volatility (stub for now; replace with actual logic)
+# 5. Get recent volatility from the streaming engine (volatility.py)
 # ------------------------------------------------------------------------------
-def get_volatility(symbol: str = "XAU/MYR", window: int = 30) -> float:
+# Public symbols map onto the price-store series the engine is fed from.
+VOLATILITY_SYMBOLS = {"XAU/MYR": GOLD_MYR_G, "XAU/USD": GOLD_USD_OZ}
+_vol_history_warned: set = set()
+
+
+def get_volatility(symbol: str = "XAU/MYR", window: int = 30, kind: str = "rolling") -> Optional[float]:
     """
-    Compute or fetch rolling volatility (% stddev of daily returns).
-    In production, integrate with time-series data provider or Silsilat data lake.
-    For now, returns a static illustrative value.
+    Rolling volatility (stddev of daily log returns) from the streaming engine.
+    This is an O(1) read of state maintained by record_price(); history is
+    never re-scanned.
 
     Args:
         symbol: asset symbol (e.g., XAU/MYR)
         window: rolling window in days
+        kind: "rolling", "ewma", "range" (Parkinson high/low) or "intraday" (window in ticks)
 
     Returns:
-        float: volatility (0.0–1.0)
+        float: volatility (0.0–1.0), or VOL_FALLBACK (default 0.03, the value
+        this function returned before the engine existed; empty = None, which
+        skips the VOL_* rule) when there is not enough price history yet
+        (fewer than VOL_MIN_SAMPLES daily returns in the window).
+    """
+    return get_volatility_estimate(symbol, window, kind)[0]
+
+
+def get_volatility_estimate(symbol: str = "XAU/MYR", window: int = 30,
+                            kind: str = "rolling") -> Tuple[Optional[float], bool]:
+    """
+    get_volatility() plus whether the value is the VOL_FALLBACK placeholder
+    rather than measured: (volatility, is_fallback). Consumers that size risk
+    with the number itself (Monte Carlo) skip a fallback value.
     """
-    # Example: use historical API later; stubbed to 0.03 (3%)
-    return 0.03
+    vol = get_volatility_engine().volatility(VOLATILITY_SYMBOLS.get(symbol, symbol), window, kind)
+    if vol is not None:
+        return vol, False
+    fallback = os.getenv("VOL_FALLBACK", "0.03")
+    if (symbol, window, kind) not in _vol_history_warned:
+        _vol_history_warned.add((symbol, window, kind))
+        print(f"[WARN] Not enough {symbol} history for {window}-day volatility"
+              f"{f'; using VOL_FALLBACK={fallback}' if fallback else ''}", file=sys.stderr)
+    return (float(fallback), True) if fallback else (None, False)
 
 
 # ------------------------------------------------------------------------------
-# 6. Get shop rating from Silsilat or local lookup
+# 6. Get shop rating from the shop registry
 # ------------------------------------------------------------------------------
-def get_shop_rating(shop_id: str) -> str:
+def get_shop_rating(shop_id: Optional[str]) -> Optional[str]:
     """
-    Placeholder: fetch pawnshop operational rating (A–E).
-    Replace with API call to Silsilat registry when available.
+    Pawnshop operational rating (A–E) from the in-memory shop registry
+    (shop_registry.py); None for unknown shops unless SHOP_RATING_DEFAULT is set.
+    The registry is loaded once (from its persisted copy while within
+    SHOP_REGISTRY_TTL_SECONDS), so this does no I/O per call.
     """
-    # Stubbed simple logic
-    return "A" if shop_id.endswith("4") else "B"
+    return shop_registry.get_shop_rating(shop_id)
 
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+telemetry.py
+
+In-process metrics for the Gold Collateral Evaluation Agent.
+
+Phoenix receives spans only, so aggregate numbers (breaker states, latency
+histograms, ...) are kept here and rendered with summary_report(). Metrics
+are identified by name plus optional string labels:
+
+    inc("circuit_breaker.calls", dependency="ollama", outcome="failure")
+    set_gauge("circuit_breaker.state", 2, dependency="ollama")
+    observe("llm.tokens_per_s", 14.2, model="llama3.1:8b")
+
+Metrics live in one process. Batch workers hand theirs to the coordinator
+with export(reset=True) after each chunk, and the coordinator folds them
+into its own with merge(), so its summary_report() covers the whole batch.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, LabelKey], float] = {}
+_gauges: Dict[Tuple[str, LabelKey], float] = {}
+_histograms: Dict[Tuple[str, LabelKey], "Histogram"] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, LabelKey]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """Count/sum/min/max over all samples plus a bounded reservoir for percentiles."""
+
+    def __init__(self, reservoir: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.samples: deque = deque(maxlen=reservoir)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def merge(self, state: Dict[str, Any]) -> None:
+        """Fold in another histogram's export() state."""
+        if not state["count"]:
+            return
+        self.count += state["count"]
+        self.total += state["total"]
+        self.min = min(self.min, state["min"])
+        self.max = max(self.max, state["max"])
+        self.samples.extend(state["samples"])
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def summary(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+# ------------------------------------------------------------------------------
+# Recording
+# ------------------------------------------------------------------------------
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+def merge(state: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Fold metrics exported by another process into this one (counters add, gauges overwrite)."""
+    with _lock:
+        for c in state["counters"]:
+            key = _key(c["name"], c["labels"])
+            _counters[key] = _counters.get(key, 0.0) + c["value"]
+        for g in state["gauges"]:
+            _gauges[_key(g["name"], g["labels"])] = g["value"]
+        for h in state["histograms"]:
+            key = _key(h["name"], h["labels"])
+            hist = _histograms.get(key)
+            if hist is None:
+                hist = _histograms[key] = Histogram()
+            hist.merge(h)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+# ------------------------------------------------------------------------------
+# Reporting
+# ------------------------------------------------------------------------------
+def _fmt_labels(labels: LabelKey) -> str:
+    return "{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""
+
+
+def snapshot() -> Dict[str, List[Dict[str, Any]]]:
+    """All metrics as plain dicts (JSON-serializable)."""
+    with _lock:
+        return {
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())],
+            "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_gauges.items())],
+            "histograms": [{"name": n, "labels": dict(l), **h.summary()}
+                           for (n, l), h in sorted(_histograms.items(), key=lambda kv: kv[0])],
+        }
+
+
+def export(reset: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    All metrics in mergeable form (histograms keep their raw state and
+    reservoir) for merge() in another process. With reset=True the metrics
+    are cleared in the same step, so repeated exports never count a sample twice.
+    """
+    with _lock:
+        state = {
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in _counters.items()],
+            "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in _gauges.items()],
+            "histograms": [{"name": n, "labels": dict(l), "count": h.count, "total": h.total,
+                            "min": h.min, "max": h.max, "samples": list(h.samples)}
+                           for (n, l), h in _histograms.items()],
+        }
+        if reset:
+            _counters.clear()
+            _gauges.clear()
+            _histograms.clear()
+    return state
+
+
+def summary_report(prefix: str = "") -> str:
+    """Human-readable dump of every metric (optionally only names starting with `prefix`), one per line."""
+    snap = snapshot()
+    for kind in snap:
+        snap[kind] = [m for m in snap[kind] if m["name"].startswith(prefix)]
+    lines: List[str] = []
+    for c in snap["counters"]:
+        lines.append(f"counter   {c['name']}{_fmt_labels(tuple(c['labels'].items()))} = {c['value']:g}")
+    for g in snap["gauges"]:
+        lines.append(f"gauge     {g['name']}{_fmt_labels(tuple(g['labels'].items()))} = {g['value']:g}")
+    for h in snap["histograms"]:
+        name = f"{h['name']}{_fmt_labels(tuple(h['labels'].items()))}"
+        if not h["count"]:
+            lines.append(f"histogram {name} count=0")
+            continue
+        lines.append(
+            f"histogram {name} count={h['count']} mean={h['mean']:.4g} p50={h['p50']:.4g} "
+            f"p95={h['p95']:.4g} p99={h['p99']:.4g} max={h['max']:.4g}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Shared pytest setup: the agent modules are flat top-level modules, and every
+test runs in its own working directory so data/ files never leak between tests.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    """
+    gold_evaluator with the LLM, result cache, journal and topics stubbed out.
+    Yields a namespace with the module, a config and a no-op tracer.
+    """
+    from types import SimpleNamespace
+
+    from opentelemetry import trace
+
+    import gold_evaluator
+    import market_data
+    from eval_cache import EvalCache
+
+    monkeypatch.setattr(market_data, "_current", None)
+    monkeypatch.setattr(market_data, "_pinned", False)
+    monkeypatch.setattr(gold_evaluator, "JOURNAL_ENABLED", False)
+    monkeypatch.setattr(gold_evaluator, "get_eval_cache", lambda: EvalCache(max_entries=0))
+    monkeypatch.setattr(
+        gold_evaluator, "build_recommendation_with_llm",
+        lambda **kw: gold_evaluator.LLMRecommendation(model="stub", rationale="Action: approve", action="approve"))
+    cfg = gold_evaluator.base_env_config()
+    cfg.update(INPUT_TOPIC_ID="", OUTPUT_TOPIC_ID="", MC_PATHS=0, EVAL_DEADLINE_SECONDS=10)
+    yield SimpleNamespace(module=gold_evaluator, cfg=cfg, tracer=trace.get_tracer("tests"))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import analytics as analytics_module
+from analytics import Analytics
+from journal import JOURNAL_SEGMENT_MAX_BYTES, JournalWriter
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_concentration_rejects_dimensions_latest_rows_do_not_store(tmp_path):
+    analytics = Analytics(str(tmp_path / "journal"))
+    with pytest.raises(ValueError, match="policy_version"):
+        analytics.concentration(by="policy_version")
+
+
+def test_concentration_cli_by_policy_version_is_a_usage_error(tmp_path):
+    proc = subprocess.run(
+        [sys.executable, os.path.join(AGENT_DIR, "analytics.py"), "concentration",
+         "--by", "policy_version", "--dir", str(tmp_path / "journal")],
+        capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 2
+    assert "concentration --by must be one of shop, purity" in proc.stderr
+    assert "Traceback" not in proc.stderr
+
+
+def test_concentration_over_empty_journal(tmp_path):
+    result = Analytics(str(tmp_path / "journal")).concentration(by="purity")
+    assert result["loans"] == 0 and result["top"] == []
+
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# hour, shop, ltv, risk level, action, rule codes
+EVALS = [
+    (0, "A", 0.505, "VERY_LOW", "approve", ["LTV_OK"]),
+    (1, "A", 0.605, "LOW", "approve", ["LTV_OK"]),
+    (25, "A", 0.705, "MEDIUM", "monitor", ["LTV_OK", "VOL_ELEVATED"]),
+    (26, "B", 0.905, "VERY_HIGH", "reject", ["LTV_CRITICAL", "PRICE_ABNORMAL"]),
+]
+
+
+def _record(i, hour, shop, ltv, level, action, codes):
+    return {"eval_id": f"eval-{i}", "timestamp_utc": (T0 + timedelta(hours=hour)).isoformat(),
+            "inputs": {"loan_id": f"SAG-{i}", "shop_id": shop, "purity": 916, "principal_myr": 1000.0 * (i + 1)},
+            "policy": {"version": "v1"}, "metrics": {"ltv": ltv, "risk_level": level},
+            "recommendation": {"action": action}, "explanations": [{"code": c} for c in codes]}
+
+
+def _journal(root, records_per_segment=None):
+    records = [_record(i, *e) for i, e in enumerate(EVALS)]
+    max_bytes = JOURNAL_SEGMENT_MAX_BYTES
+    if records_per_segment:
+        probe = JournalWriter(str(root / "probe"))
+        probe.append(records[0])
+        probe.close()
+        frame = os.path.getsize(root / "probe" / "seg-00000001.log")
+        max_bytes = int(frame * (records_per_segment + 0.5))
+    writer = JournalWriter(str(root / "journal"), segment_max_bytes=max_bytes)
+    for record in records:
+        writer.append(record)
+    return writer
+
+
+def test_distribution_per_shop(tmp_path):
+    _journal(tmp_path).close()
+    rows = {row["shop"]: row for row in Analytics(str(tmp_path / "journal")).distribution(by="shop")}
+    a, b = rows["A"], rows["B"]
+    assert a["evaluations"] == 3 and b["evaluations"] == 1
+    assert a["ltv_mean"] == pytest.approx(0.605)
+    assert (a["ltv_p50"], a["ltv_p90"]) == (0.61, 0.71)           # upper edges of the 0.01 bins
+    assert a["risk_bands"] == {"VERY_LOW": 0.333333, "LOW": 0.333333, "MEDIUM": 0.333333,
+                               "HIGH": 0.0, "VERY_HIGH": 0.0}
+    assert a["actions"]["approve"] == 0.666667 and a["actions"]["monitor"] == 0.333333
+    assert a["principal_myr"] == 6000.0
+    assert b["ltv_p50"] == 0.91 and b["risk_bands"]["VERY_HIGH"] == 1.0
+
+
+def test_action_rates_bucket_by_day(tmp_path):
+    _journal(tmp_path).close()
+    rates = Analytics(str(tmp_path / "journal")).action_rates(bucket_hours=24)
+    assert [(r["bucket_start"], r["evaluations"]) for r in rates] == [
+        ("2026-01-01T00:00:00+00:00", 2), ("2026-01-02T00:00:00+00:00", 2)]
+    assert rates[0]["rates"]["approve"] == 1.0
+    assert (rates[1]["rates"]["monitor"], rates[1]["rates"]["reject"]) == (0.5, 0.5)
+
+
+def test_rule_frequencies_overall_and_per_shop(tmp_path):
+    _journal(tmp_path).close()
+    analytics = Analytics(str(tmp_path / "journal"))
+    overall = analytics.rule_frequencies()
+    assert overall["LTV_OK"] == {"hits": 3, "rate": 0.75}
+    assert overall["PRICE_ABNORMAL"] == {"hits": 1, "rate": 0.25}
+    assert overall["TENURE_LONG"] == {"hits": 0, "rate": 0.0}
+    assert analytics.rule_frequencies(by="shop") == {
+        "A": {"LTV_OK": 1.0, "VOL_ELEVATED": 0.333333},
+        "B": {"LTV_CRITICAL": 1.0, "PRICE_ABNORMAL": 1.0},
+    }
+
+
+def test_time_bounded_query_across_a_segment_boundary(tmp_path):
+    _journal(tmp_path, records_per_segment=2).close()
+    analytics = Analytics(str(tmp_path / "journal"))
+    assert [len(seg) for seg in analytics.journal.segments] == [2, 2]
+    # hours 1 and 25: the second record of segment 1 and the first of segment 2
+    rows = analytics.distribution(by="shop", start=T0 + timedelta(hours=1), end=T0 + timedelta(hours=26))
+    assert [(r["shop"], r["evaluations"]) for r in rows] == [("A", 2)]
+    assert rows[0]["ltv_mean"] == pytest.approx(0.655)
+    assert analytics.concentration(by="shop", start=T0 + timedelta(hours=1),
+                                   end=T0 + timedelta(hours=26))["exposure_myr"] == 5000.0
+    assert sum(r["evaluations"] for r in analytics.distribution(by="shop")) == 4
+
+
+def test_appends_after_a_warm_run_decode_only_the_new_rows(tmp_path, monkeypatch):
+    writer = _journal(tmp_path)
+    assert Analytics(str(tmp_path / "journal")).warm() == 4
+    writer.append(_record(4, 49, "B", 0.855, "VERY_HIGH", "margin_call", ["LTV_CRITICAL"]))
+    writer.close()
+
+    decoded = []
+    record_columns = analytics_module.record_columns
+
+    def counting(records):
+        records = list(records)
+        decoded.append(len(records))
+        return record_columns(records)
+
+    monkeypatch.setattr(analytics_module, "record_columns", counting)
+    analytics = Analytics(str(tmp_path / "journal"))
+    rows = {row["shop"]: row for row in analytics.distribution(by="shop")}
+    assert decoded == [1]
+    assert rows["B"]["evaluations"] == 2 and rows["B"]["ltv_mean"] == pytest.approx(0.88)
+    assert analytics.concentration(by="shop")["exposure_myr"] == 15000.0
+    assert analytics.action_rates(bucket_hours=24)[-1]["rates"]["margin_call"] == 1.0
+    analytics.distribution(by="shop")
+    assert decoded == [1]                       # the cache now covers every row
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import backtest
+import policy
+
+# 10 g of 999 gold at 100 MYR/g with no haircut: LTV = principal / 1000
+STORED = [(500, "approve"), (750, "approve"), (820, "monitor"), (900, "margin_call")]
+
+
+def _record(i, principal, action):
+    return {
+        "eval_id": f"ev-{i}",
+        "inputs": {"principal_myr": principal, "gold_weight_g": 10.0, "purity": 999, "tenure_days": 90},
+        "metrics": {"gold_price_myr_per_g": 100.0, "gold_volatility": 0.01, "risk_level": ""},
+        "policy": {"version": "v1", "values": {
+            "MAX_SAFE_LTV": 0.80, "MARGIN_CALL_LTV": 0.85, "HAIRCUT_BPS": 0, "VOL_THRESHOLD": 0.05,
+            "TENURE_LIMIT_DAYS": 180, "PRICE_DEVIATION_THRESHOLD": 5.0}},
+        "recommendation": {"action": action},
+        "explanations": [{"code": "PRICE_NORMAL", "details": {"deviation_percent": 0.5}}],
+    }
+
+
+@pytest.fixture
+def cols(tmp_path, monkeypatch):
+    monkeypatch.setattr(policy, "POLICY_FILE", "")
+    monkeypatch.setattr(policy, "_current", None)
+    path = tmp_path / "evals.jsonl"
+    path.write_text("".join(json.dumps(_record(i, p, a)) + "\n" for i, (p, a) in enumerate(STORED)))
+    return backtest.load_columns([str(path)])
+
+
+def test_baseline_reproduces_the_stored_decisions(cols):
+    base = backtest.score(cols, backtest.baseline_params(cols))
+    assert [backtest.ACTIONS[a] for a in base["action"]] == [a for _, a in STORED]
+    assert backtest.compare(cols, {})["baseline_vs_stored_action_agreement"] == 1.0
+
+
+def test_tighter_max_safe_ltv_moves_0_75_to_monitor(cols):
+    report = backtest.compare(cols, {"MAX_SAFE_LTV": 0.70})
+    assert report["decisions_changed"] == 1
+    assert report["decision_transitions"] == {"approve->monitor": 1}
+    assert report["changed_eval_ids"] == ["ev-1"]
+    assert report["bands_changed"] == 0
+    assert report["rule_hits_changed"] == {"LTV_ELEVATED": {"gained": 1, "lost": 0},
+                                           "LTV_OK": {"gained": 0, "lost": 1}}
+    assert list(report["by_policy_key"]) == ["MAX_SAFE_LTV"]
+
+
+def test_looser_max_safe_ltv_moves_0_82_to_approve(cols):
+    report = backtest.compare(cols, {"MAX_SAFE_LTV": 0.84, "VOL_THRESHOLD": 0.5})
+    assert report["decision_transitions"] == {"monitor->approve": 1}
+    assert report["changed_eval_ids"] == ["ev-2"]
+    # The volatility threshold moved no decision, so it is not attributed
+    assert list(report["by_policy_key"]) == ["MAX_SAFE_LTV"]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import batch_evaluator
+import policy
+import sources
+from market_data import adopt_snapshot
+from test_gold_evaluator import LOAN, _snapshot
+
+RECORDS = {
+    "SAG-1": {"sagId": "SAG-1", "originalOwner": "shop-a",
+              "sagProperties": {"loan": 4000, "weightG": 25.0, "karat": 22, "purity": 916, "tenorM": 3}},
+    "SAG-2": {"sagId": "SAG-2", "originalOwner": "shop-a",
+              "sagProperties": {"loan": 3000, "weightG": 20.0, "karat": 22, "purity": 916, "tenorM": None}},
+}
+
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def silsilat_api(monkeypatch):
+    """guarded_request answering /Silsilat/<id> from RECORDS and a two-page listing whose page 2 fails."""
+    def request(name, method, url, params=None, **kwargs):
+        if url.endswith("/api/v1/sag"):
+            assert params["sort_by"] == "sag_id"
+            if params["page_number"] > 1:
+                raise ConnectionError("listing page unavailable")
+            return _Response({"data": list(RECORDS.values()), "pagination": {"hasNextPage": True}})
+        return _Response({"success": True, "data": RECORDS[url.rsplit("/", 1)[1]]})
+
+    monkeypatch.setattr(sources, "guarded_request", request)
+    monkeypatch.setattr(policy, "_current", None)
+
+
+def test_mapping_failure_is_reported_per_loan(silsilat_api, evaluator):
+    with pytest.raises(sources.LoanFetchError) as info:
+        sources.fetch_loan_details("SAG-2")
+    assert info.value.loan_id == "SAG-2"
+
+    adopt_snapshot(_snapshot())
+    failures = []
+    loans = batch_evaluator._fetched_loans(sources.iter_loan_details(["SAG-1", "SAG-2"], concurrency=2), failures)
+    results = list(batch_evaluator.evaluate_batch(loans, workers=1, cfg=evaluator.cfg, tracing=False))
+    assert [(loan_id, ok) for _, loan_id, _, ok in results] == [("SAG-1", True)]
+    assert json.loads(results[0][2])["market_snapshot_id"] == "mkt-20260101T000000Z-test"
+    assert [(f["error"], f["loan_id"]) for f in failures] == [("fetch_failed", "SAG-2")]
+
+
+def test_failed_listing_page_keeps_the_loans_already_listed(silsilat_api):
+    failures = []
+    loans = list(batch_evaluator._fetched_loans(sources.iter_listed_loans(), failures))
+    assert [loan["loan_id"] for loan in loans] == ["SAG-1"]
+    assert [f["error"] for f in failures] == ["fetch_failed", "listing_failed"]
+    assert failures[1]["at"] == "page 2"
+
+
+def test_worker_chunks_return_their_telemetry_once(evaluator, monkeypatch):
+    import telemetry
+
+    monkeypatch.setitem(batch_evaluator._worker, "module", evaluator.module)
+    monkeypatch.setitem(batch_evaluator._worker, "cfg", evaluator.cfg)
+    monkeypatch.setitem(batch_evaluator._worker, "tracer", evaluator.tracer)
+    adopt_snapshot(_snapshot())
+    telemetry.reset()
+    telemetry.observe("llm.tokens_per_s", 12.5, model="stub")
+    results, metrics = batch_evaluator._evaluate_chunk_in_worker([(0, dict(LOAN))])
+    assert [ok for *_, ok in results] == [True]
+    assert [h["samples"] for h in metrics["histograms"] if h["name"] == "llm.tokens_per_s"] == [[12.5]]
+    _, metrics = batch_evaluator._evaluate_chunk_in_worker([(1, dict(LOAN))])
+    assert not [h for h in metrics["histograms"] if h["name"] == "llm.tokens_per_s"]
+    telemetry.reset()
+
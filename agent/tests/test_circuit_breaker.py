@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, guarded_request
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+    def advance(seconds=0.0):
+        now[0] += seconds
+        return now[0]
+    return advance
+
+
+def _fail():
+    raise ConnectionError("down")
+
+
+def _calls(breaker, fn, n):
+    for _ in range(n):
+        try:
+            breaker.call(fn)
+        except ConnectionError:
+            pass
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = CircuitBreaker("dep", window=10, min_calls=4, error_rate_threshold=0.5, open_seconds=30)
+    _calls(breaker, _fail, 3)
+    assert breaker.state == CLOSED                     # below min_calls
+    _calls(breaker, _fail, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.call(lambda: "never")
+    assert exc.value.retry_in_s == 30.0
+
+    clock(30)
+    assert breaker.state == HALF_OPEN
+    _calls(breaker, _fail, 1)                          # failed probe re-opens
+    assert breaker.state == OPEN
+    clock(30)
+    assert breaker.call(lambda: "ok") == "ok"          # good probe closes
+    assert breaker.state == CLOSED
+    _calls(breaker, _fail, 3)                          # window was cleared on close
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_only_the_probe_budget(clock):
+    breaker = CircuitBreaker("dep", min_calls=1, open_seconds=5, half_open_max_calls=1)
+    _calls(breaker, _fail, 1)
+    clock(5)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record(False, 0.0)
+    assert breaker.state == CLOSED and breaker.allow() is True
+
+
+def test_error_rate_below_threshold_stays_closed(clock):
+    breaker = CircuitBreaker("dep", window=4, min_calls=4, error_rate_threshold=0.5)
+    for failed in (True, False, False, False, True, False, False, False):
+        breaker.record(failed, 0.0)
+    assert breaker.state == CLOSED
+
+
+def test_slow_successes_trip_the_breaker(clock):
+    breaker = CircuitBreaker("dep", window=5, min_calls=5, slow_call_s=2.0, slow_rate_threshold=0.8)
+
+    def slow():
+        clock(2.5)
+        return "late"
+    assert [breaker.call(slow) for _ in range(3)] == ["late"] * 3
+    breaker.call(lambda: "fast")
+    assert breaker.state == CLOSED                     # 4 calls, under min_calls
+    breaker.call(slow)
+    assert breaker.state == OPEN                       # 4 of 5 slow
+    clock(30)
+    breaker.call(slow)                                 # a slow probe counts as a failed one
+    assert breaker.state == OPEN
+
+
+def test_calls_under_the_slow_threshold_are_not_slow(clock):
+    breaker = CircuitBreaker("dep", window=5, min_calls=5, slow_call_s=2.0, slow_rate_threshold=0.8)
+    for _ in range(10):
+        breaker.record(False, 1.99)
+    assert breaker.state == CLOSED
+
+
+class _Session:
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+
+    def request(self, method, url, **kwargs):
+        resp = requests.Response()
+        resp.status_code = self.statuses.pop(0)
+        resp.url = url
+        return resp
+
+
+def test_guarded_request_counts_5xx_but_not_4xx(clock):
+    circuit_breaker._breakers["api"] = CircuitBreaker("api", window=5, min_calls=5)
+    session = _Session(*([404] * 5 + [429] * 5))
+    for _ in range(10):
+        assert guarded_request("api", "GET", "http://api/x", session=session).status_code in (404, 429)
+    assert circuit_breaker.get_breaker("api").state == CLOSED
+
+    session = _Session(503, 503, 503)
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            guarded_request("api", "GET", "http://api/x", session=session)
+    assert circuit_breaker.get_breaker("api").state == OPEN       # 3 of the last 5 failed
+    with pytest.raises(CircuitOpenError):
+        guarded_request("api", "GET", "http://api/x", session=_Session(200))
+
+
+def test_registry_applies_per_dependency_defaults(clock):
+    assert circuit_breaker.get_breaker("ollama").slow_call_s == 90.0
+    gateway = circuit_breaker.get_breaker("ipfs:gateway.example")
+    assert (gateway.min_calls, gateway.open_seconds) == (3, 120.0)
+    assert circuit_breaker.breaker_states() == {"ollama": CLOSED, "ipfs:gateway.example": CLOSED}
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import sources
+from deadline import Deadline
+
+
+def test_abandoned_stage_sees_itself_expired():
+    deadline = Deadline(1.0)
+    seen = {}
+    release = threading.Event()
+
+    def slow_publish():
+        release.wait(2)
+        seen["expired"] = deadline.stage_expired("publish")
+        seen["remaining"] = deadline.stage_remaining("publish")
+
+    ok, _ = deadline.run("publish", slow_publish, cap_s=0.1)
+    assert not ok
+    release.set()
+    for _ in range(100):
+        if seen:
+            break
+        time.sleep(0.01)
+    assert seen == {"expired": True, "remaining": 0.0}
+
+
+def test_stage_within_allowance_is_not_expired():
+    deadline = Deadline(5.0)
+    ok, expired = deadline.run("publish", lambda: deadline.stage_expired("publish"))
+    assert ok and expired is False
+
+
+def test_market_cache_written_only_on_change(monkeypatch):
+    monkeypatch.setattr(sources, "_market_cache", {})
+    monkeypatch.setattr(sources, "_market_cache_loaded", True)
+    writes = []
+    real_replace = os.replace
+    monkeypatch.setattr(sources.os, "replace", lambda src, dst: (writes.append(dst), real_replace(src, dst)))
+
+    sources.remember_market_data("fx:USD/MYR", 4.47)
+    sources.remember_market_data("fx:USD/MYR", 4.47)
+    sources.remember_market_data("fx:USD/MYR", 4.48)
+    assert len(writes) == 2
+
+    sources.remember_market_data("bad", object())      # not JSON-serialisable: logged, not raised
+    assert len(writes) == 2
+    assert [n for n in os.listdir("data") if n.endswith(".tmp")] == []
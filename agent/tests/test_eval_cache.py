@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import time
+
+from eval_cache import EvalCache, evaluation_key, market_key
+from market_data import adopt_snapshot
+from test_gold_evaluator import LOAN, _snapshot
+
+CFG = {"POLICY_HASH": "abc", "POLICY_REVISION": 1}
+
+
+def _key(cfg=CFG, **snapshot):
+    return evaluation_key(LOAN, cfg, market_key(adopt_snapshot(_snapshot(**snapshot))))
+
+
+def test_key_is_stable_across_refreshes_of_an_unchanged_market(evaluator):
+    assert _key(snapshot_id="mkt-a", gold_price_myr_per_g=400.0) == _key(snapshot_id="mkt-b", gold_price_myr_per_g=400.1)
+    assert _key(gold_price_myr_per_g=400.0) != _key(gold_price_myr_per_g=402.0)
+    assert _key(gold_volatility=0.010) != _key(gold_volatility=0.020)
+    assert _key() != _key(cfg={**CFG, "POLICY_REVISION": 2})
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    cache = EvalCache(max_entries=8, db_path=str(tmp_path / "cache.sqlite"), ttl_s=60)
+    cache.put("k", "{}")
+    assert cache.get("k") == "{}"
+    cache._entries["k"] = (time.time() - 120, "{}")
+    cache._db.execute("UPDATE eval_cache SET created_unix = ?", (time.time() - 120,))
+    assert cache.get("k") is None
+    assert len(cache) == 0
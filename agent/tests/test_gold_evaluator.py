@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from market_data import adopt_snapshot
+
+LOAN = {"principal_myr": 4000, "gold_weight_g": 25.0, "purity": 916, "tenure_days": 90}
+
+
+def _snapshot(**overrides):
+    snap = {
+        "snapshot_id": "mkt-20260101T000000Z-test",
+        "version": 1,
+        "as_of": "2026-01-01T00:00:00+00:00",
+        "source": "live",
+        "gold_price_myr_per_g": 400.0,
+        "fx_usd_myr": 4.47,
+        "yesterday_gold_price_myr_per_g": None,
+        "gold_volatility": 0.01,
+        "vol_window_days": 30,
+        "anomaly": {"is_abnormal": False, "deviation_percent": 0.0, "yesterday_price": None,
+                    "current_price": 400.0, "threshold_percent": 5.0, "reason": "ok", "triggers": []},
+    }
+    snap.update(overrides)
+    return snap
+
+
+def test_abnormal_price_without_a_yesterday_price(evaluator):
+    # z-score verdict, no yesterday price anywhere (snapshot or detector)
+    adopt_snapshot(_snapshot(anomaly={
+        "is_abnormal": True, "deviation_percent": 0.0, "yesterday_price": None, "current_price": 400.0,
+        "threshold_percent": 5.0, "reason": "No yesterday price available for comparison; also triggered: zscore",
+        "triggers": ["zscore"], "z_score": 6.2}))
+    out = evaluator.module.evaluate_loan(evaluator.module.LoanInput(**LOAN), evaluator.cfg, evaluator.tracer)
+    assert out.market_snapshot_id == "mkt-20260101T000000Z-test"
+    assert "PRICE_ABNORMAL" in [hit.code for hit in out.explanations]
+
+
+def test_abnormal_price_uses_the_detector_close_when_the_snapshot_has_none(evaluator):
+    adopt_snapshot(_snapshot(anomaly={
+        "is_abnormal": True, "deviation_percent": 8.1, "yesterday_price": 370.0, "current_price": 400.0,
+        "threshold_percent": 5.0, "reason": "Price deviation 8.10% exceeds threshold 5.0%",
+        "triggers": ["deviation"]}))
+    out = evaluator.module.evaluate_loan(evaluator.module.LoanInput(**LOAN), evaluator.cfg, evaluator.tracer)
+    assert "PRICE_ABNORMAL" in [hit.code for hit in out.explanations]
+
+
+def test_margin_call_probability_skips_the_fallback_volatility(evaluator):
+    cfg = {**evaluator.cfg, "MC_PATHS": 500}
+    loan = evaluator.module.LoanInput(**{**LOAN, "tenure_days": 180})
+    adopt_snapshot(_snapshot(gold_volatility=0.03, gold_volatility_fallback=True))
+    out = evaluator.module.evaluate_loan(loan, cfg, evaluator.tracer)
+    assert out.metrics.gold_volatility_fallback
+    assert out.metrics.margin_call_probability is None
+
+    adopt_snapshot(_snapshot(gold_volatility=0.01))
+    out = evaluator.module.evaluate_loan(loan, cfg, evaluator.tracer)
+    assert not out.metrics.gold_volatility_fallback
+    assert out.metrics.margin_call_probability is not None
+
+
+def test_recommendation_prompt_is_rendered_once_and_published_as_sent(evaluator, monkeypatch):
+    ge = evaluator.module
+    rendered, seen = [], {}
+    render = ge.render_recommendation_prompt
+
+    def counting_render(*args, **kwargs):
+        rendered.append(render(*args, **kwargs))
+        return rendered[-1]
+
+    def llm(**kw):
+        seen["llm"] = kw["prompt"][0]
+        return ge.LLMRecommendation(model="stub", rationale="Action: approve", action="approve")
+
+    def publish(cfg, user_prompt, rec, metrics, **kw):
+        seen["published"] = user_prompt
+        return "skip"
+
+    monkeypatch.setattr(ge, "render_recommendation_prompt", counting_render)
+    monkeypatch.setattr(ge, "build_recommendation_with_llm", llm)
+    monkeypatch.setattr(ge, "publish_evaluation", publish)
+    adopt_snapshot(_snapshot())
+    ge.evaluate_loan(ge.LoanInput(**LOAN), evaluator.cfg, evaluator.tracer)
+    assert len(rendered) == 1
+    assert seen["llm"] == seen["published"] == rendered[0][0]
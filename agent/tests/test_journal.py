@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from journal import INDEX_DTYPE, Journal, JournalWriter, _segment_paths, to_unix
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _record(i: int, loan: str = "SAG-1") -> dict:
+    return {"eval_id": f"eval-{i:04d}", "timestamp_utc": (T0 + timedelta(hours=i)).isoformat(),
+            "inputs": {"loan_id": loan, "principal_myr": 1000 + i}, "note": "x" * 40}
+
+
+def _write(root, records, **kwargs) -> JournalWriter:
+    writer = JournalWriter(str(root), **kwargs)
+    for record in records:
+        writer.append(record)
+    return writer
+
+
+def test_rotation_and_queries_across_segments(tmp_path):
+    records = [_record(i, loan=f"SAG-{i % 3}") for i in range(30)]
+    _write(tmp_path, records, segment_max_bytes=400).close()
+    journal = Journal(str(tmp_path))
+    assert len(journal.segments) > 3
+    assert len(journal) == 30
+    assert [r["eval_id"] for r in journal.iter_records()] == [r["eval_id"] for r in records]
+
+    first, last = journal.segments[0], journal.segments[-1]
+    assert journal.get(records[0]["eval_id"]) == records[0]
+    assert journal.get(records[-1]["eval_id"]) == records[-1]
+    assert journal.get("eval-missing") is None
+    assert first.ts_range[1] < last.ts_range[0]
+
+    assert [r["eval_id"] for r in journal.by_loan("SAG-1")] == [f"eval-{i:04d}" for i in range(1, 30, 3)]
+    assert [r["eval_id"] for r in journal.by_loan("SAG-1", start=T0 + timedelta(hours=10),
+                                                  end=T0 + timedelta(hours=20))] == ["eval-0010", "eval-0013",
+                                                                                     "eval-0016", "eval-0019"]
+    # a range crossing segment boundaries, end exclusive
+    lo, hi = journal.segments[1].ts_range[0] - 2 * 3600, journal.segments[1].ts_range[0] + 3 * 3600
+    expected = [r for r in records if lo <= to_unix(r["timestamp_utc"]) < hi]
+    assert len(expected) == 5
+    assert list(journal.range(lo, hi)) == expected
+
+
+def test_reader_sees_appends_after_refresh(tmp_path):
+    writer = _write(tmp_path, [_record(0)])
+    journal = Journal(str(tmp_path))
+    writer.append(_record(1))
+    assert len(journal) == 1
+    assert len(journal.refresh()) == 2 and journal.get("eval-0001")["eval_id"] == "eval-0001"
+    writer.close()
+
+
+def test_repair_truncates_a_torn_frame(tmp_path):
+    _write(tmp_path, [_record(i) for i in range(3)]).close()
+    log_path, _ = _segment_paths(str(tmp_path), 1)
+    size = os.path.getsize(log_path)
+    with open(log_path, "ab") as f:             # header promising 500 bytes, then the crash
+        f.write((500).to_bytes(4, "little") + (0).to_bytes(4, "little") + b"partial")
+
+    writer = _write(tmp_path, [_record(3)])
+    writer.close()
+    journal = Journal(str(tmp_path))
+    assert [r["eval_id"] for r in journal.iter_records()] == ["eval-0000", "eval-0001", "eval-0002", "eval-0003"]
+    assert os.path.getsize(log_path) > size
+
+
+def test_repair_drops_a_partial_index_row_and_reindexes_its_frame(tmp_path):
+    _write(tmp_path, [_record(i) for i in range(3)]).close()
+    _, idx_path = _segment_paths(str(tmp_path), 1)
+    os.truncate(idx_path, os.path.getsize(idx_path) - 5)
+
+    JournalWriter(str(tmp_path)).close()
+    assert os.path.getsize(idx_path) == 3 * INDEX_DTYPE.itemsize
+    journal = Journal(str(tmp_path))
+    assert journal.get("eval-0002") == _record(2)
+    assert [r["eval_id"] for r in journal.by_loan("SAG-1")] == ["eval-0000", "eval-0001", "eval-0002"]
+
+
+def test_repair_reindexes_frames_written_but_not_indexed(tmp_path):
+    _write(tmp_path, [_record(i) for i in range(4)]).close()
+    _, idx_path = _segment_paths(str(tmp_path), 1)
+    os.truncate(idx_path, INDEX_DTYPE.itemsize)         # only the first frame made it into the index
+
+    JournalWriter(str(tmp_path)).close()
+    journal = Journal(str(tmp_path))
+    assert len(journal) == 4
+    assert [r["eval_id"] for r in journal.range(T0 + timedelta(hours=1), T0 + timedelta(hours=3))] == [
+        "eval-0001", "eval-0002"]
+    stats = journal.stats()
+    assert stats["records"] == 4 and stats["segments"] == 1
+
+
+@pytest.mark.parametrize("value", ["2026-01-01T00:00:00Z", "2026-01-01T00:00:00", T0, T0.timestamp()])
+def test_to_unix_accepts_iso_datetime_and_numbers(value):
+    assert to_unix(value) == T0.timestamp()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import json
+
+import numpy as np
+import pytest
+
+import loan_book
+from loan_book import FIELDS, open_loan_book, validate_columns, write_loan_book
+
+LOANS = [
+    {"loan_id": "SAG-1", "shop_id": "shop-b", "principal_myr": 4000.0, "gold_weight_g": 25.0,
+     "purity": 916, "collateral_type": "Jewellery", "tenure_days": 90, "fees_myr": 12.5},
+    {"loan_id": "SAG-2", "shop_id": "shop-a", "principal_myr": 9000.0, "gold_weight_g": 31.1,
+     "purity": 999, "collateral_type": "bar", "tenure_days": 180},
+    {"loan_id": "SAG-3", "principal_myr": 1500.0, "gold_weight_g": 8.0, "purity": 750, "tenure_days": 30},
+]
+
+
+def test_round_trip_through_a_directory_book(tmp_path):
+    path = str(tmp_path / "book")
+    write_loan_book(path, LOANS)
+    book = open_loan_book(path)
+    assert len(book) == 3
+    assert list(book.iter_records()) == [
+        dict(LOANS[0], collateral_type="jewellery"),
+        dict(LOANS[1], fees_myr=0.0),
+        dict(LOANS[2], shop_id="", collateral_type="jewellery", fees_myr=0.0),
+    ]
+    assert book.decoded("shop_id").tolist() == ["shop-b", "shop-a", ""]
+    assert book.arrays()["is_bar"].tolist() == [False, True, False]
+    # Rewriting in place replaces the old book
+    write_loan_book(path, LOANS[:1])
+    assert len(open_loan_book(path)) == 1
+
+
+def test_numeric_columns_are_memory_mapped_with_their_storage_dtypes(tmp_path):
+    book = write_loan_book(str(tmp_path / "book"), LOANS)
+    for name, kind in FIELDS.items():
+        arr = book.column(name)
+        if kind == "bytes":
+            assert arr.dtype.kind == "S"
+        else:
+            assert arr.dtype == np.dtype("<i4" if kind == "category" else kind)
+        assert isinstance(arr, np.memmap)
+    assert book.categories["collateral_type"] == ["bar", "jewellery"]
+
+
+def test_manifest_row_count_is_checked(tmp_path):
+    path = tmp_path / "book"
+    write_loan_book(str(path), LOANS)
+    manifest = json.loads((path / loan_book.MANIFEST).read_text())
+    (path / loan_book.MANIFEST).write_text(json.dumps(dict(manifest, rows=4)))
+    with pytest.raises(ValueError, match="manifest says 4"):
+        open_loan_book(str(path))
+    (path / loan_book.MANIFEST).write_text(json.dumps(dict(manifest, format="other")))
+    with pytest.raises(ValueError, match="not a loan book"):
+        open_loan_book(str(path))
+
+
+@pytest.mark.parametrize("field, value, message", [
+    ("principal_myr", 0.0, "principal_myr must be > 0"),
+    ("gold_weight_g", -1.0, "gold_weight_g must be > 0"),
+    ("purity", 499, "purity must be within 500-999"),
+    ("purity", 1000, "purity must be within 500-999"),
+    ("tenure_days", 0, "tenure_days must be >= 1"),
+])
+def test_validate_columns_names_the_first_bad_loan(field, value, message):
+    loans = [dict(LOANS[0]), dict(LOANS[1], **{field: value}), dict(LOANS[2], **{field: value})]
+    cols, _ = loan_book.columns_from_records(loans)
+    with pytest.raises(ValueError, match=f"{message}: 2 row\\(s\\), first loan_id SAG-2"):
+        validate_columns(cols)
+
+
+def test_invalid_book_is_not_written(tmp_path):
+    path = tmp_path / "book"
+    with pytest.raises(ValueError):
+        write_loan_book(str(path), [dict(LOANS[0], tenure_days=0)])
+    with pytest.raises(ValueError, match="non-numeric"):
+        write_loan_book(str(path), [dict(LOANS[0], principal_myr="lots")])
+    assert not path.exists()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import time
+
+import market_data
+from deadline import Deadline
+from test_gold_evaluator import _snapshot
+
+
+def test_pinned_snapshot_never_ages_out(evaluator, monkeypatch):
+    def no_fetch(*args, **kwargs):
+        raise AssertionError("a pinned snapshot must not be re-fetched")
+
+    monkeypatch.setattr(evaluator.module, "refresh_market_snapshot", no_fetch)
+    max_age = evaluator.cfg["MARKET_SNAPSHOT_MAX_AGE_SECONDS"]
+    market_data.adopt_snapshot(_snapshot(), age_s=max_age + 600, pin=True)
+    snap = evaluator.module.acquire_market_snapshot(evaluator.cfg, Deadline(5))
+    assert snap.snapshot_id == "mkt-20260101T000000Z-test"
+
+
+def test_refresh_does_not_replace_a_pinned_snapshot(evaluator):
+    market_data.adopt_snapshot(_snapshot(), age_s=1000, pin=True)
+    market_data._publish("live", {"gold_price_myr_per_g": 410.0}, time.monotonic())
+    assert market_data.current_snapshot(max_age_s=300).snapshot_id == "mkt-20260101T000000Z-test"
+    market_data.unpin_snapshot()
+    assert market_data.current_snapshot(max_age_s=300) is None
+
+
+def test_unpinned_snapshot_ages_out(evaluator):
+    market_data.adopt_snapshot(_snapshot(), age_s=1000)
+    assert market_data.current_snapshot(max_age_s=300) is None
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import montecarlo
+from montecarlo import margin_call_probability, simulate_margin_calls
+from scenarios import loans_to_arrays
+
+# 10 g of 999 gold at 100 MYR/g, no haircut: trigger = principal / (1000 × 0.85) × 100
+LOANS = loans_to_arrays([
+    {"principal_myr": 200, "gold_weight_g": 10.0, "purity": 999, "tenure_days": 90},   # trigger 23.5
+    {"principal_myr": 830, "gold_weight_g": 10.0, "purity": 999, "tenure_days": 90},   # trigger 97.6
+    {"principal_myr": 900, "gold_weight_g": 10.0, "purity": 999, "tenure_days": 30},   # already past it
+])
+
+
+def _simulate(**kw):
+    return simulate_margin_calls(LOANS, 100.0, 0.01, n_paths=2_000, haircut_bps=(0, 0),
+                                 margin_call_ltv=0.85, seed=7, **kw)
+
+
+def test_known_breach_probabilities():
+    p = _simulate(workers=1).breach_probability
+    assert p[0] == 0.0            # needs a 76% fall at 1% daily vol
+    # 2.4% below spot over 90 days: the continuous-barrier reflection formula
+    # 2·Φ(ln(0.976)/(0.01·√90)) gives 0.80; daily monitoring sits a little below
+    assert 0.72 < p[1] < 0.80
+    assert p[2] == 1.0
+
+
+def test_single_loan_helper_matches_deep_in_the_money():
+    assert margin_call_probability(200, 10.0, 999, 90, 100.0, 0.01, 0, 0.85, seed=1) == 0.0
+
+
+def test_same_seed_same_result_for_any_worker_count(monkeypatch):
+    # Force several chunks through a real process pool
+    monkeypatch.setattr(montecarlo, "CHUNK_CELLS", 90 * 300)
+    monkeypatch.setattr(montecarlo, "PARALLEL_MIN_CELLS", 0)
+    pools = []
+
+    class SpyPool(montecarlo.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs.get("max_workers"))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(montecarlo, "ProcessPoolExecutor", SpyPool)
+    serial = _simulate(workers=1)
+    parallel = _simulate(workers=3)
+    assert pools == [3]
+    np.testing.assert_array_equal(serial.breach_probability, parallel.breach_probability)
+    assert serial.expected_loss_myr == parallel.expected_loss_myr
+    assert serial.var_myr == parallel.var_myr
+    assert serial.expected_shortfall_myr == parallel.expected_shortfall_myr
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ollama_pool import OllamaPool, OllamaPoolError, get_pool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answers after server.delay_s; records when each POST arrived; GET /api/tags answers server.health."""
+
+    def do_POST(self):
+        self.server.arrivals.append(time.monotonic())
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.delay_s)
+        body = json.dumps({"message": {"content": f"Action: approve ({self.server.server_address[1]})"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_response(self.server.health)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _stub(delay_s: float = 0.0) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.delay_s, srv.health, srv.arrivals = delay_s, 200, []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def _url(srv: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{srv.server_address[1]}"
+
+
+def _kill(srv: ThreadingHTTPServer) -> None:
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def stubs():
+    servers = [_stub(), _stub()]
+    yield servers
+    for srv in servers:
+        if srv.socket.fileno() != -1:
+            _kill(srv)
+
+
+def test_fails_over_and_ejects_a_killed_node(stubs):
+    alive, dead = stubs
+    pool = OllamaPool([_url(dead), _url(alive)], eject_after_failures=2, eject_seconds=60)
+    _kill(dead)
+    for _ in range(4):
+        resp = pool.post("/api/chat", {"model": "stub"}, timeout=5)
+        assert resp.url.startswith(_url(alive))
+    stats = {s["url"]: s for s in pool.stats()}
+    assert stats[_url(dead)]["ejected"]
+    assert stats[_url(dead)]["failures"] == 2      # not tried again once ejected
+    assert not stats[_url(alive)]["ejected"]
+    pool.close()
+
+
+def test_health_check_ejects_and_readmits(stubs):
+    alive, dead = stubs
+    pool = OllamaPool([_url(alive), _url(dead)], health_timeout_s=0.5)
+    assert pool.check_health() == {_url(alive): True, _url(dead): True}
+    _kill(dead)
+    assert pool.check_health()[_url(dead)] is False
+    assert {s["url"]: s["ejected"] for s in pool.stats()} == {_url(alive): False, _url(dead): True}
+    pool.close()
+
+
+def test_all_nodes_down_raises(stubs):
+    for srv in stubs:
+        _kill(srv)
+    pool = OllamaPool([_url(s) for s in stubs])
+    with pytest.raises(OllamaPoolError):
+        pool.post("/api/chat", {"model": "stub"}, timeout=2)
+    pool.close()
+
+
+def test_get_pool_keys_on_options(stubs):
+    urls = [_url(s) for s in stubs]
+    plain = get_pool(urls)
+    assert get_pool(urls) is plain
+    hedged = get_pool(urls, hedge=True)
+    assert hedged is not plain and hedged.hedge and not plain.hedge
+    checked = get_pool(urls, health_interval_s=30.0)
+    assert checked._health_thread is not None and checked._health_thread.is_alive()
+    for pool in (plain, hedged, checked):
+        pool.close()
+
+
+@pytest.fixture
+def slow_and_fast():
+    servers = [_stub(delay_s=1.0), _stub()]
+    yield servers
+    for srv in servers:
+        _kill(srv)
+
+
+def test_hedge_goes_out_after_the_delay_and_the_fast_answer_wins(slow_and_fast):
+    slow, fast = slow_and_fast
+    pool = OllamaPool([_url(slow), _url(fast)], hedge=True, hedge_default_delay_s=0.2)
+    delay = pool.hedge_delay()
+    assert delay == 0.2                      # fewer than min_samples latencies: the default
+
+    started = time.monotonic()
+    resp = pool.post("/api/chat", {"model": "stub"}, timeout=5)
+    elapsed = time.monotonic() - started
+    assert resp.url.startswith(_url(fast))
+    assert len(slow.arrivals) == 1 and len(fast.arrivals) == 1
+    assert slow.arrivals[0] - started < delay                  # the primary went out first
+    assert fast.arrivals[0] - started >= delay                 # the duplicate only after the delay
+    assert elapsed < slow.delay_s
+    pool.close()
+
+
+def test_no_hedge_when_only_one_node_is_healthy(slow_and_fast):
+    slow, fast = slow_and_fast
+    fast.health = 503
+    pool = OllamaPool([_url(slow), _url(fast)], hedge=True, hedge_default_delay_s=0.2)
+    assert pool.check_health() == {_url(slow): True, _url(fast): False}
+
+    resp = pool.post("/api/chat", {"model": "stub"}, timeout=5)
+    assert resp.url.startswith(_url(slow))
+    assert fast.arrivals == []
+    pool.close()
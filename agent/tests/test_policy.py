@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import policy
+
+
+@pytest.fixture
+def policy_file(monkeypatch, tmp_path):
+    path = tmp_path / "policy.json"
+    monkeypatch.setattr(policy, "POLICY_FILE", str(path))
+    monkeypatch.setattr(policy, "_current", None)
+    monkeypatch.setattr(policy, "_file_stamp", None)
+
+    def write(values):
+        path.write_text(json.dumps({"version": "test-1", "values": values}))
+        return policy.reload(force=True)
+    return write
+
+
+def test_valid_file_is_swapped_in(policy_file):
+    pol = policy_file({"MAX_SAFE_LTV": 0.75, "RISK_LEVEL": {"VERY_LOW": 0.55}})
+    assert pol.version == "test-1"
+    assert pol.values["MAX_SAFE_LTV"] == 0.75 and pol.values["RISK_LEVEL"]["VERY_LOW"] == 0.55
+
+
+@pytest.mark.parametrize("values", [
+    {"MAX_SAFE_LTV": "high"},
+    {"MAX_SAFE_LTV": True},
+    {"BAR_HAIRCUT_BPS": -5},
+    {"MAX_SAFE_LTV": 0.9, "MARGIN_CALL_LTV": 0.85},
+    {"RISK_LEVEL": {"LOW": 0.5}},             # below VERY_LOW
+    {"RISK_LEVEL": {"EXTREME": 0.95}},
+    {"RISK_LEVEL": [0.6]},
+])
+def test_invalid_values_keep_the_previous_policy(policy_file, values):
+    good = policy_file({"MAX_SAFE_LTV": 0.75})
+    assert policy_file(values) is good
+    assert policy.current() is good
+
+
+def test_invalid_first_load_falls_back_to_the_builtin_policy(policy_file):
+    pol = policy_file({"TENURE_LIMIT_DAYS": 0})
+    assert pol.source == "builtin"
+    assert pol.values["TENURE_LIMIT_DAYS"] == policy.POLICY["TENURE_LIMIT_DAYS"]
+
+
+def test_id_depends_on_version_and_values_only():
+    first = policy.compile_policy(policy.POLICY)
+    later = policy.compile_policy(policy.POLICY, revision=7)   # e.g. another process, loaded later
+    assert first.id == later.id == f"{policy.VERSION}:{first.hash}"
+    assert policy.compile_policy(policy.POLICY, version="other").id != first.id
+    assert policy.compile_policy({**policy.POLICY, "MAX_SAFE_LTV": 0.7}).id != first.id
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from portfolio import Portfolio
+
+
+def _loan(loan_id, **overrides):
+    loan = {"loan_id": loan_id, "principal_myr": 4000, "gold_weight_g": 25.0, "purity": 916, "tenure_days": 90}
+    loan.update(overrides)
+    return loan
+
+
+def test_extend_writes_nothing_when_any_row_is_invalid():
+    p = Portfolio(capacity=4, price=400.0)
+    p.add(_loan("A"))
+    bad = _loan("C")
+    del bad["gold_weight_g"]
+    with pytest.raises(ValueError):
+        p.extend([_loan("B"), bad])
+    with pytest.raises(KeyError):
+        p.extend([_loan("D"), _loan("D")])
+    assert p.loan_ids == ["A"]
+    assert "B" not in p and "D" not in p
+
+
+def test_removed_slot_does_not_leak_into_the_next_add():
+    p = Portfolio(capacity=4, price=400.0)
+    p.extend([_loan("A"), _loan("B", is_bar=True, haircut_bps=100)])
+    p.remove("B")
+    assert p._cols["principal_myr"][1] == 0 and not p._cols["is_bar"][1]
+    view = p.add(_loan("C"))
+    assert view.is_bar is False
+    assert view.haircut_bps == p.jewellery_haircut_bps
+    with pytest.raises(ValueError):
+        p.add({"loan_id": "D", "principal_myr": 1000})
+    assert len(p) == 2
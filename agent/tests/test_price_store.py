@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+
+import numpy as np
+
+from price_store import PriceSeries
+
+
+def _writer(directory: str, worker: int, n: int) -> None:
+    series = PriceSeries(directory, "XAU/MYR_G")
+    for i in range(n):
+        # The price encodes its timestamp, so a mis-paired row is detectable
+        series.append(float(i) + worker / 10.0, ts=i)
+
+
+def test_concurrent_processes_keep_columns_paired(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(str(tmp_path), w, 300)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+
+    series = PriceSeries(str(tmp_path), "XAU/MYR_G")
+    ts, px = series.window()
+    assert os.path.getsize(series.ts_path) == os.path.getsize(series.px_path)
+    assert len(ts) > 0 and np.all(np.diff(ts) >= 0)
+    assert np.array_equal(np.floor(px).astype(np.int64), ts)
+
+
+def test_torn_append_is_repaired_before_the_next_one(tmp_path):
+    series = PriceSeries(str(tmp_path), "USD/MYR")
+    series.extend(np.array([1, 2, 3]), np.array([4.41, 4.42, 4.43]))
+    with open(series.ts_path, "ab") as f:          # crash between the two writes
+        f.write(np.array([4], dtype="<i8").tobytes())
+    assert series.append(4.45, ts=5)
+    ts, px = series.window()
+    assert ts.tolist() == [1, 2, 3, 5]
+    assert px.tolist() == [4.41, 4.42, 4.43, 4.45]
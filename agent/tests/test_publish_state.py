@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from publish_state import INPUT_TOPIC, OUTPUT_TOPIC, PUBLISH, PublishStateIndex
+
+
+@pytest.fixture
+def publisher(evaluator, monkeypatch):
+    """publish_evaluation() with dedup on an in-memory index and a recording topic sender."""
+    ge = evaluator.module
+    sent, failing = [], set()
+
+    def send(base_url, topic_id, message, key, timeout):
+        sent.append(topic_id)
+        return topic_id not in failing
+
+    index = PublishStateIndex(":memory:")
+    monkeypatch.setattr(ge, "PUBLISH_DEDUP", True)
+    monkeypatch.setattr(ge, "get_publish_state", lambda: index)
+    monkeypatch.setattr(ge, "send_to_hedera_topic", send)
+    cfg = dict(evaluator.cfg, INPUT_TOPIC_ID="0.0.1", OUTPUT_TOPIC_ID="0.0.2")
+    metrics = ge.RiskMetrics(gold_price_myr_per_g=400.0, purity_factor=0.916, haircut_bps=500, haircut_factor=0.95,
+                             collateral_value_myr=8702.0, principal_myr=4000.0, ltv=0.46, risk_level="VERY_LOW",
+                             max_safe_ltv=0.8, margin_call_ltv=0.85, vol_window_days=30)
+    rec = ge.LLMRecommendation(model="stub", rationale="Action: approve", action="approve")
+
+    def publish(eval_id="e1"):
+        return ge.publish_evaluation(cfg, "prompt", rec, metrics, loan_id="SAG-1", eval_id=eval_id)
+
+    publish.sent, publish.failing, publish.index = sent, failing, index
+    return publish
+
+
+def test_failed_output_send_is_retried_without_resending_the_input(publisher):
+    publisher.failing.add("0.0.2")
+    assert publisher("e1") == PUBLISH
+    assert publisher.sent == ["0.0.1", "0.0.2"]
+    publisher.failing.clear()
+    publisher.sent.clear()
+    assert publisher("e2") == PUBLISH
+    assert publisher.sent == ["0.0.2"]
+    publisher.sent.clear()
+    assert publisher("e3") == "skip" and publisher.sent == []
+
+
+def test_publish_state_errors_do_not_block_publishing(publisher, monkeypatch):
+    def broken(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(publisher.index, "decide", broken)
+    monkeypatch.setattr(publisher.index, "record", broken)
+    assert publisher() == PUBLISH
+    assert publisher.sent == ["0.0.1", "0.0.2"]
+
+
+def test_state_is_kept_per_topic_across_restarts(tmp_path):
+    path = str(tmp_path / "publish_state.sqlite")
+    state = {"risk_level": "LOW", "action": "approve", "policy_hash": "h", "digest": "d", "eval_id": "e0"}
+    PublishStateIndex(path).record("SAG-1", state, PUBLISH, topic=INPUT_TOPIC, now=1.0)
+    index = PublishStateIndex(path)
+    assert index.get("SAG-1", INPUT_TOPIC)["eval_id"] == "e0"
+    assert index.get("SAG-1", OUTPUT_TOPIC) is None
+    assert index.decide("SAG-1", state, topic=INPUT_TOPIC, now=2.0) == "skip"
+    assert index.decide("SAG-1", state, topic=OUTPUT_TOPIC, now=2.0) == PUBLISH
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import policy
+from rules import RISK_BANDS, compile_rules
+
+EDGE_LTVS = (0.59, 0.60, 0.69, 0.6901, 0.79, 0.85, 0.8501)
+ANOMALIES = (
+    None,
+    {"is_abnormal": True, "reason": "Price deviation 8.10% exceeds threshold 5.0%", "current_price": 400.0,
+     "yesterday_price": 370.0, "deviation_percent": 8.1, "threshold_percent": 5.0},
+    {"is_abnormal": False, "reason": "Price deviation 0.50% within threshold 5.0%", "current_price": 400.0,
+     "yesterday_price": 398.0, "deviation_percent": 0.5, "threshold_percent": 5.0},
+)
+HAIRCUT_BPS = 500
+
+
+# The hand-written rules the table replaced (gold_evaluator before the rule table), builtin policy.
+def _legacy_risk_level(ltv):
+    if ltv < 0.60:
+        return "VERY_LOW"
+    elif ltv <= 0.69:
+        return "LOW"
+    elif ltv <= 0.79:
+        return "MEDIUM"
+    elif ltv <= 0.85:
+        return "HIGH"
+    return "VERY_HIGH"
+
+
+def _legacy_explanations(ltv, vol, tenure_days, anomaly):
+    p = policy.POLICY
+    max_safe, margin_call, vol_thr, tenure_limit = (p["MAX_SAFE_LTV"], p["MARGIN_CALL_LTV"],
+                                                    p["VOL_THRESHOLD"], p["TENURE_LIMIT_DAYS"])
+    level = _legacy_risk_level(ltv)
+    severity = {"VERY_LOW": "info", "LOW": "info", "MEDIUM": "warn", "HIGH": "warn", "VERY_HIGH": "critical"}
+    ranges = {"VERY_LOW": "< 60%", "LOW": "between 61-69%", "MEDIUM": "between 70-79%",
+              "HIGH": "between 80-85%", "VERY_HIGH": "> 85%"}
+    hits = [(f"RISK_LEVEL_{level}", severity[level], f"Risk level {level} (LTV {ltv:.2%} {ranges[level]})",
+             {"ltv": ltv, "risk_level": level})]
+    if ltv >= margin_call:
+        hits.append(("LTV_CRITICAL", "critical", f"LTV {ltv:.2f} ≥ margin-call threshold {margin_call:.2f}.",
+                     {"ltv": ltv, "margin_call_ltv": margin_call}))
+    elif ltv > max_safe:
+        hits.append(("LTV_ELEVATED", "warn", f"LTV {ltv:.2f} above safe limit {max_safe:.2f}.",
+                     {"ltv": ltv, "max_safe_ltv": max_safe}))
+    else:
+        hits.append(("LTV_OK", "info", f"LTV {ltv:.2f} within safe limit {max_safe:.2f}.",
+                     {"ltv": ltv, "max_safe_ltv": max_safe}))
+    hits.append(("HAIRCUT_APPLIED", "info", f"Applied haircut {HAIRCUT_BPS} bps.", {"haircut_bps": HAIRCUT_BPS}))
+    if vol is not None:
+        if vol >= vol_thr:
+            hits.append(("VOL_ELEVATED", "warn", f"30d volatility {vol:.2%} ≥ policy threshold {vol_thr:.2%}.",
+                         {"volatility_30d": vol, "policy_vol_threshold": vol_thr}))
+        else:
+            hits.append(("VOL_NORMAL", "info", f"30d volatility {vol:.2%} below policy threshold {vol_thr:.2%}.",
+                         {"volatility_30d": vol, "policy_vol_threshold": vol_thr}))
+    if tenure_days >= tenure_limit:
+        hits.append(("TENURE_LONG", "warn", f"Tenure {tenure_days}d ≥ policy limit {tenure_limit}d.",
+                     {"tenure_days": tenure_days, "policy_tenure_limit_days": tenure_limit}))
+    else:
+        hits.append(("TENURE_NORMAL", "info", f"Tenure {tenure_days}d within policy limit {tenure_limit}d.",
+                     {"tenure_days": tenure_days, "policy_tenure_limit_days": tenure_limit}))
+    if anomaly:
+        details = {k: anomaly[k] for k in ("current_price", "yesterday_price", "deviation_percent",
+                                            "threshold_percent")}
+        if anomaly["is_abnormal"]:
+            hits.append(("PRICE_ABNORMAL", "critical",
+                         f"Gold price shows abnormal deviation: {anomaly['reason']}", details))
+        else:
+            hits.append(("PRICE_NORMAL", "info", f"Gold price within normal range: {anomaly['reason']}", details))
+    return hits
+
+
+def _values(ltv, vol, tenure_days, anomaly):
+    values = {"ltv": ltv, "gold_volatility": vol, "tenure_days": tenure_days, "haircut_bps": HAIRCUT_BPS}
+    if anomaly:
+        values.update(anomaly, price_abnormal=1 if anomaly["is_abnormal"] else 0)
+    return values
+
+
+@pytest.fixture
+def rules():
+    return compile_rules(policy.POLICY)
+
+
+CASES = list(itertools.product(EDGE_LTVS, (None, 0.01, 0.05, 0.08), (179, 180), ANOMALIES))
+
+
+@pytest.mark.parametrize("ltv", EDGE_LTVS)
+def test_risk_bands_match_the_legacy_thresholds(rules, ltv):
+    assert rules.risk_level(ltv) == _legacy_risk_level(ltv)
+
+
+@pytest.mark.parametrize("ltv,vol,tenure_days,anomaly", CASES)
+def test_mask_and_render_match_the_legacy_rules(rules, ltv, vol, tenure_days, anomaly):
+    values = _values(ltv, vol, tenure_days, anomaly)
+    mask = rules.evaluate_one(**values)
+    rendered = rules.render(mask, values)
+    legacy = _legacy_explanations(ltv, vol, tenure_days, anomaly)
+    assert rules.decode(mask) == [code for code, *_ in legacy]
+    assert [(h["code"], h["severity"], h["message"]) for h in rendered] == [hit[:3] for hit in legacy]
+    for hit, (_, _, _, details) in zip(rendered, legacy):
+        # the table adds z_score / roc_percent to the PRICE_* details; the legacy keys are unchanged
+        assert {k: hit["details"][k] for k in details} == details
+
+
+@pytest.mark.parametrize("vol", [None, float("nan")])
+@pytest.mark.parametrize("abnormal", [None, float("nan")])
+def test_unknown_volatility_and_anomaly_fire_no_vol_or_price_rule(rules, vol, abnormal):
+    mask = rules.evaluate_one(ltv=0.7, gold_volatility=vol, tenure_days=90, price_abnormal=abnormal)
+    codes = rules.decode(mask)
+    assert not [c for c in codes if c.startswith(("VOL_", "PRICE_"))]
+    assert codes == ["RISK_LEVEL_MEDIUM", "LTV_OK", "HAIRCUT_APPLIED", "TENURE_NORMAL"]
+
+
+def test_array_evaluation_agrees_with_scalar(rules):
+    ltv = np.array([c[0] for c in CASES])
+    vol = np.array([np.nan if c[1] is None else c[1] for c in CASES])
+    tenure = np.array([c[2] for c in CASES])
+    abnormal = np.array([np.nan if c[3] is None else float(c[3]["is_abnormal"]) for c in CASES])
+    masks = rules.evaluate({"ltv": ltv, "gold_volatility": vol, "tenure_days": tenure, "price_abnormal": abnormal})
+    scalar = [rules.evaluate_one(**_values(*case)) for case in CASES]
+    assert masks.tolist() == scalar
+    counts = rules.counts(masks)
+    assert sum(counts[f"RISK_LEVEL_{b}"] for b in RISK_BANDS) == len(CASES)
+    assert counts["VOL_ELEVATED"] + counts["VOL_NORMAL"] == sum(not math.isnan(v) for v in vol)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import policy
+from scenarios import ScenarioGrid, loans_to_arrays, run_scenarios
+
+# 10 g of 999 gold at 100 MYR/g with no haircut: 1000 MYR of collateral each
+LOANS = [
+    {"principal_myr": 500, "gold_weight_g": 10.0, "purity": 999, "tenure_days": 90},
+    {"principal_myr": 800, "gold_weight_g": 10.0, "purity": 999, "tenure_days": 90},
+]
+
+
+@pytest.fixture(autouse=True)
+def builtin_policy(monkeypatch):
+    monkeypatch.setattr(policy, "POLICY_FILE", "")
+    monkeypatch.setattr(policy, "_current", None)
+
+
+def _run(**grid):
+    grid = dict(dict(gold_shocks=(-0.2, 0.0, 0.2), jewellery_haircut_bps=(0,),
+                     max_safe_ltv=(0.80,), margin_call_ltv=(0.85,)), **grid)
+    return run_scenarios(loans_to_arrays(LOANS), ScenarioGrid(**grid), 100.0, workers=1)
+
+
+def test_two_loans_under_three_gold_shocks():
+    m = _run().metrics
+    # LTVs: -20% → 0.625, 1.0; unshocked → 0.5, 0.8; +20% → 0.417, 0.667
+    np.testing.assert_allclose(m["gold_price_myr_per_g"], [80.0, 100.0, 120.0])
+    np.testing.assert_allclose(m["max_ltv"], [1.0, 0.8, 800 / 1200])
+    np.testing.assert_allclose(m["book_ltv"], [1300 / 1600, 1300 / 2000, 1300 / 2400])
+    assert m["margin_calls"].tolist() == [1, 0, 0]
+    assert m["above_max_safe"].tolist() == [1, 0, 0]         # 0.8 is not above MAX_SAFE_LTV
+    np.testing.assert_allclose(m["shortfall_to_safe_myr"], [800 - 0.8 * 800, 0, 0])
+    np.testing.assert_allclose(m["negative_equity_myr"], [0, 0, 0])     # LTV 1.0 is break-even
+    assert m["band_very_low"].tolist() == [0, 1, 1]
+    assert m["band_low"].tolist() == [1, 0, 1]
+    assert m["band_high"].tolist() == [0, 1, 0]
+    assert m["band_very_high"].tolist() == [1, 0, 0]
+
+
+def test_policy_variations_and_haircuts_multiply_the_grid():
+    result = _run(jewellery_haircut_bps=(0, 2000), margin_call_ltv=(0.85, 0.60))
+    assert len(result.metrics["margin_calls"]) == 3 * 2 * 2
+    rows = {(r["gold_shock"], r["jewellery_haircut_bps"], r["margin_call_ltv"]): r for r in result.to_rows()}
+    # unshocked, 20% haircut: LTVs 0.625 and 1.0
+    assert rows[(0.0, 2000.0, 0.85)]["margin_calls"] == 1
+    assert rows[(0.0, 2000.0, 0.60)]["margin_calls"] == 2
+    assert rows[(0.2, 0.0, 0.60)]["margin_calls"] == 1
+    worst = result.worst()
+    assert (worst["gold_shock"], worst["jewellery_haircut_bps"]) == (-0.2, 2000.0)
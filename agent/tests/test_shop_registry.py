@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import time
+
+import pytest
+
+import shop_registry
+from shop_registry import ShopRegistry
+
+
+class _Response:
+    status_code = 200
+    headers = {"ETag": '"v2"'}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"version": "2", "shops": {"SHOP-001": "B"}}
+
+
+@pytest.fixture
+def requests_made(monkeypatch):
+    calls = []
+
+    def request(name, method, url, **kwargs):
+        calls.append(url)
+        return _Response()
+
+    monkeypatch.setattr(shop_registry, "guarded_request", request)
+    return calls
+
+
+def _persist(path, age_s):
+    path.write_text(json.dumps({"version": "1", "shops": {"SHOP-001": "A"}}))
+    stamp = time.time() - age_s
+    os.utime(path, (stamp, stamp))
+
+
+def test_fresh_persisted_copy_is_used_without_a_backend_load(tmp_path, requests_made):
+    path = tmp_path / "shops.json"
+    _persist(path, age_s=60)
+    registry = ShopRegistry(url="http://registry.invalid/ratings", path=str(path), ttl_s=3600).ensure_loaded()
+    assert registry.rating("SHOP-001") == "A"
+    assert registry.source == "file"
+    assert requests_made == []
+
+
+def test_expired_persisted_copy_is_reloaded_and_rewritten(tmp_path, requests_made):
+    path = tmp_path / "shops.json"
+    _persist(path, age_s=7200)
+    registry = ShopRegistry(url="http://registry.invalid/ratings", path=str(path), ttl_s=3600).ensure_loaded()
+    assert requests_made == ["http://registry.invalid/ratings"]
+    assert registry.rating("SHOP-001") == "B"
+    assert registry.file_age() < 60
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from deadline import Deadline
+from market_data import adopt_snapshot
+from singleflight import SingleFlight, WaitTimeout
+from test_gold_evaluator import LOAN, _snapshot
+
+
+def test_waiter_timeout_leaves_the_leader_running():
+    group, started, release = SingleFlight("test"), threading.Event(), threading.Event()
+
+    def call():
+        started.set()
+        return release.wait(5)
+
+    leader = threading.Thread(target=group.do, args=("k", call))
+    leader.start()
+    assert started.wait(5)
+    with pytest.raises(WaitTimeout):
+        group.do("k", lambda: "not run", timeout=0.05)
+    release.set()
+    leader.join()
+    assert group.in_flight() == 0
+
+
+def test_waiter_degrades_instead_of_raising_when_its_deadline_runs_out(evaluator, monkeypatch):
+    ge, release, llm_started = evaluator.module, threading.Event(), threading.Event()
+
+    def slow_llm(**kwargs):
+        llm_started.set()
+        release.wait(5)
+        return ge.LLMRecommendation(model="stub", rationale="Action: approve", action="approve")
+
+    monkeypatch.setattr(ge, "build_recommendation_with_llm", slow_llm)
+    adopt_snapshot(_snapshot())
+    leader = threading.Thread(target=ge.evaluate_loan, args=(ge.LoanInput(**LOAN), evaluator.cfg, evaluator.tracer))
+    leader.start()
+    try:
+        assert llm_started.wait(5)
+        out = ge.evaluate_loan(ge.LoanInput(**LOAN), evaluator.cfg, evaluator.tracer, Deadline(0.2))
+        assert out.recommendation.model == "rule-based"
+        assert "llm:rule_based" in out.degraded
+    finally:
+        release.set()
+        leader.join()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+import sources
+from deadline import Deadline
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Every value passed to remember_market_data / record_price, with an empty market cache."""
+    calls = []
+    monkeypatch.setattr(sources, "_market_cache", {})
+    monkeypatch.setattr(sources, "_market_cache_loaded", True)
+    monkeypatch.setattr(sources, "_consensus", {})
+    monkeypatch.setattr(sources, "remember_market_data", lambda key, value: calls.append((key, value)))
+    monkeypatch.setattr(sources, "record_price", lambda symbol, value: calls.append((symbol, value)))
+    return calls
+
+
+def test_failed_providers_raise_instead_of_returning_the_stub(monkeypatch, recorded):
+    # the "file" provider with no feed on disk
+    monkeypatch.setenv("GOLD_PRICE_PROVIDERS", "file")
+    monkeypatch.setenv("FX_PROVIDERS", "file")
+    with pytest.raises(RuntimeError):
+        sources.get_gold_price_usd(timeout=1)
+    with pytest.raises(RuntimeError):
+        sources.get_fx_rate("USD/MYR", timeout=1)
+    assert recorded == []
+
+
+def test_stub_provider_values_are_not_recorded(monkeypatch, recorded):
+    monkeypatch.setenv("GOLD_PRICE_PROVIDERS", "stub")
+    monkeypatch.setenv("FX_PROVIDERS", "stub")
+    usd = sources.get_gold_price_usd(timeout=1)
+    fx = sources.get_fx_rate("USD/MYR", timeout=1)
+    assert usd == sources.STUB_GOLD_USD_OZ
+    assert sources.gold_price_myr_from(usd, fx) > 0
+    assert recorded == []
+
+
+def test_live_provider_values_are_recorded(monkeypatch, recorded):
+    monkeypatch.setenv("GOLD_PRICE_PROVIDERS", "file")
+    monkeypatch.setenv("FX_PROVIDERS", "file")
+    os.makedirs("data", exist_ok=True)
+    with open(sources.PRICE_FEED_FILE, "w") as f:
+        json.dump({"XAU/USD": 2650.0, "USD/MYR": 4.5}, f)
+    myr = sources.gold_price_myr_from(sources.get_gold_price_usd(timeout=1), sources.get_fx_rate("USD/MYR", timeout=1))
+    assert ("gold_price_myr", myr) in recorded
+    assert ("XAU/USD", 2650.0) in recorded and ("fx:USD/MYR", 4.5) in recorded
+
+
+def test_snapshot_falls_back_to_the_cache_when_every_provider_fails(monkeypatch, evaluator, recorded):
+    monkeypatch.setenv("GOLD_PRICE_PROVIDERS", "file")
+    sources._market_cache["gold_price_myr"] = {"value": 401.5, "fetched_at": "2026-01-01T00:00:00+00:00"}
+    deadline = Deadline(5)
+    snap = evaluator.module.acquire_market_snapshot(evaluator.cfg, deadline)
+    assert snap.source == "cache"
+    assert snap.gold_price_myr_per_g == 401.5
+    assert "price:cached" in deadline.degraded
+    assert recorded == []
+
+
+def test_sag_record_maps_fineness_and_owner(evaluator):
+    # a record as stored by the backend (sag.model.ts SagSchema)
+    record = {
+        "sagId": "7d3c1f2e-0000-4000-8000-000000000001", "sagName": "Gelang 22K", "status": "active",
+        "originalOwner": "acct-pawnshop-17", "certNo": "CERT-17",
+        "sagProperties": {
+            "assetType": "jewellery", "karat": 22, "purity": 916, "weightG": 25.0, "valuation": 9500,
+            "enableMinting": True, "mintShare": 100, "soldShare": 0, "investorFinancingType": "fixed",
+            "investorRoiPercentage": 8, "investorRoiFixedAmount": 0, "currency": "MYR",
+            "loanPercentage": 70, "loan": 4000, "pawnerInterestP": 2, "tenorM": 6,
+        },
+    }
+    details = sources.map_loan_details(record["sagId"], record)
+    assert details["purity"] == 916
+    assert details["shop_id"] == "acct-pawnshop-17"
+    assert details["tenure_days"] == 180
+    loan = evaluator.module.LoanInput(**details)
+    assert loan.purity == 916
+
+    del record["sagProperties"]["purity"], record["originalOwner"]
+    details = sources.map_loan_details(record["sagId"], record)
+    assert details["purity"] == 916 and details["shop_id"] is None
+
+
+def test_yesterday_price_is_none_without_stored_history(monkeypatch, recorded, tmp_path):
+    from price_store import PriceStore
+
+    store = PriceStore(str(tmp_path / "prices"))
+    monkeypatch.setattr(sources, "get_price_store", lambda: store)
+    assert sources.get_yesterday_gold_price_myr() is None
+    assert recorded == []
+
+    yesterday = sources.datetime.now(sources.timezone.utc) - sources.timedelta(days=1)
+    store.record(sources.GOLD_MYR_G, 402.345, ts=yesterday.timestamp())
+    assert sources.get_yesterday_gold_price_myr() == 402.35
+    assert recorded == [("yesterday_gold_price_myr", 402.35)]
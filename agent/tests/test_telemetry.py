@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import telemetry
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    telemetry.reset()
+    yield
+    telemetry.reset()
+
+
+def test_exports_from_several_workers_merge_into_one_summary():
+    worker_states = []
+    for samples in ([10.0, 20.0], [30.0, 40.0, 50.0]):
+        for v in samples:
+            telemetry.observe("llm.tokens_per_s", v, model="m")
+        telemetry.inc("batch.evaluated", len(samples))
+        worker_states.append(telemetry.export(reset=True))
+    assert telemetry.snapshot() == {"counters": [], "gauges": [], "histograms": []}
+
+    for state in worker_states:
+        telemetry.merge(json.loads(json.dumps(state)))     # as if pickled across processes
+    snap = telemetry.snapshot()
+    assert snap["counters"] == [{"name": "batch.evaluated", "labels": {}, "value": 5.0}]
+    hist = snap["histograms"][0]
+    assert (hist["name"], hist["labels"]) == ("llm.tokens_per_s", {"model": "m"})
+    assert (hist["count"], hist["mean"], hist["min"], hist["max"], hist["p50"]) == (5, 30.0, 10.0, 50.0, 30.0)
+    assert "histogram llm.tokens_per_s{model=m} count=5" in telemetry.summary_report()
+
+
+def test_export_without_reset_keeps_the_metrics():
+    telemetry.observe("llm.load_ms", 5.0)
+    telemetry.export()
+    assert telemetry.snapshot()["histograms"][0]["count"] == 1
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import json
+
+import sources
+import volatility
+from volatility import VolatilityEngine
+
+DAY = 86400.0
+
+
+def _feed(engine: VolatilityEngine, symbol: str, days: int, start: float = 0.0) -> None:
+    for d in range(days):
+        engine.update(symbol, start + d * DAY, 300.0 + (d % 3))
+
+
+def test_concurrent_saves_merge_instead_of_overwriting(tmp_path, monkeypatch):
+    monkeypatch.setattr(VolatilityEngine, "_warm_start", lambda self, symbol, sv: None)
+    path = str(tmp_path / "volatility.json")
+    a, b = VolatilityEngine(path), VolatilityEngine(path)
+
+    _feed(a, "XAU/MYR_G", 12, start=10 * DAY)
+    a.save()
+    _feed(b, "XAU/MYR_G", 3)        # older ticks of the same symbol
+    _feed(b, "USD/MYR", 3)
+    b.save()
+
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert set(saved) == {"XAU/MYR_G", "USD/MYR"}
+    assert saved["XAU/MYR_G"]["last_ts"] == 21 * DAY      # a's newer state survived b's save
+    assert b.volatility("XAU/MYR_G", 10) == a.volatility("XAU/MYR_G", 10) is not None
+    assert [n for n in tmp_path.iterdir() if n.name.endswith(".tmp")] == []
+
+
+def test_fallback_volatility_until_history_exists(monkeypatch):
+    monkeypatch.setattr(sources, "get_volatility_engine", lambda: VolatilityEngine(None))
+    monkeypatch.setattr(VolatilityEngine, "_warm_start", lambda self, symbol, sv: None)
+    monkeypatch.delenv("VOL_FALLBACK", raising=False)
+    assert sources.get_volatility("XAU/MYR", window=30) == 0.03
+    assert sources.get_volatility_estimate("XAU/MYR", window=30) == (0.03, True)
+    monkeypatch.setenv("VOL_FALLBACK", "")
+    assert sources.get_volatility("XAU/MYR", window=30) is None
+    assert sources.get_volatility_estimate("XAU/MYR", window=30) == (None, False)
+
+
+def test_window_reports_nothing_until_half_full(monkeypatch):
+    monkeypatch.setattr(VolatilityEngine, "_warm_start", lambda self, symbol, sv: None)
+    engine = VolatilityEngine(None)
+    _feed(engine, "XAU/MYR_G", 15)       # 14 days closed → 13 daily returns
+    assert engine.volatility("XAU/MYR_G", 30) is None
+    assert engine.volatility("XAU/MYR_G", 30, kind="range") is None
+    assert engine.volatility("XAU/MYR_G", 10) is not None
+    _feed(engine, "XAU/MYR_G", 2, start=15 * DAY)
+    assert engine.volatility("XAU/MYR_G", 30) is not None     # 15 returns = half of 30
+
+    monkeypatch.setattr(volatility, "VOL_MIN_SAMPLES", "20")
+    assert engine.volatility("XAU/MYR_G", 30) is None
+    monkeypatch.setattr(sources, "get_volatility_engine", lambda: engine)
+    monkeypatch.setenv("VOL_FALLBACK", "")
+    assert sources.get_volatility("XAU/MYR", window=30) is None
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+volatility.py
+
+Streaming volatility engine for gold (and any other priced symbol).
+
+Every price tick updates, in O(1):
+  • rolling standard deviation of daily log returns for several windows
+    (ring buffer + running sum / sum of squares)
+  • EWMA volatility of daily returns (RiskMetrics-style, λ = 0.94)
+  • Parkinson high/low range estimator over daily ranges
+  • rolling standard deviation of tick-to-tick (intraday) log returns
+
+Daily returns are taken close-to-close on UTC calendar days: the first tick
+of a new day closes the previous one. Volatility is reported as a fraction
+(0.03 = 3% standard deviation of daily returns), matching VOL_THRESHOLD.
+A window reports nothing (None) until it holds at least min_samples(window)
+values (VOL_MIN_SAMPLES, default half the window), so a "30-day" figure is
+never computed from two or three days of history.
+
+State is kept per symbol and persisted to VOL_STATE_FILE (JSON) when a day
+closes and at interpreter exit; a symbol with no saved state is warmed up
+from the local price store. Saves hold an exclusive flock on
+VOL_STATE_FILE.lock, merge with the file (per symbol, the state that has
+seen the latest tick wins, in memory too) and replace it atomically, so
+concurrent processes do not overwrite each other's newer state.
+"""
+
+import atexit
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:     # Windows: single-process saves only
+    fcntl = None
+
+VOL_STATE_FILE = os.getenv("VOL_STATE_FILE", "data/volatility.json")
+VOL_MIN_SAMPLES = os.getenv("VOL_MIN_SAMPLES", "")    # empty = half the window
+DEFAULT_DAILY_WINDOWS = (10, 30, 90)
+DEFAULT_INTRADAY_WINDOWS = (60,)
+EWMA_LAMBDA = 0.94
+RETURN_HISTORY = 252  # daily returns retained so new windows can be back-filled
+
+_PARKINSON_K = 1.0 / (4.0 * math.log(2.0))
+
+
+def min_samples(window: int) -> int:
+    """Values a window must hold before it reports a volatility (2..window)."""
+    n = int(VOL_MIN_SAMPLES) if VOL_MIN_SAMPLES else window // 2
+    return max(2, min(n, window))
+
+
+# ------------------------------------------------------------------------------
+# Rolling statistics
+# ------------------------------------------------------------------------------
+class RollingWindow:
+    """
+    Fixed-size window with O(1) push and O(1) mean/std.
+
+    The running sums are recomputed from the buffer once per full rotation so
+    floating-point drift cannot accumulate.
+    """
+
+    __slots__ = ("size", "values", "pos", "count", "total", "total_sq")
+
+    def __init__(self, size: int):
+        if size < 2:
+            raise ValueError("RollingWindow size must be at least 2")
+        self.size = size
+        self.values: List[float] = [0.0] * size
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, x: float) -> None:
+        if self.count == self.size:
+            old = self.values[self.pos]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.pos] = x
+        self.total += x
+        self.total_sq += x * x
+        self.pos = (self.pos + 1) % self.size
+        if self.pos == 0 and self.count == self.size:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def std(self) -> Optional[float]:
+        """Sample standard deviation, or None with fewer than two values."""
+        n = self.count
+        if n < 2:
+            return None
+        var = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def ordered(self) -> List[float]:
+        """Values oldest → newest."""
+        if self.count < self.size:
+            return self.values[:self.count]
+        return self.values[self.pos:] + self.values[:self.pos]
+
+    @classmethod
+    def from_values(cls, size: int, values: Iterable[float]) -> "RollingWindow":
+        w = cls(size)
+        for v in values:
+            w.push(v)
+        return w
+
+
+# ------------------------------------------------------------------------------
+# Per-symbol state
+# ------------------------------------------------------------------------------
+class SymbolVolatility:
+    def __init__(self, daily_windows: Iterable[int] = DEFAULT_DAILY_WINDOWS,
+                 intraday_windows: Iterable[int] = DEFAULT_INTRADAY_WINDOWS):
+        self.daily: Dict[int, RollingWindow] = {w: RollingWindow(w) for w in daily_windows}
+        self.intraday: Dict[int, RollingWindow] = {w: RollingWindow(w) for w in intraday_windows}
+        self.range_sq: Dict[int, RollingWindow] = {w: RollingWindow(w) for w in daily_windows}
+        self.returns: deque = deque(maxlen=RETURN_HISTORY)
+        self.ranges: deque = deque(maxlen=RETURN_HISTORY)
+        self.ewma_var: Optional[float] = None
+        self.day: Optional[str] = None
+        self.day_high = 0.0
+        self.day_low = 0.0
+        self.last_price: Optional[float] = None
+        self.last_ts = 0.0
+        self.prev_close: Optional[float] = None
+
+    def update(self, ts: float, price: float) -> bool:
+        """Consume one tick; returns True if it closed a day."""
+        if price <= 0 or ts < self.last_ts:
+            return False
+        day = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+        closed = False
+
+        if self.last_price is not None:
+            r = math.log(price / self.last_price)
+            for w in self.intraday.values():
+                w.push(r)
+
+        if self.day is not None and day != self.day:
+            self._close_day()
+            closed = True
+        if day != self.day:
+            self.day, self.day_high, self.day_low = day, price, price
+        else:
+            self.day_high = max(self.day_high, price)
+            self.day_low = min(self.day_low, price)
+        self.last_price, self.last_ts = price, ts
+        return closed
+
+    def _close_day(self) -> None:
+        close = self.last_price
+        if self.prev_close:
+            r = math.log(close / self.prev_close)
+            self.returns.append(r)
+            for w in self.daily.values():
+                w.push(r)
+            self.ewma_var = r * r if self.ewma_var is None else (
+                EWMA_LAMBDA * self.ewma_var + (1.0 - EWMA_LAMBDA) * r * r)
+        if self.day_low > 0:
+            hl = math.log(self.day_high / self.day_low) ** 2
+            self.ranges.append(hl)
+            for w in self.range_sq.values():
+                w.push(hl)
+        self.prev_close = close
+
+    def ensure_window(self, window: int) -> None:
+        """Add a daily window on demand, back-filled from retained history."""
+        if window not in self.daily:
+            self.daily[window] = RollingWindow.from_values(window, list(self.returns)[-window:])
+            self.range_sq[window] = RollingWindow.from_values(window, list(self.ranges)[-window:])
+
+    def volatility(self, window: int, kind: str = "rolling") -> Optional[float]:
+        """None until the window holds min_samples(window) values (returns, ranges or ticks)."""
+        need = min_samples(window)
+        if kind == "rolling":
+            self.ensure_window(window)
+            w = self.daily[window]
+            return w.std() if w.count >= need else None
+        if kind == "ewma":
+            return math.sqrt(self.ewma_var) if self.ewma_var is not None and len(self.returns) >= need else None
+        if kind == "range":
+            self.ensure_window(window)
+            w = self.range_sq[window]
+            return math.sqrt(_PARKINSON_K * w.mean()) if w.count >= need else None
+        if kind == "intraday":
+            w = self.intraday.get(window)
+            return w.std() if w and w.count >= need else None
+        raise ValueError(f"Unknown volatility kind '{kind}'")
+
+    # -- persistence -----------------------------------------------------------
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "daily_windows": sorted(self.daily),
+            "intraday": {str(w): win.ordered() for w, win in self.intraday.items()},
+            "returns": list(self.returns),
+            "ranges": list(self.ranges),
+            "ewma_var": self.ewma_var,
+            "day": self.day,
+            "day_high": self.day_high,
+            "day_low": self.day_low,
+            "last_price": self.last_price,
+            "last_ts": self.last_ts,
+            "prev_close": self.prev_close,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SymbolVolatility":
+        sv = cls(daily_windows=(), intraday_windows=())
+        sv.returns.extend(state.get("returns", []))
+        sv.ranges.extend(state.get("ranges", []))
+        for w in state.get("daily_windows", DEFAULT_DAILY_WINDOWS):
+            sv.ensure_window(int(w))
+        for w, values in state.get("intraday", {}).items():
+            sv.intraday[int(w)] = RollingWindow.from_values(int(w), values)
+        sv.ewma_var = state.get("ewma_var")
+        sv.day = state.get("day")
+        sv.day_high = state.get("day_high", 0.0)
+        sv.day_low = state.get("day_low", 0.0)
+        sv.last_price = state.get("last_price")
+        sv.last_ts = state.get("last_ts", 0.0)
+        sv.prev_close = state.get("prev_close")
+        return sv
+
+
+# ------------------------------------------------------------------------------
+# Engine
+# ------------------------------------------------------------------------------
+class VolatilityEngine:
+    def __init__(self, state_file: Optional[str] = VOL_STATE_FILE):
+        self.state_file = state_file
+        self._symbols: Dict[str, SymbolVolatility] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def _get(self, symbol: str) -> SymbolVolatility:
+        sv = self._symbols.get(symbol)
+        if sv is None:
+            sv = self._symbols[symbol] = SymbolVolatility()
+            self._warm_start(symbol, sv)
+        return sv
+
+    def _warm_start(self, symbol: str, sv: SymbolVolatility) -> None:
+        """Replay the local price history for a symbol seen for the first time."""
+        try:
+            from price_store import get_price_store
+            ts, px = get_price_store().series(symbol).window()
+        except (ImportError, OSError, ValueError):
+            return
+        for t, p in zip(ts.tolist(), px.tolist()):
+            sv.update(t, p)
+        self._dirty = self._dirty or bool(len(ts))
+
+    def update(self, symbol: str, ts: float, price: float) -> None:
+        with self._lock:
+            closed = self._get(symbol).update(ts, price)
+            self._dirty = True
+        if closed:
+            self.save()
+
+    def volatility(self, symbol: str, window: int = 30, kind: str = "rolling") -> Optional[float]:
+        with self._lock:
+            return self._get(symbol).volatility(window, kind)
+
+    def _read_file(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return raw if isinstance(raw, dict) else {}
+
+    @contextlib.contextmanager
+    def _file_locked(self) -> Iterator[None]:
+        fd = os.open(f"{self.state_file}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)    # releases the flock
+
+    def load(self) -> None:
+        if not self.state_file:
+            return
+        raw = self._read_file()
+        with self._lock:
+            self._symbols = {sym: SymbolVolatility.from_state(st) for sym, st in raw.items()}
+
+    def save(self) -> None:
+        """Merge with VOL_STATE_FILE under its flock and replace it atomically (best effort)."""
+        if not self.state_file:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        directory = os.path.dirname(self.state_file) or "."
+        tmp = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with self._file_locked():
+                on_disk = self._read_file()
+                with self._lock:
+                    for sym, state in on_disk.items():
+                        mine = self._symbols.get(sym)
+                        if mine is None or float(state.get("last_ts") or 0.0) > mine.last_ts:
+                            self._symbols[sym] = SymbolVolatility.from_state(state)
+                    payload = {sym: sv.to_state() for sym, sv in self._symbols.items()}
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=".volatility.",
+                                                 suffix=".tmp", delete=False) as f:
+                    tmp = f.name
+                    json.dump(payload, f)
+                os.replace(tmp, self.state_file)
+                tmp = None
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[WARN] Could not persist volatility state: {e}", file=sys.stderr)
+        finally:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+
+_engine: Optional[VolatilityEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_volatility_engine() -> VolatilityEngine:
+    """Process-wide engine; state is saved again at interpreter exit."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = VolatilityEngine()
+            atexit.register(_engine.save)
+        return _engine
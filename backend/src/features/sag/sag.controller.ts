@@ -23,7 +23,8 @@ export const createSagController = async (req: Request, res: Response) => {
             "principal_myr": sagData.sagProperties.loan,
             "gold_weight_g": sagData.sagProperties.weightG,
             "purity": sagData.sagProperties.purity,
-            "tenure_days": sagData.sagProperties.tenorM * 30
+            "tenure_days": sagData.sagProperties.tenorM * 30,
+            "shop_id": userInfo?.accountId || undefined
         };
         
         if (!sagData) {
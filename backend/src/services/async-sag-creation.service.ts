@@ -85,7 +85,8 @@ export async function processAsyncSagCreation(job: Job<AsyncSagCreationJobData>)
       "principal_myr": validatedSagData.sagProperties.loan,
       "gold_weight_g": validatedSagData.sagProperties.weightG,
       "purity": validatedSagData.sagProperties.purity,
-      "tenure_days": validatedSagData.sagProperties.tenorM * 30
+      "tenure_days": validatedSagData.sagProperties.tenorM * 30,
+      "shop_id": userId || undefined
     };
 
     // Stage 2: Execute all operations in a single transaction (20-90%)
@@ -7,6 +7,7 @@ interface GoldEvaluatorInput {
   gold_weight_g: number;
   purity: number;
   tenure_days: number;
+  shop_id?: string;  // pawnshop account id, looked up in the agent's shop rating registry
 }
 
 interface RiskMetrics {
@@ -49,8 +50,14 @@ export interface GoldEvaluatorOutput {
   recommendation: LLMRecommendation;
   explanations: RuleHit[];
   policy: Record<string, any>;
+  degraded?: string[];
+  market_snapshot_id?: string;
 }
 
+// Evaluation deadline passed to the agent; it degrades stages rather than overrunning it
+const EVALUATOR_DEADLINE_SECONDS = Number(process.env.GOLD_EVALUATOR_DEADLINE_SECONDS || 90);
+const EVALUATOR_KILL_GRACE_SECONDS = 30;
+
 /**
  * Get the Python executable command
  * Tries different common Python commands in order
@@ -121,7 +128,9 @@ export async function callGoldEvaluator(input: GoldEvaluatorInput): Promise<Gold
       PYTHONIOENCODING: 'utf-8',  // Fix Windows Unicode encoding issue
       PYTHONUNBUFFERED: '1',       // Disable Python output buffering
       // Override SILSILAT_API_BASE to always use localhost:9487 when both services are in the same container
-      SILSILAT_API_BASE: 'http://localhost:9487'
+      SILSILAT_API_BASE: 'http://localhost:9487',
+      // End-to-end budget the agent splits across price, volatility, LLM and publish stages
+      EVAL_DEADLINE_SECONDS: String(EVALUATOR_DEADLINE_SECONDS)
     };
     
     const pythonProcess = spawn(pythonCmd, [pythonScript, '-'], {
@@ -191,10 +200,11 @@ export async function callGoldEvaluator(input: GoldEvaluatorInput): Promise<Gold
       reject(new Error(`Failed to start Python process: ${error.message}`));
     });
 
-    // Set timeout (2 minutes)
+    // Hard kill shortly after the agent's own deadline (allows for interpreter start-up and span flush)
+    const killAfterSeconds = EVALUATOR_DEADLINE_SECONDS + EVALUATOR_KILL_GRACE_SECONDS;
     setTimeout(() => {
       pythonProcess.kill();
-      reject(new Error('Gold evaluator timeout (300s)'));
-    }, 1300000);
+      reject(new Error(`Gold evaluator timeout (${killAfterSeconds}s)`));
+    }, killAfterSeconds * 1000);
   });
 }